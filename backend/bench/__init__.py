@@ -0,0 +1,3 @@
+"""
+Suíte de benchmark do backend (stand-in OpenAI + cenários de carga)
+"""
@@ -0,0 +1,105 @@
+# backend/bench/bench_json.py
+"""
+Micro-benchmark de serialização de uma conversa com 1.000 mensagens.
+
+Compara o caminho antigo (to_dict com .isoformat() + provider JSON padrão
+do Flask) com o atual (datetimes nativos + FastJSONProvider/orjson).
+
+    python -m bench.bench_json --messages 1000 --content-size 3000
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+# Importar `src` sobe o app: basta um banco descartável em memória
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from src.models.user import Conversation, Message
+from src.utils.json_provider import FastJSONProvider, orjson
+
+
+def legacy_message_dict(m):
+    """to_dict() como era antes: uma string isoformat por campo de data"""
+    return {
+        "id": m.id,
+        "conversation_id": m.conversation_id,
+        "content": m.content,
+        "role": m.role,
+        "timestamp": m.timestamp.isoformat(),
+        "cached": bool(m.cache_hit),
+    }
+
+
+def build_conversation(n_messages, content_size):
+    start = datetime(2025, 1, 1, 12, 0, 0, 123456)
+    conv = Conversation(id=1, user_id=1, title="Análise Edital", created_at=start, updated_at=start)
+    text = ("## Edital 123/2025\n\nLote 1 – imóvel residencial, lance mínimo R$ 250.000,00. " * 100)[:content_size]
+    messages = [
+        Message(
+            id=i + 1,
+            conversation_id=1,
+            content=text,
+            role="user" if i % 2 == 0 else "assistant",
+            timestamp=start + timedelta(seconds=i),
+            cache_hit=False,
+        )
+        for i in range(n_messages)
+    ]
+    return conv, messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark de serialização JSON")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--content-size", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    conv, messages = build_conversation(args.messages, args.content_size)
+    conv_meta = {
+        "id": conv.id, "user_id": conv.user_id, "title": conv.title,
+        "thread_id": None, "message_count": len(messages),
+    }
+
+    legacy_app = Flask("legacy")
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+    fast_app = Flask("fast")
+    fast_app.json = FastJSONProvider(fast_app)
+
+    def before():
+        data = dict(conv_meta, created_at=conv.created_at.isoformat(), updated_at=conv.updated_at.isoformat())
+        data["messages"] = [legacy_message_dict(m) for m in messages]
+        with legacy_app.app_context():
+            return legacy_app.json.response({"conversation": data}).get_data()
+
+    def after():
+        data = dict(conv_meta, created_at=conv.created_at, updated_at=conv.updated_at)
+        data["messages"] = [m.to_dict() for m in messages]
+        with fast_app.app_context():
+            return fast_app.json.response({"conversation": data}).get_data()
+
+    # As duas saídas têm que ser equivalentes
+    assert json.loads(before()) == json.loads(after())
+
+    results = {}
+    for name, fn in (("before", before), ("after", after)):
+        times = timeit.repeat(fn, repeat=args.repeat, number=args.number)
+        results[name] = min(times) / args.number * 1000
+
+    print(f"{args.messages} mensagens × {args.content_size} caracteres "
+          f"(orjson {'disponível' if orjson else 'ausente – fallback stdlib'})")
+    print(f"  antes : {results['before']:.2f} ms por resposta")
+    print(f"  depois: {results['after']:.2f} ms por resposta "
+          f"({results['before'] / results['after']:.1f}x mais rápido)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,343 @@
+# backend/bench/fake_openai.py
+"""
+Stand-in local da API OpenAI (Assistants v2) para benchmarks.
+
+Implementa somente os endpoints que o backend usa – threads, mensagens,
+runs (com latência de fila/execução configurável), arquivos, a remoção de
+vector stores e chat completions (com ou sem streaming) – guardando
+tudo em memória. Basta apontar OPENAI_BASE_URL para ``FakeOpenAI.base_url``.
+
+Uso isolado:
+    python -m bench.fake_openai --port 8765 --queue-latency 0.2 --run-latency 1.5
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+
+class FakeOpenAI:
+    def __init__(self, queue_latency=0.2, run_latency=1.0, reply_size=2000,
+                 host="127.0.0.1", port=0):
+        self.queue_latency = queue_latency
+        self.run_latency = run_latency
+        self.reply_size = reply_size
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.threads = {}   # thread_id -> {"messages": [...], "runs": {...}}
+        self.files = {}     # file_id -> file object
+        self.vector_stores = {}  # vector_store_id -> file_ids (criados por anexos file_search)
+        self.calls = {}     # "METHOD /rota" -> contagem
+
+        self.app = self._build_app()
+        self._server = make_server(host, port, self.app, threaded=True)
+        self._thread = None
+
+    # ─── ciclo de vida ─────────────────────────────────────
+    @property
+    def base_url(self):
+        return f"http://{self._server.host}:{self._server.port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    # ─── helpers ───────────────────────────────────────────
+    def _new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def _count(self, key):
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def _message(self, thread_id, role, text, run_id=None, attachments=None):
+        return {
+            "id": self._new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+            "attachments": attachments or [],
+            "assistant_id": None,
+            "run_id": run_id,
+            "metadata": {},
+            "status": "completed",
+        }
+
+    def _attach(self, thread_id, attachments):
+        """Anexos com file_search criam/alimentam o vector store do thread"""
+        file_ids = [a["file_id"] for a in attachments or []
+                    if any(t.get("type") == "file_search" for t in a.get("tools", []))]
+        if not file_ids:
+            return
+        thread = self.threads[thread_id]
+        if thread.get("vector_store_id") is None:
+            thread["vector_store_id"] = self._new_id("vs")
+            self.vector_stores[thread["vector_store_id"]] = []
+        self.vector_stores[thread["vector_store_id"]].extend(file_ids)
+
+    def _thread_view(self, thread_id):
+        vs_id = self.threads[thread_id].get("vector_store_id")
+        tool_resources = {"file_search": {"vector_store_ids": [vs_id]}} if vs_id else {}
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()),
+                "metadata": {}, "tool_resources": tool_resources}
+
+    def _active_run(self, thread_id):
+        """Run em andamento no thread (a API real recusa mensagem/run novos)"""
+        for run in self.threads[thread_id]["runs"].values():
+            if self._run_view(thread_id, run)["status"] in ("queued", "in_progress"):
+                return run["id"]
+        return None
+
+    def _reply_text(self):
+        base = "## Análise do edital\n\nResumo gerado pelo stand-in de benchmark. "
+        return (base * (self.reply_size // len(base) + 1))[: self.reply_size]
+
+    def _run_view(self, thread_id, run):
+        """Calcula o status do run com base no tempo decorrido"""
+        now = time.time()
+        elapsed = now - run["_created"]
+        if run["status"] in ("queued", "in_progress"):
+            if elapsed >= self.queue_latency + self.run_latency:
+                run["status"] = "completed"
+                run["started_at"] = int(run["_created"] + self.queue_latency)
+                run["completed_at"] = int(now)
+                run["usage"] = {"prompt_tokens": 1200, "completion_tokens": 450, "total_tokens": 1650}
+                self.threads[thread_id]["messages"].append(
+                    self._message(thread_id, "assistant", self._reply_text(), run_id=run["id"])
+                )
+            elif elapsed >= self.queue_latency:
+                run["status"] = "in_progress"
+                run["started_at"] = int(run["_created"] + self.queue_latency)
+        return {k: v for k, v in run.items() if not k.startswith("_")}
+
+    # ─── rotas ─────────────────────────────────────────────
+    def _build_app(self):
+        app = Flask("fake_openai")
+        fake = self
+
+        def not_found(what):
+            return jsonify({"error": {"message": f"{what} not found", "type": "invalid_request_error"}}), 404
+
+        def run_active(thread_id, run_id):
+            message = f"Can't add messages to {thread_id} while a run {run_id} is active."
+            return jsonify({"error": {"message": message, "type": "invalid_request_error"}}), 400
+
+        @app.post("/v1/threads")
+        def create_thread():
+            fake._count("POST /threads")
+            data = request.get_json(silent=True) or {}
+            thread_id = fake._new_id("thread")
+            with fake._lock:
+                fake.threads[thread_id] = {"messages": [], "runs": {}}
+                for m in data.get("messages", []):
+                    text = m["content"] if isinstance(m["content"], str) else ""
+                    fake.threads[thread_id]["messages"].append(fake._message(thread_id, m["role"], text))
+                    fake._attach(thread_id, m.get("attachments"))
+                view = fake._thread_view(thread_id)
+            return jsonify(view)
+
+        @app.get("/v1/threads/<thread_id>")
+        def get_thread(thread_id):
+            fake._count("GET /threads/{id}")
+            with fake._lock:
+                if thread_id not in fake.threads:
+                    return not_found("thread")
+                view = fake._thread_view(thread_id)
+            return jsonify(view)
+
+        @app.delete("/v1/threads/<thread_id>")
+        def delete_thread(thread_id):
+            fake._count("DELETE /threads/{id}")
+            with fake._lock:
+                if fake.threads.pop(thread_id, None) is None:
+                    return not_found("thread")
+            return jsonify({"id": thread_id, "object": "thread.deleted", "deleted": True})
+
+        @app.post("/v1/threads/<thread_id>/messages")
+        def create_message(thread_id):
+            fake._count("POST /threads/{id}/messages")
+            if thread_id not in fake.threads:
+                return not_found("thread")
+            data = request.get_json(silent=True) or {}
+            content = data.get("content")
+            if isinstance(content, list):
+                text = "".join(b.get("text", "") for b in content if b.get("type") == "text")
+            else:
+                text = content or ""
+            msg = fake._message(thread_id, data.get("role", "user"), text,
+                                attachments=data.get("attachments"))
+            with fake._lock:
+                active = fake._active_run(thread_id)
+                if active:
+                    return run_active(thread_id, active)
+                fake.threads[thread_id]["messages"].append(msg)
+                fake._attach(thread_id, data.get("attachments"))
+            return jsonify(msg)
+
+        @app.get("/v1/threads/<thread_id>/messages")
+        def list_messages(thread_id):
+            fake._count("GET /threads/{id}/messages")
+            if thread_id not in fake.threads:
+                return not_found("thread")
+            limit = request.args.get("limit", 20, type=int)
+            with fake._lock:
+                msgs = list(fake.threads[thread_id]["messages"])
+            if request.args.get("order", "desc") == "desc":
+                msgs.reverse()
+            msgs = msgs[:limit]
+            return jsonify({"object": "list", "data": msgs, "has_more": False,
+                            "first_id": msgs[0]["id"] if msgs else None,
+                            "last_id": msgs[-1]["id"] if msgs else None})
+
+        @app.post("/v1/threads/<thread_id>/runs")
+        def create_run(thread_id):
+            fake._count("POST /threads/{id}/runs")
+            if thread_id not in fake.threads:
+                return not_found("thread")
+            data = request.get_json(silent=True) or {}
+            now = time.time()
+            run = {
+                "id": fake._new_id("run"), "object": "thread.run", "thread_id": thread_id,
+                "assistant_id": data.get("assistant_id"), "status": "queued",
+                "created_at": int(now), "started_at": None, "completed_at": None,
+                "model": "gpt-4o-mini", "usage": None, "last_error": None,
+                "_created": now,
+            }
+            with fake._lock:
+                active = fake._active_run(thread_id)
+                if active:
+                    return run_active(thread_id, active)
+                fake.threads[thread_id]["runs"][run["id"]] = run
+                view = fake._run_view(thread_id, run)
+            return jsonify(view)
+
+        @app.get("/v1/threads/<thread_id>/runs/<run_id>")
+        def retrieve_run(thread_id, run_id):
+            fake._count("GET /threads/{id}/runs/{id}")
+            with fake._lock:
+                run = fake.threads.get(thread_id, {}).get("runs", {}).get(run_id)
+                if run is None:
+                    return not_found("run")
+                view = fake._run_view(thread_id, run)
+            return jsonify(view)
+
+        @app.post("/v1/threads/<thread_id>/runs/<run_id>/cancel")
+        def cancel_run(thread_id, run_id):
+            fake._count("POST /threads/{id}/runs/{id}/cancel")
+            with fake._lock:
+                run = fake.threads.get(thread_id, {}).get("runs", {}).get(run_id)
+                if run is None:
+                    return not_found("run")
+                if run["status"] in ("queued", "in_progress"):
+                    run["status"] = "cancelled"
+                view = fake._run_view(thread_id, run)
+            return jsonify(view)
+
+        @app.post("/v1/files")
+        def create_file():
+            fake._count("POST /files")
+            upload = request.files.get("file")
+            body = upload.read() if upload else b""
+            file_obj = {
+                "id": fake._new_id("file"), "object": "file", "bytes": len(body),
+                "created_at": int(time.time()),
+                "filename": upload.filename if upload else "upload",
+                "purpose": request.form.get("purpose", "assistants"), "status": "processed",
+            }
+            with fake._lock:
+                fake.files[file_obj["id"]] = file_obj
+            return jsonify(file_obj)
+
+        @app.get("/v1/files/<file_id>")
+        def retrieve_file(file_id):
+            fake._count("GET /files/{id}")
+            if file_id not in fake.files:
+                return not_found("file")
+            return jsonify(fake.files[file_id])
+
+        @app.delete("/v1/files/<file_id>")
+        def delete_file(file_id):
+            fake._count("DELETE /files/{id}")
+            with fake._lock:
+                if fake.files.pop(file_id, None) is None:
+                    return not_found("file")
+            return jsonify({"id": file_id, "object": "file", "deleted": True})
+
+        @app.delete("/v1/vector_stores/<vector_store_id>")
+        def delete_vector_store(vector_store_id):
+            fake._count("DELETE /vector_stores/{id}")
+            with fake._lock:
+                if fake.vector_stores.pop(vector_store_id, None) is None:
+                    return not_found("vector store")
+            return jsonify({"id": vector_store_id, "object": "vector_store.deleted", "deleted": True})
+
+        @app.post("/v1/chat/completions")
+        def chat_completions():
+            fake._count("POST /chat/completions")
+            data = request.get_json(silent=True) or {}
+            completion_id = fake._new_id("chatcmpl")
+            text = fake._reply_text()
+            prompt_chars = sum(len(m.get("content") or "") for m in data.get("messages", []))
+            usage = {"prompt_tokens": max(1, prompt_chars // 4), "completion_tokens": len(text) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            base = {"id": completion_id, "created": int(time.time()), "model": data.get("model", "gpt-4o-mini")}
+
+            if not data.get("stream"):
+                time.sleep(fake.queue_latency + fake.run_latency)
+                return jsonify({**base, "object": "chat.completion", "usage": usage, "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": text},
+                }]})
+
+            pieces = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+            include_usage = (data.get("stream_options") or {}).get("include_usage")
+
+            def events():
+                time.sleep(fake.queue_latency)
+                for i, piece in enumerate(pieces):
+                    time.sleep(fake.run_latency / len(pieces))
+                    delta = {"content": piece}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    chunk = {**base, "object": "chat.completion.chunk", "usage": None,
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                last = {**base, "object": "chat.completion.chunk", "usage": None,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(last)}\n\n"
+                if include_usage:
+                    yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return Response(events(), mimetype="text/event-stream")
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local da API OpenAI Assistants")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--queue-latency", type=float, default=0.2)
+    parser.add_argument("--run-latency", type=float, default=1.0)
+    parser.add_argument("--reply-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.queue_latency, args.run_latency, args.reply_size, args.host, args.port)
+    print(f"OPENAI_BASE_URL={fake.base_url}")
+    fake._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
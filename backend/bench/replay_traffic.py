@@ -0,0 +1,183 @@
+# backend/bench/replay_traffic.py
+"""
+Reproduz um cassete gravado (OPENAI_TRANSPORT=record) contra o build atual.
+
+As requisições de entrada gravadas (send_message / upload_files) são
+disparadas de novo, respeitando os intervalos originais (ajustáveis por
+--time-scale), enquanto o backend sobe com OPENAI_TRANSPORT=replay e recebe
+as respostas da OpenAI do próprio cassete. Para cada request o relatório
+separa a latência upstream gravada do overhead do próprio backend
+(DB, serialização, polling), que é o que interessa comparar entre builds.
+
+Exemplo (a partir de backend/):
+    python -m bench.replay_traffic cassette.jsonl --latency-scale 1.0 --output bench/results/replay.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from .run_bench import ADMIN_PASSWORD, ADMIN_USERNAME, USER_PASSWORD, Client, _login, git_revision, summarize
+
+
+def load_cassette(path):
+    inbound, upstream_ms = [], defaultdict(float)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("kind") == "inbound":
+                inbound.append(entry)
+            elif entry.get("kind") == "openai" and entry.get("request_id"):
+                upstream_ms[entry["request_id"]] += entry["elapsed_ms"]
+    inbound.sort(key=_timestamp)
+    return inbound, upstream_ms
+
+
+def _timestamp(entry):
+    """Instante absoluto da gravação (cassetes antigos: offset_s por processo)"""
+    return entry.get("ts", entry.get("offset_s", 0))
+
+
+def boot_app(args):
+    os.environ.update({
+        "DATABASE_URL": args.database_url,
+        "OPENAI_TRANSPORT": "replay",
+        "OPENAI_CASSETTE_PATH": os.path.abspath(args.cassette),
+        "OPENAI_REPLAY_LATENCY_SCALE": str(args.latency_scale),
+        "OPENAI_ASSISTANT_ID": os.environ.get("OPENAI_ASSISTANT_ID", "asst_replay"),
+        "ADMIN_USERNAME": ADMIN_USERNAME,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "ADMIN_EMAIL": "bench_admin@example.com",
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "bench-secret-key-with-enough-bytes-0001"),
+        "LOG_LEVEL": args.log_level,
+        "RATE_LIMIT_ENABLED": os.environ.get("RATE_LIMIT_ENABLED", "false"),
+    })
+    import logging
+    from werkzeug.serving import make_server
+    from src.main import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay de tráfego gravado em cassete OpenAI")
+    parser.add_argument("cassette")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiplica a latência gravada da OpenAI (0 = sem espera)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplica os intervalos entre requests (0 = dispara tudo de uma vez)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    if args.database_url is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="leilaogpt-replay-"), "replay.db")
+        args.database_url = f"sqlite:///{db_path}"
+
+    inbound, upstream_ms = load_cassette(args.cassette)
+    if not inbound:
+        print("Cassete sem requisições de entrada (kind=inbound).")
+        return 1
+
+    server = boot_app(args)
+    host, port = server.host, server.port
+
+    admin = Client(host, port, _login(host, port, ADMIN_USERNAME, ADMIN_PASSWORD))
+    username = f"replay_{int(time.time())}"
+    admin.json("POST", "/api/users", {
+        "username": username, "email": f"{username}@example.com", "password": USER_PASSWORD,
+    })
+    token = _login(host, port, username, USER_PASSWORD)
+
+    # Conversas gravadas → conversas criadas neste banco
+    conversations = {}
+    for entry in inbound:
+        if entry["route"] == "send_message":
+            recorded_id = entry["payload"]["conversation_id"]
+            if recorded_id not in conversations:
+                _, data = Client(host, port, token).json("POST", "/api/chat/conversations", {})
+                conversations[recorded_id] = data["conversation"]["id"]
+
+    samples = defaultdict(lambda: {"total": [], "overhead": [], "errors": 0})
+    lock = threading.Lock()
+
+    def fire(entry):
+        client = Client(host, port, token)
+        started = time.perf_counter()
+        if entry["route"] == "upload_files":
+            status = 200
+            for f in entry["payload"]:
+                status, _ = client.upload(f["filename"] or "arquivo", os.urandom(f.get("bytes") or 1024),
+                                          f.get("content_type") or "application/octet-stream")
+        else:
+            payload = dict(entry["payload"])
+            conv_id = conversations[payload.pop("conversation_id")]
+            status, _ = client.request("POST", f"/api/chat/conversations/{conv_id}/messages", payload)
+        total = time.perf_counter() - started
+        upstream = upstream_ms.get(entry.get("request_id"), 0.0) / 1000.0 * args.latency_scale
+        with lock:
+            bucket = samples[entry["route"]]
+            if 200 <= status < 400:
+                bucket["total"].append(total)
+                bucket["overhead"].append(max(total - upstream, 0.0))
+            else:
+                bucket["errors"] += 1
+
+    t0 = time.perf_counter()
+    base_ts = _timestamp(inbound[0])
+    workers = []
+    for entry in inbound:
+        delay = (_timestamp(entry) - base_ts) * args.time_scale - (time.perf_counter() - t0)
+        if delay > 0:
+            time.sleep(delay)
+        t = threading.Thread(target=fire, args=(entry,))
+        t.start()
+        workers.append(t)
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "cassette": os.path.basename(args.cassette),
+        "config": {"latency_scale": args.latency_scale, "time_scale": args.time_scale,
+                   "database": args.database_url.split("://", 1)[0]},
+        "scenarios": {},
+    }
+    for route, bucket in samples.items():
+        total = summarize(bucket["total"], bucket["errors"], elapsed)
+        overhead = summarize(bucket["overhead"], 0, elapsed)
+        results["scenarios"][route] = {
+            **total,
+            "overhead_p50_ms": overhead["p50_ms"],
+            "overhead_p95_ms": overhead["p95_ms"],
+            "overhead_p99_ms": overhead["p99_ms"],
+        }
+        print(f"{route:15s} req={total['requests']:5d} err={total['errors']:3d} "
+              f"p50={total['p50_ms']}ms p95={total['p95_ms']}ms | overhead "
+              f"p50={overhead['p50_ms']}ms p95={overhead['p95_ms']}ms p99={overhead['p99_ms']}ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados salvos em {args.output}")
+
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+# backend/bench/run_bench.py
+"""
+Benchmark de carga do backend contra o stand-in local da OpenAI.
+
+Sobe o app de ``src/main.py`` num servidor HTTP local (SQLite temporário ou
+o banco indicado em --database-url), semeia usuários/conversas e executa
+cenários com N clientes concorrentes, reportando p50/p95/p99 e req/s.
+
+Exemplos (a partir de backend/):
+    python -m bench.run_bench --concurrency 8 --duration 30 --output bench/results/base.json
+    python -m bench.run_bench --database-url postgresql://... --scenarios send_message
+    python -m bench.run_bench --compare bench/results/base.json --output bench/results/new.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from .fake_openai import FakeOpenAI
+
+SCENARIOS = ("login", "list_conversations", "send_message", "admin_dashboard")
+
+ADMIN_USERNAME = "bench_admin"
+ADMIN_PASSWORD = "bench_admin_pw"
+USER_PASSWORD = "bench_user_pw"
+
+
+# ─── Cliente HTTP mínimo ───────────────────────────────────
+class Client:
+    def __init__(self, host, port, token=None):
+        self.conn = http.client.HTTPConnection(host, port, timeout=180)
+        self.token = token
+
+    def request(self, method, path, body=None, headers=None, raw=False):
+        hdrs = dict(headers or {})
+        if self.token:
+            hdrs["Authorization"] = f"Bearer {self.token}"
+        if body is not None and not raw:
+            body = json.dumps(body)
+            hdrs["Content-Type"] = "application/json"
+        self.conn.request(method, path, body=body, headers=hdrs)
+        resp = self.conn.getresponse()
+        data = resp.read()
+        return resp.status, data
+
+    def json(self, method, path, body=None):
+        status, data = self.request(method, path, body)
+        return status, (json.loads(data) if data else {})
+
+    def upload(self, filename, content, content_type="application/pdf"):
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        status, data = self.request(
+            "POST", "/api/upload", body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}, raw=True,
+        )
+        return status, (json.loads(data) if data else {})
+
+
+def _login(host, port, username, password):
+    status, data = Client(host, port).json(
+        "POST", "/api/auth/login", {"username": username, "password": password}
+    )
+    if status != 200:
+        raise RuntimeError(f"login falhou para {username}: {status} {data}")
+    return data["token"]
+
+
+# ─── Cenários ──────────────────────────────────────────────
+# Cada cenário recebe o estado do cliente virtual e devolve o status HTTP da
+# operação medida. Apenas a chamada principal é cronometrada.
+def scenario_login(ctx):
+    status, _ = Client(ctx["host"], ctx["port"]).json(
+        "POST", "/api/auth/login", {"username": ctx["username"], "password": USER_PASSWORD}
+    )
+    return status
+
+
+def scenario_list_conversations(ctx):
+    status, _ = ctx["client"].request("GET", "/api/chat/conversations")
+    return status
+
+
+def scenario_send_message(ctx):
+    client = ctx["client"]
+    status, data = client.json("POST", "/api/chat/conversations", {})
+    if status != 201:
+        return status
+    conv_id = data["conversation"]["id"]
+
+    status, uploaded = client.upload("edital.pdf", ctx["attachment"])
+    if status != 200:
+        return status
+    files = uploaded["data"]
+
+    started = time.perf_counter()
+    status, _ = client.request(
+        "POST", f"/api/chat/conversations/{conv_id}/messages",
+        {
+            "content": "resuma este edital",
+            "file_ids": [f["file_id"] for f in files],
+            "original_files": [{"name": f["filename"], "type": "application/pdf"} for f in files],
+        },
+    )
+    ctx["timing_override"] = time.perf_counter() - started
+    return status
+
+
+def scenario_admin_dashboard(ctx):
+    status, _ = ctx["admin_client"].request("GET", "/api/admin/dashboard")
+    return status
+
+
+SCENARIO_FUNCS = {
+    "login": scenario_login,
+    "list_conversations": scenario_list_conversations,
+    "send_message": scenario_send_message,
+    "admin_dashboard": scenario_admin_dashboard,
+}
+
+
+# ─── Estatísticas ──────────────────────────────────────────
+def percentile(sorted_values, pct):
+    """Percentil por nearest-rank"""
+    if not sorted_values:
+        return None
+    rank = min(max(math.ceil(pct / 100.0 * len(sorted_values)), 1), len(sorted_values))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+    }
+
+
+# ─── Execução ──────────────────────────────────────────────
+def boot_app(args, fake):
+    """Configura o ambiente e importa o app (precisa ocorrer antes do import)"""
+    os.environ.update({
+        "DATABASE_URL": args.database_url,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": fake.base_url,
+        "OPENAI_ASSISTANT_ID": "asst_bench",
+        "ADMIN_USERNAME": ADMIN_USERNAME,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "ADMIN_EMAIL": "bench_admin@example.com",
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "bench-secret-key-with-enough-bytes-0001"),
+        "LOG_LEVEL": args.log_level,
+        "RATE_LIMIT_ENABLED": os.environ.get("RATE_LIMIT_ENABLED", "false"),
+    })
+    import logging
+    from werkzeug.serving import make_server
+    from src.main import app
+
+    # O log de acesso do servidor de desenvolvimento distorce a medição
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(host, port, concurrency, conversations_per_user):
+    admin = Client(host, port, _login(host, port, ADMIN_USERNAME, ADMIN_PASSWORD))
+    run_tag = uuid.uuid4().hex[:6]
+    users = []
+    for i in range(concurrency):
+        username = f"bench_{run_tag}_{i}"
+        status, data = admin.json("POST", "/api/users", {
+            "username": username, "email": f"{username}@example.com", "password": USER_PASSWORD,
+        })
+        if status != 201:
+            raise RuntimeError(f"falha ao criar usuário de benchmark: {status} {data}")
+        client = Client(host, port, _login(host, port, username, USER_PASSWORD))
+        for _ in range(conversations_per_user):
+            client.json("POST", "/api/chat/conversations", {"title": "Conversa semeada"})
+        users.append(username)
+    return admin.token, users
+
+
+def run_scenario(name, args, host, port, admin_token, users):
+    func = SCENARIO_FUNCS[name]
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    attachment = os.urandom(args.attachment_kb * 1024)
+
+    def worker(username):
+        nonlocal errors
+        ctx = {
+            "host": host, "port": port, "username": username, "attachment": attachment,
+            "client": Client(host, port, _login(host, port, username, USER_PASSWORD)),
+            "admin_client": Client(host, port, admin_token),
+        }
+        done = 0
+        while time.perf_counter() < deadline and (not args.requests or done < args.requests):
+            ctx.pop("timing_override", None)
+            started = time.perf_counter()
+            try:
+                status = func(ctx)
+            except Exception:
+                status = 0
+                ctx["client"] = Client(host, port, ctx["client"].token)
+            elapsed = ctx.get("timing_override", time.perf_counter() - started)
+            with lock:
+                if 200 <= status < 400:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+            done += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(u,)) for u in users]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparação com {baseline_path} ({baseline.get('revision')}):")
+    for name, current in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            if old.get(key) and current.get(key) is not None:
+                delta = (current[key] - old[key]) / old[key] * 100
+                parts.append(f"{key} {old[key]} → {current[key]} ({delta:+.1f}%)")
+        print(f"  {name:20s} " + " | ".join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga do backend LeilãoGPT")
+    parser.add_argument("--database-url", default=None,
+                        help="URL SQLAlchemy (padrão: SQLite temporário)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos por cenário")
+    parser.add_argument("--requests", type=int, default=0, help="máximo de requests por cliente (0 = sem limite)")
+    parser.add_argument("--queue-latency", type=float, default=0.2)
+    parser.add_argument("--run-latency", type=float, default=1.0)
+    parser.add_argument("--reply-size", type=int, default=4000)
+    parser.add_argument("--attachment-kb", type=int, default=64)
+    parser.add_argument("--seed-conversations", type=int, default=30)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", default=None, help="arquivo JSON de resultados")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior")
+    args = parser.parse_args(argv)
+
+    if args.database_url is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="leilaogpt-bench-"), "bench.db")
+        args.database_url = f"sqlite:///{db_path}"
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+
+    fake = FakeOpenAI(args.queue_latency, args.run_latency, args.reply_size).start()
+    server = boot_app(args, fake)
+    host, port = server.host, server.port
+
+    admin_token, users = seed(host, port, args.concurrency, args.seed_conversations)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "database": args.database_url.split("://", 1)[0],
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "requests_per_client": args.requests,
+            "queue_latency_s": args.queue_latency,
+            "run_latency_s": args.run_latency,
+            "reply_size": args.reply_size,
+            "attachment_kb": args.attachment_kb,
+        },
+        "scenarios": {},
+    }
+
+    for name in names:
+        summary = run_scenario(name, args, host, port, admin_token, users)
+        results["scenarios"][name] = summary
+        print(f"{name:20s} req={summary['requests']:5d} err={summary['errors']:3d} "
+              f"rps={summary['rps']} p50={summary['p50_ms']}ms "
+              f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms")
+
+    results["openai_calls"] = dict(fake.calls)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados salvos em {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    server.shutdown()
+    fake.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,16 @@ Backend principal do Chatbot.
 – Flask + SQLAlchemy + JWT + CORS
 """
 
+import logging
 import os
 import sys
 from pathlib import Path
+
+# Relatório de boot: precisa vir antes dos imports pesados (STARTUP_PROFILE)
+from src.utils import startup
+
+startup.begin()
+
 from dotenv import load_dotenv
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
@@ -14,6 +21,11 @@ from flask_jwt_extended import JWTManager
 # Carrega variáveis de ambiente (.env)
 load_dotenv()
 
+from src.utils.logging_config import setup_logging, get_logger
+
+setup_logging()
+logger = get_logger(__name__)
+
 # ───────────────────────────────────────────────────────────
 # Instância do app Flask
 # ───────────────────────────────────────────────────────────
@@ -22,6 +34,14 @@ app = Flask(
     static_folder=str(Path(__file__).parent / "routes" / "static"),
 )
 
+# Atrás do proxy do Railway: o IP do cliente vem do salto confiável do
+# X-Forwarded-For (o rate limit por IP usa request.remote_addr)
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+trusted_proxy_hops = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+if trusted_proxy_hops:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxy_hops, x_proto=0)
+
 # Debug detalhado em desenvolvimento
 app.debug = os.getenv("FLASK_ENV") == "development"
 app.config.update(
@@ -42,15 +62,58 @@ app.config.update(
 )
 jwt = JWTManager(app)
 
+# ─── Logging estruturado ───────────────────────────────────
+setup_logging(app)
+
+# ─── Serialização JSON (orjson quando disponível) ──────────
+from src.utils.json_provider import init_json_provider
+
+init_json_provider(app)
+
+# ─── Compressão das respostas ──────────────────────────────
+from src.utils.compression import init_compression
+
+init_compression(app)
+
+# ─── Tracing (spans por fase, OTLP) ────────────────────────
+from src.utils.tracing import init_tracing
+
+init_tracing(app)
+
 # ─── Banco de Dados ────────────────────────────────────────
 # Imports usando caminho absoluto do app (PYTHONPATH está configurado no Docker)
 from src.models.user import db
-from src.utils.database import init_database
+from src.utils.database import init_database, register_cli
+from src.utils.archive import register_cli as register_archive_cli
+from src.utils.text_codec import register_cli as register_codec_cli
+from src.utils.titles import register_cli as register_titles_cli
+from src.utils.usage import register_cli as register_usage_cli
+from src.utils.db_pool import engine_options, init_pool
+from src.utils.replica import replica_binds
 
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(os.getenv("DATABASE_URL"))
+app.config["SQLALCHEMY_BINDS"] = replica_binds()
 db.init_app(app)
-init_database(app)
+init_pool(app, db)
+register_cli(app)
+register_archive_cli(app)
+register_codec_cli(app)
+register_titles_cli(app)
+register_usage_cli(app)
+with startup.phase("database"):
+    init_database(app)
+
+# ─── Tarefas em segundo plano ──────────────────────────────
+from src.utils.jobs import init_jobs
+
+init_jobs(app)
+
+# ─── Estatísticas por worker (system-info) ─────────────────
+from src.utils.worker_stats import init_worker_stats
+
+init_worker_stats(app)
 
 # ─── CORS ───────────────────────────────────────────────────
 # Pega a URL do Railway das variáveis de ambiente
@@ -75,40 +138,47 @@ CORS(
     origins=allowed_origins,
     supports_credentials=True,
     methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "X-Requested-With"],
-    expose_headers=["Content-Type", "Authorization"]
+    allow_headers=["Authorization", "Content-Type", "X-Requested-With", "X-Request-ID", "If-None-Match",
+                   "Idempotency-Key", "traceparent"],
+    expose_headers=["Content-Type", "Authorization", "X-Request-ID", "ETag", "Idempotent-Replayed", "X-Trace-Id"]
 )
 
 # ─── Blueprints / Rotas ─────────────────────────────────────
-from src.routes.auth import auth_bp
-from src.routes.user import user_bp
-from src.routes.chat import chat_bp
-from src.routes.admin import admin_bp
-from src.routes.admin_routes import admin_routes_bp
-from src.routes.upload import upload_bp
-
-app.register_blueprint(auth_bp, url_prefix="/api/auth")
-app.register_blueprint(user_bp, url_prefix="/api")
-app.register_blueprint(chat_bp, url_prefix="/api/chat")
-app.register_blueprint(admin_bp, url_prefix="/api/admin")
-app.register_blueprint(admin_routes_bp, url_prefix="/")
-app.register_blueprint(upload_bp, url_prefix="/api")
+with startup.phase("blueprints"):
+    from src.routes.auth import auth_bp
+    from src.routes.user import user_bp
+    from src.routes.chat import chat_bp
+    from src.routes.admin import admin_bp
+    from src.routes.admin_routes import admin_routes_bp
+    from src.routes.upload import upload_bp
+
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(user_bp, url_prefix="/api")
+    app.register_blueprint(chat_bp, url_prefix="/api/chat")
+    app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(admin_routes_bp, url_prefix="/")
+    app.register_blueprint(upload_bp, url_prefix="/api")
 
 # ─── Debug das rotas ───────────────────────────────────────
-print("🚀 Rotas registradas:")
-for rule in app.url_map.iter_rules():
-    if '/api/' in rule.rule:
-        methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
-        print(f"  [{methods}] {rule.rule}")
+if logger.isEnabledFor(logging.DEBUG):
+    for rule in app.url_map.iter_rules():
+        if '/api/' in rule.rule:
+            methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
+            logger.debug("rota registrada", extra={"methods": methods, "rule": rule.rule})
 
 # ─── Healthcheck ───────────────────────────────────────────
 @app.route("/health")
 def health_check():
+    from src.utils.openai_breaker import breaker
+
+    # Sempre 200: com a OpenAI fora o processo está vivo (reiniciá-lo não ajuda)
+    openai_status = breaker.stats()
     return jsonify(
-        status="healthy", 
+        status="healthy" if openai_status["state"] == "closed" else "degraded",
         message="Backend Chatbot está funcionando!",
         environment=os.getenv("RAILWAY_ENVIRONMENT", "production"),
-        python_version=sys.version
+        python_version=sys.version,
+        openai=openai_status,
     ), 200
 
 # ─── Rota para testar API ──────────────────────────────────
@@ -134,6 +204,17 @@ def root():
         }
     ), 200
 
+startup.finish(logger)
+
+@app.cli.command("startup-report")
+def startup_report_command():
+    """Mostra o tempo de boot (use STARTUP_PROFILE=true para os imports)."""
+    import json
+
+    import click
+
+    click.echo(json.dumps(startup.report(), indent=2, ensure_ascii=False))
+
 # ─── Execução direta ───────────────────────────────────────
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
@@ -5,7 +5,11 @@ import jwt
 from datetime import datetime, timedelta
 import os
 
-db = SQLAlchemy()
+from ..utils.replica import RoutingSession
+from ..utils.text_codec import CompressedText
+
+# Sessão com roteamento opcional de leituras para a réplica (utils/replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -71,8 +75,9 @@ class User(db.Model):
             'email': self.email,
             'is_active': self.is_active,
             'is_admin': self.is_admin,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None
+            # datetimes são serializados nativamente pelo provider JSON do app
+            'created_at': self.created_at,
+            'last_login': self.last_login
         }
 
     def __repr__(self):
@@ -88,19 +93,32 @@ class Conversation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     thread_id = db.Column(db.String(100), nullable=True)  # ← NOVA COLUNA ADICIONADA
+    # Controle de contexto do thread (ver utils/context_window.py)
+    context_strategy = db.Column(db.String(20), nullable=True)  # off | truncate | rollover (None = padrão do deploy)
+    context_summary = db.Column(db.Text, nullable=True)
+    context_base_message_id = db.Column(db.Integer, nullable=True)  # mensagens com id maior estão no thread atual
+    thread_rollovers = db.Column(db.Integer, nullable=True)
+    last_rollover_at = db.Column(db.DateTime, nullable=True)
+    last_prompt_tokens = db.Column(db.Integer, nullable=True)
+    llm_backend = db.Column(db.String(20), nullable=True)  # assistants | chat | local (None = LLM_BACKEND)
     
     # Relacionamento com mensagens
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+    # Mensagens antigas movidas para o arquivo (ver utils/archive.py)
+    archive = db.relationship('ArchivedConversation', uselist=False, lazy=True, cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'thread_id': self.thread_id,  # ← INCLUI NO DICT TAMBÉM
-            'message_count': len(self.messages)
+            'context_strategy': self.context_strategy,
+            'thread_rollovers': self.thread_rollovers or 0,
+            'llm_backend': self.llm_backend,
+            'message_count': len(self.messages) + (self.archive.message_count if self.archive else 0)
         }
 
     def __repr__(self):
@@ -109,12 +127,25 @@ class Conversation(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    # Ids nunca são reaproveitados no SQLite (o arquivamento apaga as mais recentes)
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(CompressedText, nullable=False)  # comprimido acima do limite (utils/text_codec.py)
     role = db.Column(db.String(20), nullable=False)  # 'user' ou 'assistant'
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    cache_hit = db.Column(db.Boolean, default=False)  # resposta servida pelo cache de respostas
+    status = db.Column(db.String(20), nullable=True)  # pending | completed | failed | cancelled (None = completed)
+    run_id = db.Column(db.String(100), nullable=True)  # run que gerou a resposta (cancelamento)
+    # Consumo e latência da resposta (ver utils/usage.py)
+    model = db.Column(db.String(100), nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    queue_ms = db.Column(db.Integer, nullable=True)  # fila da conversa + fila do run na OpenAI
+    run_ms = db.Column(db.Integer, nullable=True)  # execução do run / geração
+    total_ms = db.Column(db.Integer, nullable=True)  # request inteiro
+    document_type = db.Column(db.String(20), nullable=True)  # anexos do turno: pdf | image | office | text | mixed | other
     
     def to_dict(self):
         return {
@@ -122,8 +153,140 @@ class Message(db.Model):
             'conversation_id': self.conversation_id,
             'content': self.content,
             'role': self.role,
-            'timestamp': self.timestamp.isoformat()
+            'timestamp': self.timestamp,
+            'cached': bool(self.cache_hit),
+            'status': self.status or 'completed',
+            'run_id': self.run_id,
+            'usage': self.usage_dict() if self.role == 'assistant' else None,
+        }
+
+    def usage_dict(self):
+        return {
+            'model': self.model,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'queue_ms': self.queue_ms,
+            'run_ms': self.run_ms,
+            'total_ms': self.total_ms,
         }
 
     def __repr__(self):
-        return f'<Message {self.id}: {self.role}>'
\ No newline at end of file
+        return f'<Message {self.id}: {self.role}>'
+
+
+class UploadedFile(db.Model):
+    """Arquivo enviado à OpenAI via /api/upload, com o hash do conteúdo"""
+    __tablename__ = 'uploaded_files'
+
+    file_id = db.Column(db.String(100), primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(255))
+    content_type = db.Column(db.String(120))
+    size = db.Column(db.Integer)
+    conversation_id = db.Column(db.Integer, index=True)  # preenchido ao ser anexado numa mensagem
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UploadedFile {self.file_id}>'
+
+
+class AnswerCacheEntry(db.Model):
+    """Resposta de primeira mensagem reaproveitável (ver utils/answer_cache.py)"""
+    __tablename__ = 'answer_cache'
+
+    key = db.Column(db.String(64), primary_key=True)
+    assistant_id = db.Column(db.String(100), nullable=False, index=True)
+    reply = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AnswerCacheEntry {self.key[:12]}>'
+
+
+class SchemaVersion(db.Model):
+    """Carimbo da versão do schema aplicada (ver utils/database.py)"""
+    __tablename__ = 'schema_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
+
+
+class ArchivedConversation(db.Model):
+    """Mensagens antigas de uma conversa, compactadas em uma única linha"""
+    __tablename__ = 'messages_archive'
+
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), primary_key=True)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    first_message_id = db.Column(db.Integer)
+    last_message_id = db.Column(db.Integer)
+    # JSON das mensagens comprimido com zlib; só é carregado quando lido
+    payload = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchivedConversation {self.conversation_id}: {self.message_count}>'
+
+
+class BackgroundJob(db.Model):
+    """Tarefa assíncrona persistida (ver utils/jobs.py)"""
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id}: {self.kind} {self.status}>'
+
+
+class IdempotencyKey(db.Model):
+    """Resultado (ou estado em andamento) de um request com Idempotency-Key"""
+    __tablename__ = 'idempotency_keys'
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256(usuário, escopo, cabeçalho)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 do corpo do request
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress | done
+    status_code = db.Column(db.Integer)
+    response = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key[:12]}: {self.status}>'
+
+
+class UsageDaily(db.Model):
+    """Consumo agregado por dia, usuário, modelo e tipo de documento (ver utils/usage.py)"""
+    __tablename__ = 'usage_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, index=True)
+    model = db.Column(db.String(100), primary_key=True, default='')
+    document_type = db.Column(db.String(20), primary_key=True, default='none')
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)  # falhas e cancelamentos
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    queue_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    run_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    total_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    max_total_ms = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UsageDaily {self.day} user={self.user_id} {self.model}>'
@@ -1,16 +1,23 @@
 import os
-import psutil
-from flask import Blueprint, request, jsonify
-from ..models.user import db, User, Conversation, Message  # ← CORRIGIDO
+from flask import Blueprint, Response, current_app, request, jsonify
+from ..models.user import db, User, Conversation, Message, ArchivedConversation  # ← CORRIGIDO
 from ..utils.auth import token_required, admin_required  # ← CORRIGIDO
+from ..utils import archive, metrics, openai_breaker, openai_gc, startup, tracing, usage, worker_stats
+from ..utils.jobs import queue_stats
+from ..utils.database import get_schema_stamp, schema_version
+from ..utils.db_pool import pool_stats
+from ..utils.replica import read_replica, replica_status
+from ..utils.json_provider import json_default
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
+from sqlalchemy.orm import selectinload
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @token_required
 @admin_required
+@read_replica
 def get_dashboard_stats(current_user):
     """Estatísticas gerais do sistema para o dashboard admin"""
     try:
@@ -18,7 +25,9 @@ def get_dashboard_stats(current_user):
         total_users = User.query.count()
         active_users = User.query.filter_by(is_active=True).count()
         total_conversations = Conversation.query.count()
-        total_messages = Message.query.count()
+        total_messages = Message.query.count() + (
+            db.session.query(func.coalesce(func.sum(ArchivedConversation.message_count), 0)).scalar()
+        )
         
         # Usuários criados nos últimos 30 dias
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
@@ -63,7 +72,8 @@ def get_dashboard_stats(current_user):
             ],
             'daily_activity': [
                 {
-                    'date': activity.date.isoformat(),
+                    # SQLite devolve func.date() como string; Postgres como date
+                    'date': activity.date if isinstance(activity.date, str) else activity.date.isoformat(),
                     'message_count': activity.message_count
                 } for activity in daily_activity
             ]
@@ -75,6 +85,7 @@ def get_dashboard_stats(current_user):
 @admin_bp.route('/conversations', methods=['GET'])
 @token_required
 @admin_required
+@read_replica
 def get_all_conversations(current_user):
     """Lista todas as conversas do sistema (admin only)"""
     try:
@@ -83,7 +94,8 @@ def get_all_conversations(current_user):
         user_id = request.args.get('user_id', type=int)
         
         query = db.session.query(Conversation, User.username)\
-            .join(User, Conversation.user_id == User.id)
+            .join(User, Conversation.user_id == User.id)\
+            .options(selectinload(Conversation.archive))
         
         if user_id:
             query = query.filter(Conversation.user_id == user_id)
@@ -117,7 +129,8 @@ def delete_conversation_admin(current_user, conversation_id):
         if not conversation:
             return jsonify({'message': 'Conversa não encontrada'}), 404
         
-        db.session.delete(conversation)
+        # Threads/arquivos na OpenAI são limpos em segundo plano
+        openai_gc.delete_conversation(conversation)
         db.session.commit()
         
         return jsonify({'message': 'Conversa deletada com sucesso'}), 200
@@ -129,6 +142,7 @@ def delete_conversation_admin(current_user, conversation_id):
 @admin_bp.route('/users/<int:user_id>/conversations', methods=['GET'])
 @token_required
 @admin_required
+@read_replica
 def get_user_conversations(current_user, user_id):
     """Lista conversas de um usuário específico (admin only)"""
     try:
@@ -140,6 +154,7 @@ def get_user_conversations(current_user, user_id):
         per_page = request.args.get('per_page', 20, type=int)
         
         conversations = Conversation.query.filter_by(user_id=user_id)\
+            .options(selectinload(Conversation.archive))\
             .order_by(Conversation.updated_at.desc())\
             .paginate(page=page, per_page=per_page, error_out=False)
         
@@ -157,6 +172,7 @@ def get_user_conversations(current_user, user_id):
 @admin_bp.route('/backup', methods=['POST'])
 @token_required
 @admin_required
+@read_replica
 def create_backup(current_user):
     """Cria backup dos dados (admin only)"""
     try:
@@ -171,7 +187,7 @@ def create_backup(current_user):
             
             for conv in user.conversations:
                 conv_dict = conv.to_dict()
-                conv_dict['messages'] = [msg.to_dict() for msg in conv.messages]
+                conv_dict['messages'] = [msg.to_dict() for msg in archive.all_messages(conv)]
                 user_dict['conversations'].append(conv_dict)
             
             users_data.append(user_dict)
@@ -190,7 +206,7 @@ def create_backup(current_user):
         os.makedirs(os.path.dirname(backup_path), exist_ok=True)
         
         with open(backup_path, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2)
+            json.dump(backup_data, f, ensure_ascii=False, indent=2, default=json_default)
         
         return jsonify({
             'message': 'Backup criado com sucesso',
@@ -202,6 +218,53 @@ def create_backup(current_user):
     except Exception as e:
         return jsonify({'message': f'Erro ao criar backup: {str(e)}'}), 500
 
+def _usage_report():
+    """Filtros comuns de /usage e /usage.csv: from, to, user_id, group_by"""
+    start, end = usage.parse_period(request.args.get('from'), request.args.get('to'))
+    group_by = [g.strip() for g in request.args.get('group_by', 'day,user').split(',') if g.strip()]
+    return start, end, usage.report(start, end, group_by, request.args.get('user_id', type=int))
+
+@admin_bp.route('/usage', methods=['GET'])
+@token_required
+@admin_required
+@read_replica
+def get_usage(current_user):
+    """Consumo de tokens e latência agregados por dia/usuário/modelo/tipo de documento (admin only)"""
+    try:
+        start, end, rows = _usage_report()
+    except ValueError:
+        return jsonify({'message': 'Datas inválidas (use AAAA-MM-DD)'}), 400
+    except Exception as e:
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+    totals = {col: sum(row[col] for row in rows) for col in ('messages', 'prompt_tokens', 'completion_tokens', 'total_tokens')}
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'rows': rows,
+        'totals': totals
+    }), 200
+
+@admin_bp.route('/usage.csv', methods=['GET'])
+@token_required
+@admin_required
+@read_replica
+def export_usage_csv(current_user):
+    """Exporta o relatório de consumo em CSV (admin only)"""
+    try:
+        start, end, rows = _usage_report()
+    except ValueError:
+        return jsonify({'message': 'Datas inválidas (use AAAA-MM-DD)'}), 400
+    except Exception as e:
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+    filename = f"usage_{start.isoformat()}_{end.isoformat()}.csv"
+    return Response(
+        usage.to_csv(rows),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @admin_bp.route('/system-info', methods=['GET'])
 @token_required
 @admin_required
@@ -224,21 +287,38 @@ def get_system_info(current_user):
         # Informações do banco de dados
         db_info = {
             'database_url': os.getenv('DATABASE_URL', 'Not configured'),
-            'total_tables': len(db.metadata.tables)
+            'total_tables': len(db.metadata.tables),
+            'schema_version': schema_version(),
+            'schema_stamp': get_schema_stamp(),
+            'replica': replica_status()
         }
         
         # Informações da aplicação
         app_info = {
             'openai_configured': bool(os.getenv('OPENAI_API_KEY')),
             'assistant_id': os.getenv('OPENAI_ASSISTANT_ID', 'Not configured'),
-            'cors_origins': os.getenv('CORS_ORIGINS', 'Not configured')
+            'cors_origins': os.getenv('CORS_ORIGINS', 'Not configured'),
+            'background_jobs': queue_stats(),
+            'tracing': tracing.stats()
         }
         
         return jsonify({
             'system': system_info,
             'database': db_info,
-            'application': app_info
+            'application': app_info,
+            'workers': worker_stats.aggregate(current_app),
+            'startup': startup.report()
         }), 200
         
     except Exception as e:
-        return jsonify({'message': 'Erro ao obter informações do sistema'}), 500
\ No newline at end of file
+        return jsonify({'message': 'Erro ao obter informações do sistema'}), 500
+
+@admin_bp.route('/metrics', methods=['GET'])
+@token_required
+@admin_required
+def get_metrics(current_user):
+    """Métricas de runtime do worker que atendeu (admin only)"""
+    data = metrics.snapshot()
+    data['db_pool'] = pool_stats(current_app, db)
+    data['openai_breaker'] = openai_breaker.breaker.stats()
+    return jsonify(data), 200
@@ -1,110 +1,170 @@
 from flask import Blueprint, request, jsonify, send_file, send_from_directory, Response
+from werkzeug.security import safe_join
 from ..models.user import db, User, Conversation, Message  # ← CORRIGIDO
 from ..utils.auth import token_required, admin_required  # ← CORRIGIDO
+from ..utils.compression import brotli, choose_encoding, compress_bytes
+import hashlib
 import os
 import mimetypes
+import threading
+import time
 
 admin_routes_bp = Blueprint('admin_routes', __name__)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# Intervalo mínimo entre verificações de mtime (segundos); negativo = nunca recarrega
+ADMIN_ASSETS_RELOAD_INTERVAL = float(os.getenv('ADMIN_ASSETS_RELOAD_INTERVAL', '5'))
+
+# Arquivos versionados (?v=<hash>) podem ficar em cache por um ano
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+
+# ────────────────────────────────
+# Cache em memória dos arquivos do painel
+# ────────────────────────────────
+class _Asset:
+    """Arquivo do painel carregado em memória com variantes pré-comprimidas"""
+
+    def __init__(self, path, body, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {None: body}
+        if len(body) > 256 and self.mimetype.startswith(('text/', 'application/javascript', 'application/json', 'image/svg')):
+            self.variants['gzip'] = compress_bytes(body, 'gzip')
+            if brotli is not None:
+                self.variants['br'] = compress_bytes(body, 'br')
+        # admin.html: versão do admin.js usada ao reescrever o <script>
+        self.depends_on = None
+
+
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+def _find_asset_path(filename):
+    """Procura primeiro em static/ e depois no diretório de rotas"""
+    for base in (STATIC_DIR, BASE_DIR):
+        path = safe_join(base, filename)
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def _load_asset(filename, js=None):
+    """Lê o arquivo; admin.html recebe o admin.js já resolvido (fora do lock)"""
+    path = _find_asset_path(filename)
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        body = f.read()
+    mtime = os.path.getmtime(path)
+
+    depends_on = None
+    if filename == 'admin.html':
+        # Versiona o admin.js pelo hash do conteúdo: o navegador pode
+        # guardá-lo indefinidamente e busca de novo só quando ele mudar
+        if js is not None:
+            depends_on = js.version
+            body = body.replace(b'src="admin.js"', f'src="admin.js?v={js.version}"'.encode())
+
+    asset = _Asset(path, body, mtime)
+    asset.depends_on = depends_on
+    return asset
+
+
+def _is_stale(filename, asset):
+    if ADMIN_ASSETS_RELOAD_INTERVAL < 0:
+        return False
+    now = time.monotonic()
+    if now - asset.checked_at < ADMIN_ASSETS_RELOAD_INTERVAL:
+        return False
+    asset.checked_at = now
+    try:
+        if os.path.getmtime(asset.path) != asset.mtime:
+            return True
+    except OSError:
+        return True
+    if filename == 'admin.html':
+        js = get_asset('admin.js')
+        return js is not None and js.version != asset.depends_on
+    return False
+
+
+def get_asset(filename):
+    """Retorna o arquivo do cache, carregando/recarregando quando preciso"""
+    asset = _assets.get(filename)
+    if asset is not None and not _is_stale(filename, asset):
+        return asset
+    # Resolvido antes do lock: get_asset('admin.js') também o usa (Lock não é reentrante)
+    js = get_asset('admin.js') if filename == 'admin.html' else None
+    with _assets_lock:
+        asset = _load_asset(filename, js)
+        if asset is None:
+            _assets.pop(filename, None)
+        else:
+            _assets[filename] = asset
+    return asset
+
+
+def _serve_asset(asset, versioned=False):
+    """Responde com a variante adequada ao Accept-Encoding, ETag forte e 304"""
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding not in asset.variants:
+        encoding = 'gzip' if 'gzip' in asset.variants and request.accept_encodings['gzip'] > 0 else None
+    etag = asset.version if encoding is None else f'{asset.version}-{encoding}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE
+    return response
+
+
+@admin_routes_bp.record_once
+def _preload_assets(state):
+    """Carrega os arquivos do painel no registro do blueprint (boot)"""
+    for filename in ('admin.js', 'admin.html'):
+        get_asset(filename)
+
+
 @admin_routes_bp.route('/admin')
 def admin_panel():
     """Serve a interface administrativa - SEM AUTENTICAÇÃO NA ROTA"""
-    try:
-        # Tenta primeiro com 'static' no caminho
-        admin_html_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), 
-            'static', 
-            'admin.html'
-        )
-        
-        # Se não encontrar, tenta sem 'static'
-        if not os.path.exists(admin_html_path):
-            admin_html_path = os.path.join(
-                os.path.dirname(os.path.abspath(__file__)), 
-                'admin.html'
-            )
-        
-        # Verifica se o arquivo existe
-        if not os.path.exists(admin_html_path):
-            return jsonify({
-                'error': 'Interface administrativa não encontrada',
-                'path_checked': admin_html_path,
-                'current_dir': os.path.dirname(os.path.abspath(__file__)),
-                'files_in_dir': os.listdir(os.path.dirname(os.path.abspath(__file__)))
-            }), 404
-        
-        # Lê e retorna o arquivo HTML
-        with open(admin_html_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        return Response(content, mimetype='text/html')
-        
-    except Exception as e:
+    asset = get_asset('admin.html')
+    if asset is None:
         return jsonify({
-            'error': 'Erro ao carregar interface administrativa',
-            'details': str(e)
-        }), 500
+            'error': 'Interface administrativa não encontrada',
+            'current_dir': BASE_DIR,
+        }), 404
+    return _serve_asset(asset)
 
 @admin_routes_bp.route('/admin.js')
 def admin_js():
     """Serve o JavaScript da interface administrativa"""
-    try:
-        # Tenta primeiro com 'static' no caminho
-        admin_js_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), 
-            'static', 
-            'admin.js'
-        )
-        
-        # Se não encontrar, tenta sem 'static'
-        if not os.path.exists(admin_js_path):
-            admin_js_path = os.path.join(
-                os.path.dirname(os.path.abspath(__file__)), 
-                'admin.js'
-            )
-        
-        # Verifica se o arquivo existe
-        if not os.path.exists(admin_js_path):
-            return jsonify({
-                'error': 'JavaScript do admin não encontrado',
-                'path_checked': admin_js_path
-            }), 404
-        
-        # Lê e retorna o arquivo JS
-        with open(admin_js_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        return Response(content, mimetype='application/javascript')
-        
-    except Exception as e:
-        return jsonify({
-            'error': 'Erro ao carregar JavaScript',
-            'details': str(e)
-        }), 500
+    asset = get_asset('admin.js')
+    if asset is None:
+        return jsonify({'error': 'JavaScript do admin não encontrado'}), 404
+    return _serve_asset(asset, versioned=request.args.get('v') == asset.version)
 
 @admin_routes_bp.route('/admin/<path:filename>')
 def admin_static(filename):
     """Serve arquivos estáticos adicionais do admin (CSS, imagens, etc)"""
-    try:
-        # Diretório base
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Tenta primeiro na pasta static
-        static_dir = os.path.join(base_dir, 'static')
-        if os.path.exists(os.path.join(static_dir, filename)):
-            return send_from_directory(static_dir, filename)
-        
-        # Se não encontrar, tenta no diretório principal
-        if os.path.exists(os.path.join(base_dir, filename)):
-            return send_from_directory(base_dir, filename)
-        
+    asset = get_asset(filename)
+    if asset is None:
         return jsonify({'error': f'Arquivo {filename} não encontrado'}), 404
-        
-    except Exception as e:
-        return jsonify({
-            'error': 'Erro ao carregar arquivo',
-            'details': str(e)
-        }), 500
+    return _serve_asset(asset, versioned=request.args.get('v') == asset.version)
 
 # Rota de debug para verificar a estrutura de arquivos
 @admin_routes_bp.route('/admin/debug')
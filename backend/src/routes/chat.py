@@ -1,16 +1,23 @@
-from flask import Blueprint, request, jsonify
-from ..models.user import db, User, Conversation, Message  # ← CORRIGIDO
+from flask import Blueprint, Response, current_app, g, request, jsonify, stream_with_context
+from ..models.user import db, Conversation, Message, UploadedFile  # ← CORRIGIDO
 from ..utils.auth import token_required  # ← CORRIGIDO
-from ..utils.openai_client import get_openai_client  # ← CORRIGIDO
-import os
+from ..utils.openai_client import record_inbound  # ← CORRIGIDO
+from ..utils.logging_config import get_logger, bind_log_context
+from ..utils.rate_limit import rate_limit, limit_concurrent_runs
+from ..utils.idempotency import defer_result, idempotent
+from ..utils import (
+    answer_cache, archive, context_window, llm_backends, metrics, openai_breaker, openai_gc, run_queue, titles,
+    tracing, usage, worker_stats,
+)
+from ..utils.http_cache import conditional_json, make_etag
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
 from datetime import datetime
-import uuid
+from functools import partial
 import time
 
 chat_bp = Blueprint("chat", __name__)
-
-# Configuração do Assistant ID
-ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
+logger = get_logger(__name__)
 
 
 # ────────────────────────────────
@@ -24,16 +31,24 @@ def get_conversations(current_user):
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 20, type=int)
 
-        conversations = (
-            Conversation.query.filter_by(user_id=current_user.id)
-            .order_by(Conversation.updated_at.desc())
-            .paginate(page=page, per_page=per_page, error_out=False)
+        # Toda alteração relevante muda updated_at ou a contagem de conversas
+        total, last_update = (
+            db.session.query(func.count(Conversation.id), func.max(Conversation.updated_at))
+            .filter(Conversation.user_id == current_user.id)
+            .one()
         )
+        etag = make_etag("conversations", current_user.id, page, per_page, total, last_update)
+
+        def build():
+            conversations = (
+                Conversation.query.filter_by(user_id=current_user.id)
+                .options(selectinload(Conversation.archive))  # message_count sem uma consulta por conversa
+                .order_by(Conversation.updated_at.desc())
+                .paginate(page=page, per_page=per_page, error_out=False)
+            )
+            return {"conversations": [c.to_dict() for c in conversations.items]}
 
-        return (
-            jsonify({"conversations": [c.to_dict() for c in conversations.items]}),
-            200,
-        )
+        return conditional_json(etag, build)
 
     except Exception:
         return jsonify({"message": "Erro interno do servidor"}), 500
@@ -73,8 +88,9 @@ def create_conversation(current_user):
 def delete_all_conversations(current_user):
     """Remove todas as conversas do usuário"""
     try:
-        Conversation.query.filter_by(user_id=current_user.id).delete()
-        db.session.commit()
+        # Remoção por lotes em SQL; a limpeza na OpenAI fica para o worker de jobs
+        removed = openai_gc.delete_user_conversations(current_user.id)
+        logger.info("conversas removidas", extra={"removed": removed})
         return "", 204
     except Exception:
         db.session.rollback()
@@ -96,21 +112,33 @@ def get_conversation(current_user, conversation_id):
         if not conversation:
             return jsonify({"message": "Conversa não encontrada"}), 404
 
-        messages = (
-            Message.query.filter_by(conversation_id=conversation_id)
-            .order_by(Message.timestamp.asc())
-            .all()
-        )
+        etag = make_etag("conversation", *_conversation_version(conversation))
 
-        data = conversation.to_dict()
-        data["messages"] = [m.to_dict() for m in messages]
+        def build():
+            messages = archive.all_messages(conversation)
+            data = conversation.to_dict()
+            data["messages"] = [m.to_dict() for m in messages]
+            return {"conversation": data}
 
-        return jsonify({"conversation": data}), 200
+        return conditional_json(etag, build)
 
     except Exception:
         return jsonify({"message": "Erro interno do servidor"}), 500
 
 
+def _conversation_version(conversation):
+    """Partes da ETag de uma conversa: updated_at, nº de mensagens e último id"""
+    count, last_id = (
+        db.session.query(func.count(Message.id), func.max(Message.id))
+        .filter(Message.conversation_id == conversation.id)
+        .one()
+    )
+    if conversation.archive is not None:
+        count += conversation.archive.message_count
+        last_id = last_id or conversation.archive.last_message_id
+    return conversation.id, conversation.updated_at, count, last_id
+
+
 # ────────────────────────────────
 # PATCH /chat/conversations/<id>
 # ────────────────────────────────
@@ -128,10 +156,21 @@ def update_conversation(current_user, conversation_id):
 
         data = request.get_json() or {}
         title = data.get("title")
-        if not title:
+        strategy = data.get("context_strategy")
+        backend = data.get("llm_backend")
+        if not title and not strategy and not backend:
             return jsonify({"message": "Título é obrigatório"}), 400
-
-        conversation.title = title
+        if strategy and strategy not in context_window.STRATEGIES:
+            return jsonify({"message": "Estratégia de contexto inválida"}), 400
+        if backend and backend not in llm_backends.BACKENDS:
+            return jsonify({"message": "Backend inválido"}), 400
+
+        if title:
+            conversation.title = title
+        if strategy:
+            conversation.context_strategy = strategy
+        if backend:
+            conversation.llm_backend = backend
         conversation.updated_at = datetime.utcnow()
         db.session.commit()
 
@@ -157,7 +196,7 @@ def delete_conversation(current_user, conversation_id):
         if not conversation:
             return jsonify({"message": "Conversa não encontrada"}), 404
 
-        db.session.delete(conversation)
+        openai_gc.delete_conversation(conversation)
         db.session.commit()
         return "", 204
 
@@ -166,96 +205,17 @@ def delete_conversation(current_user, conversation_id):
         return jsonify({"message": "Erro interno do servidor"}), 500
 
 
-# ────────────────────────────────
-# Função para gerar título inteligente
-# ────────────────────────────────
-def generate_smart_title(content):
-    """Gera título inteligente baseado no conteúdo da mensagem"""
-    if not content:
-        return "Nova Conversa"
-    
-    # Remove pontuação e converte para minúsculas
-    import re
-    clean = re.sub(r'[^\w\s]', '', content.lower())
-    words = clean.split()
-    
-    # Palavras-chave para diferentes tipos de solicitação
-    keywords_map = {
-        'análise': ['analise', 'analisar', 'análise', 'examinar', 'avaliar'],
-        'resumo': ['resumir', 'resumo', 'sintetizar', 'síntese'],
-        'explicação': ['explicar', 'explique', 'como', 'o que é', 'definir'],
-        'tradução': ['traduzir', 'tradução', 'translate'],
-        'código': ['codigo', 'código', 'programar', 'script', 'função'],
-        'texto': ['escrever', 'redação', 'texto', 'artigo'],
-        'cálculo': ['calcular', 'matemática', 'equação', 'formula'],
-        'email': ['email', 'e-mail', 'carta', 'mensagem'],
-        'relatório': ['relatório', 'relatorio', 'report'],
-        'apresentação': ['apresentação', 'slide', 'powerpoint'],
-        'pesquisa': ['pesquisar', 'buscar', 'encontrar'],
-        'comparação': ['comparar', 'diferença', 'versus', 'vs'],
-        'dúvida': ['dúvida', 'duvida', 'pergunta', 'questão'],
-        'ajuda': ['ajuda', 'socorro', 'help', 'auxilio'],
-        'edital': ['edital', 'licitação', 'concurso'],
-        'contrato': ['contrato', 'acordo', 'termo'],
-        'imagem': ['imagem', 'foto', 'figura', 'picture'],
-        'documento': ['documento', 'pdf', 'arquivo', 'doc']
-    }
-    
-    # Identifica o tipo de solicitação
-    request_type = None
-    for category, keywords in keywords_map.items():
-        if any(keyword in words for keyword in keywords):
-            request_type = category
-            break
-    
-    # Identifica substantivos importantes (palavras com mais de 3 letras)
-    important_words = [w for w in words if len(w) > 3 and w not in [
-        'para', 'com', 'sobre', 'por', 'em', 'de', 'da', 'do', 'das', 'dos',
-        'que', 'qual', 'como', 'quando', 'onde', 'porque', 'este', 'esta',
-        'isso', 'aquilo', 'muito', 'mais', 'menos', 'melhor', 'pior',
-        'favor', 'pode', 'consegue', 'gostaria', 'preciso', 'quero'
-    ]]
-    
-    # Constrói o título
-    if request_type and important_words:
-        # Ex: "Análise Edital", "Resumo Documento"
-        main_word = important_words[0].title()
-        title = f"{request_type.title()} {main_word}"
-    elif request_type:
-        # Ex: "Análise", "Resumo"
-        title = request_type.title()
-    elif important_words:
-        # Ex: "Edital", "Documento"
-        title = " ".join(important_words[:2]).title()
-    else:
-        # Fallback: primeiras palavras
-        title = " ".join(words[:3]).title()
-    
-    # Limita o tamanho e garante que não está vazio
-    title = title[:30].strip()
-    return title if title else "Nova Conversa"
-
-
-# ────────────────────────────────
-# Função auxiliar para detectar tipo de arquivo
-# ────────────────────────────────
-def get_file_info(client, file_id):
-    """Obtém informações do arquivo da OpenAI"""
-    try:
-        file_info = client.files.retrieve(file_id)
-        return file_info
-    except Exception as e:
-        print(f"⚠️ Erro ao obter info do arquivo {file_id}: {e}")
-        return None
-
-
 # ────────────────────────────────
 # POST /chat/conversations/<id>/messages - CORRIGIDO PARA ARQUIVOS
 # ────────────────────────────────
 @chat_bp.route("/conversations/<int:conversation_id>/messages", methods=["POST"])
 @token_required
+@idempotent("send_message")
+@rate_limit("chat")
+@limit_concurrent_runs
 def send_message(current_user, conversation_id):
     """Envia mensagem do usuário e obtém resposta do assistente - COM SUPORTE CORRIGIDO A ARQUIVOS"""
+    bind_log_context(conversation_id=conversation_id)
     try:
         conversation = Conversation.query.filter_by(
             id=conversation_id, user_id=current_user.id
@@ -271,227 +231,334 @@ def send_message(current_user, conversation_id):
         if not content:
             return jsonify({"message": "Conteúdo da mensagem é obrigatório"}), 400
 
-        # Debug - mostra o que foi recebido
-        print(f"📩 Mensagem recebida: {content}")
-        print(f"📎 File IDs recebidos: {file_ids}")
-        print(f"📁 Arquivos originais: {[f.get('name', 'N/A') for f in original_files] if original_files else 'N/A'}")
+        # Fila da conversa cheia, ou sem tempo de esperar o turno à frente dentro
+        # do timeout do worker: recusa antes de gravar qualquer coisa
+        refusal = run_queue.refusal(conversation_id, _queue_wait_budget())
+        if refusal:
+            metrics.incr("run_queue", result=refusal)
+            response = jsonify({
+                "message": "Há muitas mensagens aguardando resposta nesta conversa. Aguarde e tente novamente."
+            })
+            response.status_code = 429
+            response.headers["Retry-After"] = "5"
+            return response
+
+        logger.info(
+            "mensagem recebida",
+            extra={"content_length": len(content), "file_ids": file_ids},
+        )
+        record_inbound("send_message", {
+            "conversation_id": conversation_id,
+            "content": content,
+            "file_ids": file_ids,
+            "original_files": original_files,
+        })
+
+        # Primeira mensagem da conversa? (só ela passa pelo cache de respostas)
+        is_first_turn = (
+            conversation.archive is None
+            and Message.query.filter_by(conversation_id=conversation_id).first() is None
+        )
 
         # 1) Salva mensagem do usuário
         user_msg = Message(conversation_id=conversation_id, content=content, role="user")
         db.session.add(user_msg)
+        db.session.flush()
+        if file_ids:
+            UploadedFile.query.filter(UploadedFile.file_id.in_(file_ids)).update(
+                {"conversation_id": conversation_id}, synchronize_session=False
+            )
 
-        # 2) Chama Assistants API com suporte a arquivos CORRIGIDO
-        try:
-            client = get_openai_client()  # ← USA O CLIENTE CENTRALIZADO
-            
-            # Cria ou reutiliza thread
-            if not conversation.thread_id:
-                # Sempre cria thread simples - anexamos arquivos via mensagem
-                thread = client.beta.threads.create()
-                print(f"🧵 Thread criado: {thread.id}")
-                
-                conversation.thread_id = thread.id
-                db.session.commit()
-            else:
-                thread_id = conversation.thread_id
-                print(f"🧵 Reutilizando thread: {thread_id}")
-                
-                # Se há arquivos, apenas prepara para processamento
-                if file_ids:
-                    print(f"📎 Preparando {len(file_ids)} arquivo(s) para processamento")
-
-            # Prepara conteúdo da mensagem - ESTRUTURA CORRIGIDA
-            message_content = []
-            
-            # Adiciona texto
-            if content.strip():
-                message_content.append({
-                    "type": "text",
-                    "text": content
-                })
-            
-            # Para arquivos, usa informações do frontend para detectar tipo
-            if file_ids:
-                print(f"📎 Processando {len(file_ids)} arquivo(s)")
-                for i, file_id in enumerate(file_ids):
-                    # Usa informações do arquivo original se disponível
-                    if original_files and i < len(original_files):
-                        original_file = original_files[i]
-                        filename = original_file.get('name', '').lower()
-                        file_type = original_file.get('type', '').lower()
-                        
-                        # Detecta se é imagem pelo tipo MIME ou nome
-                        is_image = (
-                            file_type.startswith('image/') or
-                            filename.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.svg')) or
-                            'image' in filename
-                        )
-                        
-                        if is_image:
-                            # Para imagens, usa image_file
-                            message_content.append({
-                                "type": "image_file",
-                                "image_file": {"file_id": file_id}
-                            })
-                            print(f"  - Imagem: {file_id} ({filename}) - tipo: {file_type}")
-                        else:
-                            # Para documentos (PDF, DOC, etc.), adiciona como anexo simples
-                            # O assistant deve estar configurado com file_search habilitado
-                            print(f"  - Documento: {file_id} ({filename}) - tipo: {file_type}")
-                            # Não adiciona ao content da mensagem - será processado automaticamente
-                            # se o assistant tiver file_search habilitado
-                    else:
-                        # Fallback: usa API da OpenAI para detectar tipo
-                        file_info = get_file_info(client, file_id)
-                        if file_info:
-                            filename = getattr(file_info, 'filename', '').lower()
-                            is_image = (
-                                filename.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.svg')) or
-                                'image' in filename
-                            )
-                            
-                            if is_image:
-                                message_content.append({
-                                    "type": "image_file", 
-                                    "image_file": {"file_id": file_id}
-                                })
-                                print(f"  - Imagem (API): {file_id} ({filename})")
-                            else:
-                                print(f"  - Documento (API): {file_id} ({filename})")
-                        else:
-                            print(f"  - Arquivo: {file_id} (tipo não identificado)")
-
-            # Cria mensagem no thread
-            message_data = {
-                "thread_id": conversation.thread_id,
-                "role": "user",
-                "content": message_content
-            }
-            
-            # Se há documentos (PDFs, etc.), adiciona attachments
-            document_files = []
-            if file_ids and original_files:
-                for i, file_id in enumerate(file_ids):
-                    if i < len(original_files):
-                        original_file = original_files[i]
-                        file_type = original_file.get('type', '').lower()
-                        is_image = file_type.startswith('image/')
-                        
-                        if not is_image:  # Se não é imagem, é documento
-                            document_files.append({
-                                "file_id": file_id,
-                                "tools": [{"type": "file_search"}]
-                            })
-            
-            if document_files:
-                message_data["attachments"] = document_files
-                print(f"📎 Anexando {len(document_files)} documento(s) com file_search")
-
-            thread_message = client.beta.threads.messages.create(**message_data)
-            print(f"✉️ Mensagem criada no thread: {thread_message.id}")
-
-            # Executa o assistant
-            run = client.beta.threads.runs.create(
-                thread_id=conversation.thread_id,
-                assistant_id=ASSISTANT_ID
+        turn = llm_backends.Turn(conversation, content, file_ids, original_files, user_msg.id)
+        backend = llm_backends.backend_for(turn)
+        namespace = backend.cache_namespace()
+
+        cache_key = None
+        assistant_reply = None
+        if answer_cache.ANSWER_CACHE_ENABLED and is_first_turn:
+            cache_key = answer_cache.cache_key(content, file_ids, namespace)
+            assistant_reply = answer_cache.lookup(cache_key, namespace)
+        cache_hit = assistant_reply is not None
+        document_type = usage.document_type_for(file_ids)
+
+        # 2) Resposta do cache: grava e devolve direto
+        if cache_hit:
+            logger.info("resposta servida pelo cache", extra={"cache_key": cache_key[:12]})
+            ai_msg = Message(
+                conversation_id=conversation_id,
+                content=assistant_reply,
+                role="assistant",
+                cache_hit=True,
+                status="completed",
+                document_type=document_type,
             )
-            print(f"🤖 Run iniciado: {run.id}")
-
-            # Aguarda conclusão
-            max_wait = 60  # timeout de 60 segundos
-            wait_time = 0
-            while run.status in ("queued", "in_progress") and wait_time < max_wait:
-                time.sleep(1)
-                wait_time += 1
-                run = client.beta.threads.runs.retrieve(
-                    thread_id=conversation.thread_id, run_id=run.id
-                )
-                if wait_time % 5 == 0:  # Log a cada 5 segundos
-                    print(f"⏳ Aguardando... Status: {run.status} ({wait_time}s)")
-
-            if run.status == "completed":
-                print("✅ Run completado com sucesso")
-                
-                # Busca resposta do assistant
-                messages = client.beta.threads.messages.list(
-                    thread_id=conversation.thread_id,
-                    order="desc",
-                    limit=1
-                ).data
-                
-                if messages:
-                    assistant_reply = ""
-                    for content_block in messages[0].content:
-                        if hasattr(content_block, 'text'):
-                            assistant_reply += content_block.text.value
-                    
-                    if not assistant_reply:
-                        assistant_reply = "Desculpe, não consegui processar sua mensagem."
-                else:
-                    assistant_reply = "Desculpe, não recebi resposta do assistente."
-                    
-            elif run.status == "failed":
-                error_info = getattr(run, 'last_error', 'Erro desconhecido')
-                print(f"❌ Run falhou: {error_info}")
-                assistant_reply = "Desculpe, ocorreu um erro ao processar sua mensagem."
-            elif wait_time >= max_wait:
-                print("⏰ Timeout aguardando resposta")
-                assistant_reply = "Desculpe, a resposta está demorando muito. Tente novamente."
-            else:
-                print(f"⚠️ Run terminou com status: {run.status}")
-                assistant_reply = "Desculpe, ocorreu um erro inesperado."
-                
-        except Exception as api_error:
-            print(f"🚨 Erro na API OpenAI: {api_error}")
-            assistant_reply = "Desculpe, estou temporariamente indisponível. Tente novamente mais tarde."
-
-        # 4) Salva resposta do assistente
+            db.session.add(ai_msg)
+            _touch_conversation(conversation, is_first_turn)
+            usage.record(ai_msg, current_user.id, total_ms=_elapsed_ms())
+            _commit("cache_hit")
+            if _wants_stream():
+                return _sse_response(iter(()), user_msg, ai_msg)
+            return jsonify({"user_message": user_msg.to_dict(), "assistant_message": ai_msg.to_dict()}), 200
+
+        # OpenAI degradada (circuito aberto): falha na hora, sem gravar a mensagem
+        # nem esperar o timeout do run – só o cache acima ainda responde
+        if backend.uses_openai and not openai_breaker.breaker.available():
+            db.session.rollback()
+            return openai_breaker.unavailable_response()
+
+        # 3) Mensagem pendente do assistente, visível (e cancelável) enquanto o run roda;
+        #    o commit aqui também evita segurar a transação durante a chamada ao modelo
         ai_msg = Message(
-            conversation_id=conversation_id, content=assistant_reply, role="assistant"
+            conversation_id=conversation_id,
+            content="",
+            role="assistant",
+            status="pending",
+            document_type=document_type,
         )
         db.session.add(ai_msg)
+        _touch_conversation(conversation, is_first_turn)
+        _commit("pending_message")
+        turn.is_cancelled = partial(_cancel_requested, ai_msg.id)
+
+        # 4) Gera a resposta no backend da conversa (Assistants, chat ou local)
+        events = _run_turn(backend, turn, ai_msg, cache_key, namespace)
+        if _wants_stream():
+            return _sse_response(events, user_msg, ai_msg)
+        for _ in events:
+            pass
+
+        response = jsonify(
+            {
+                "user_message": user_msg.to_dict(),
+                "assistant_message": ai_msg.to_dict(),
+            }
+        )
+        # Idempotency-Key: como no SSE, só o turno concluído é repetido
+        completed = ai_msg.status == "completed"
+        return defer_result(response, lambda: (200, response.get_data(as_text=True)) if completed else None)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("erro geral em send_message: %s", e)
+        return jsonify({"message": "Erro interno do servidor"}), 500
+
+
+QUEUE_TIMEOUT_REPLY = "A conversa ainda está processando a mensagem anterior. Tente novamente em instantes."
 
-        # 5) Atualiza meta-dados da conversa
-        conversation.updated_at = datetime.utcnow()
-        
-        # Define título automático inteligente APENAS na primeira mensagem do usuário
-        if not conversation.title or conversation.title == "Nova Conversa":
-            # Conta apenas mensagens do usuário para determinar se é a primeira
-            user_messages_count = Message.query.filter_by(
-                conversation_id=conversation_id, 
-                role="user"
-            ).count()
-            
-            if user_messages_count <= 1:  # Primeira mensagem do usuário
-                # Limpa instruções do sistema para criar título
-                clean_content = content
-                if "SISTEMA:" in content:
-                    # Extrai apenas a pergunta do usuário
-                    parts = content.split("PERGUNTA DO USUÁRIO: ")
-                    if len(parts) > 1:
-                        clean_content = parts[1]
-                
-                # Gera título inteligente baseado em palavras-chave
-                title = generate_smart_title(clean_content)
-                conversation.title = title
-                print(f"📝 Título gerado automaticamente: '{title}'")
 
+def _commit(phase):
+    """Commit do send_message com span próprio (o flush aparece como db.query filhos)"""
+    with tracing.span("chat.commit", phase=phase):
         db.session.commit()
-        print("💾 Dados salvos no banco")
 
-        return (
-            jsonify(
-                {
-                    "user_message": user_msg.to_dict(),
-                    "assistant_message": ai_msg.to_dict(),
-                }
-            ),
-            200,
-        )
+
+def _touch_conversation(conversation, is_first_turn):
+    conversation.updated_at = datetime.utcnow()
+    # Título automático na primeira mensagem: gerado em segundo plano (utils/titles.py)
+    if is_first_turn and titles.needs_title(conversation):
+        titles.enqueue_title(conversation.id)
+
+
+def _elapsed_ms():
+    """Tempo desde o início do request (marcado em logging_config)"""
+    started = g.get("request_started")
+    return (time.perf_counter() - started) * 1000 if started is not None else None
+
+
+def _queue_wait_budget():
+    """Espera máxima na fila para este request (utils/run_queue.py)"""
+    return run_queue.wait_budget(llm_backends.RUN_MAX_WAIT_SECONDS, (_elapsed_ms() or 0) / 1000)
+
+
+def _wants_stream():
+    """Streaming SSE: ?stream=1 ou Accept: text/event-stream"""
+    return (
+        request.args.get("stream", "").lower() in ("1", "true")
+        or "text/event-stream" in request.headers.get("Accept", "")
+    )
+
+
+def _cancel_requested(message_id):
+    """Lê o status numa conexão própria: enxerga o cancelamento feito por outro worker"""
+    with db.engine.connect() as conn:
+        status = conn.execute(select(Message.status).where(Message.id == message_id)).scalar()
+    return status == "cancelled"
+
+
+def _run_turn(backend, turn, ai_msg, cache_key, namespace):
+    """
+    Espera a vez na fila da conversa (utils/run_queue.py), consome o stream
+    do backend repassando os eventos e grava o resultado na mensagem
+    pendente. Se o gerador for fechado antes do fim (cliente desconectou do
+    streaming), o backend cancela o run e a mensagem fica como cancelada.
+    """
+    slot = run_queue.RunSlot(turn.conversation.id, ai_msg.id)
+    events = None
+    reply = None
+    queue_ms = 0
+    try:
+        waited = time.monotonic()
+        deadline = waited + _queue_wait_budget()
+        queued = False
+        with tracing.span("chat.queue_wait") as span:
+            while not slot.try_acquire():
+                queued = True
+                if turn.cancelled():
+                    reply = llm_backends.Reply(llm_backends.CANCELLED_REPLY, backend=backend.name, status="cancelled")
+                    return
+                if time.monotonic() > deadline:
+                    metrics.incr("run_queue", result="timeout")
+                    logger.warning("tempo de espera na fila da conversa esgotado")
+                    span.set_error("tempo de espera esgotado")
+                    reply = llm_backends.Reply(QUEUE_TIMEOUT_REPLY, backend=backend.name, status="failed")
+                    return
+                yield "queued", {"position": slot.position()}
+                time.sleep(run_queue.RUN_QUEUE_POLL_INTERVAL)
+            span.set_attribute("queued", queued)
+        queue_ms = (time.monotonic() - waited) * 1000
+        if queued:
+            metrics.incr("run_queue", result="waited")
+            metrics.observe("run_queue_wait_ms", queue_ms)
+            # O turno anterior pode ter criado/trocado o thread da conversa
+            db.session.refresh(turn.conversation)
+
+        with tracing.span(f"llm.{backend.name}", message_id=ai_msg.id) as span, worker_stats.run_in_flight():
+            events = backend.stream(turn)
+            for kind, data in events:
+                if kind == "started":
+                    ai_msg.run_id = data.get("run_id") or f"local_{ai_msg.id}"
+                    span.set_attribute("run_id", ai_msg.run_id)
+                    _commit("run_started")
+                elif kind == "done":
+                    reply = data
+                    span.set_attribute("status", reply.status)
+                yield kind, data
+    except GeneratorExit:
+        if events is not None:
+            events.close()
+        logger.info("cliente desconectou; resposta cancelada", extra={"run_id": ai_msg.run_id})
+        reply = llm_backends.Reply(llm_backends.CANCELLED_REPLY, backend=backend.name, status="cancelled")
+        raise
+    except Exception:
+        db.session.rollback()
+        reply = llm_backends.Reply(llm_backends.FALLBACK_REPLY, backend=backend.name, status="failed")
+        raise
+    finally:
+        try:
+            if not _finish_turn(turn, ai_msg, reply, cache_key, namespace, queue_ms):
+                # Pendente, a mensagem seguraria a fila da conversa até ficar velha
+                run_queue.mark_failed(slot.message_id)
+        except Exception as e:
+            logger.warning("falha ao marcar mensagem como falha: %s", e)
+        finally:
+            # Só depois de gravar: o próximo da fila não vê esta mensagem ainda pendente
+            slot.release()
+
+
+def _finish_turn(turn, ai_msg, reply, cache_key, namespace, queue_ms=0):
+    conversation = turn.conversation
+    try:
+        # O endpoint de cancelamento pode ter marcado a mensagem em outro worker
+        current = db.session.query(Message.status).filter_by(id=ai_msg.id).scalar()
+        if reply.completed:
+            status = "completed"  # run concluído mesmo com o cancelamento: a resposta vale
+        elif reply.status == "cancelled" or current == "cancelled":
+            status = "cancelled"
+        else:
+            status = "failed"
+        ai_msg.content = reply.text
+        ai_msg.status = status
+        usage.record(ai_msg, conversation.user_id, reply, queue_ms=queue_ms, total_ms=_elapsed_ms())
+        conversation.updated_at = datetime.utcnow()
+        context_window.record_usage(conversation, reply.usage)
+        if reply.completed and cache_key:
+            answer_cache.store(cache_key, namespace, reply.text)
+        _commit("finish_turn")
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("erro ao gravar resposta do assistente: %s", e)
+        return False
+    return True
+
+
+def _sse_response(events, user_msg, ai_msg):
+    """
+    Eventos: message (mensagens gravadas), queued (posição na fila da
+    conversa), started (run_id para cancelar), delta (trecho da resposta)
+    e done (mensagem final). Enquanto o run está
+    na fila é enviado um comentário a cada consulta – é a escrita no socket
+    que revela que o cliente foi embora.
+    """
+    def pack(event, payload):
+        return f"event: {event}\ndata: {current_app.json.dumps(payload)}\n\n"
+
+    first = {"user_message": user_msg.to_dict(), "assistant_message": ai_msg.to_dict()}
+    final = {}
+
+    def generate():
+        yield pack("message", first)
+        for kind, data in events:
+            if kind == "started":
+                yield pack("started", {"run_id": ai_msg.run_id, "message_id": ai_msg.id})
+            elif kind == "delta":
+                yield pack("delta", {"content": data})
+            elif kind == "queued":
+                yield pack("queued", data)
+            elif kind == "waiting":
+                yield ": aguardando\n\n"
+        assistant = ai_msg.to_dict()
+        if ai_msg.status == "completed":
+            final["body"] = current_app.json.dumps({"user_message": first["user_message"], "assistant_message": assistant})
+        yield pack("done", {"assistant_message": assistant})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Idempotency-Key: repete a resposta JSON do turno concluído; cancelado ou
+    # com falha (stream interrompido) libera a chave para uma nova tentativa
+    return defer_result(response, lambda: (200, final["body"]) if "body" in final else None)
+
+
+# ────────────────────────────────
+# POST /chat/conversations/<id>/runs/<run_id>/cancel
+# ────────────────────────────────
+@chat_bp.route("/conversations/<int:conversation_id>/runs/<run_id>/cancel", methods=["POST"])
+@token_required
+def cancel_run(current_user, conversation_id, run_id):
+    """Cancela a resposta em andamento: runs.cancel na OpenAI e mensagem marcada como cancelada"""
+    bind_log_context(conversation_id=conversation_id)
+    try:
+        conversation = Conversation.query.filter_by(
+            id=conversation_id, user_id=current_user.id
+        ).first()
+        if not conversation:
+            return jsonify({"message": "Conversa não encontrada"}), 404
+
+        message = Message.query.filter_by(
+            conversation_id=conversation_id, run_id=run_id, role="assistant"
+        ).first()
+        if not message:
+            return jsonify({"message": "Run não encontrado"}), 404
+        if message.status != "pending":
+            return jsonify({
+                "message": "A resposta já foi concluída",
+                "assistant_message": message.to_dict(),
+            }), 409
+
+        llm_backends.cancel_run(conversation, run_id)
+        message.status = "cancelled"
+        if not message.content:
+            message.content = llm_backends.CANCELLED_REPLY
+        conversation.updated_at = datetime.utcnow()
+        db.session.commit()
+        logger.info("resposta cancelada pelo usuário", extra={"run_id": run_id})
+        return jsonify({"message": "Resposta cancelada", "assistant_message": message.to_dict()}), 200
 
     except Exception as e:
         db.session.rollback()
-        print(f"🚨 Erro geral: {e}")
+        logger.exception("erro ao cancelar run: %s", e)
         return jsonify({"message": "Erro interno do servidor"}), 500
 
 
@@ -511,17 +578,27 @@ def get_messages(current_user, conversation_id):
 
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 50, type=int)
+        since_id = request.args.get("since_id", type=int)
 
-        messages = (
-            Message.query.filter_by(conversation_id=conversation_id)
-            .order_by(Message.timestamp.asc())
-            .paginate(page=page, per_page=per_page, error_out=False)
+        etag = make_etag(
+            "messages", *_conversation_version(conversation), page, per_page, since_id
         )
 
-        return (
-            jsonify({"messages": [m.to_dict() for m in messages.items]}),
-            200,
-        )
+        def build():
+            if since_id is not None:
+                # Modo delta: apenas mensagens mais novas que since_id
+                newer = archive.messages_since(conversation, since_id, per_page + 1)
+                items = newer[:per_page]
+                return {
+                    "messages": [m.to_dict() for m in items],
+                    "has_more": len(newer) > per_page,
+                    "last_id": items[-1].id if items else since_id,
+                }
+
+            messages = archive.message_page(conversation, page, per_page)
+            return {"messages": [m.to_dict() for m in messages]}
+
+        return conditional_json(etag, build)
 
     except Exception:
         return jsonify({"message": "Erro interno do servidor"}), 500
\ No newline at end of file
@@ -1,15 +1,19 @@
 # backend/src/routes/upload.py
+import hashlib
 import os
 import uuid
 import shutil
 import tempfile
+import time
 from flask import Blueprint, request, jsonify, current_app
-from openai import OpenAI
+from ..models.user import db, UploadedFile
+from ..utils.logging_config import get_logger
+from ..utils.openai_client import get_openai_client, record_inbound
+from ..utils.rate_limit import rate_limit
+from ..utils import openai_breaker, tracing
 
 upload_bp = Blueprint("upload_bp", __name__)  # ← REMOVIDO url_prefix="/api"
-
-# inicialize o client uma vez, usando sua API key do .env
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = get_logger(__name__)
 
 def is_image_file(filename, content_type):
     """Detecta se o arquivo é uma imagem"""
@@ -31,58 +35,110 @@ def is_image_file(filename, content_type):
     
     return False
 
+def _file_size(storage):
+    """Tamanho do arquivo enviado sem consumir o stream"""
+    stream = storage.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 @upload_bp.route("/upload", methods=["POST"])  # ← MUDADO para /upload apenas
+@rate_limit("upload")
 def upload_files():
     """
     Recebe multipart/form-data com chave "files",
     faz upload para OpenAI e retorna [{"filename", "file_id"}].
     """
-    print(">>>> ROTA /upload FOI ACIONADA, arquivos enviados:", list(request.files.keys()))
     if "files" not in request.files:
         return jsonify({"error": "Nenhum arquivo enviado"}), 400
 
+    if not openai_breaker.breaker.available():
+        return openai_breaker.unavailable_response()
+
     files = request.files.getlist("files")
     uploaded = []
+    client = get_openai_client()
+    record_inbound("upload_files", [
+        {"filename": f.filename, "content_type": f.content_type, "bytes": _file_size(f)}
+        for f in files
+    ])
 
     for f in files:
         # Detecta se é imagem
         is_image = is_image_file(f.filename, f.content_type)
-        print(f"📁 Processando: {f.filename} ({f.content_type}) - Imagem: {is_image}")
         
         # grava em arquivo temporário MANTENDO A EXTENSÃO
         file_extension = os.path.splitext(f.filename)[1] if f.filename else ""
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        f.save(tmp.name)
-        tmp.close()
+        with tracing.span("upload.spool", content_type=f.content_type):
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
+            f.save(tmp.name)
+            tmp.close()
+            digest = _sha256_file(tmp.name)
 
         try:
+            started = time.perf_counter()
             # envia à OpenAI com purpose apropriado
-            with open(tmp.name, "rb") as fd:
+            with open(tmp.name, "rb") as fd, tracing.span(
+                "openai.files.create", tracing.KIND_CLIENT,
+                content_type=f.content_type, bytes=os.path.getsize(tmp.name), is_image=is_image,
+            ) as span:
                 if is_image:
                     # Para imagens, usa purpose="vision" e preserva nome original
                     resp = client.files.create(
                         file=(f.filename, fd, f.content_type), 
                         purpose="vision"
                     )
-                    print(f"✅ Imagem enviada com purpose=vision: {resp.id}")
                 else:
                     # Para outros arquivos, usa purpose="assistants"
                     resp = client.files.create(
                         file=(f.filename, fd, f.content_type), 
                         purpose="assistants"
                     )
-                    print(f"✅ Documento enviado com purpose=assistants: {resp.id}")
+                span.set_attribute("file_id", resp.id)
 
+            logger.info(
+                "arquivo enviado à OpenAI",
+                extra={
+                    "file_id": resp.id,
+                    "content_type": f.content_type,
+                    "is_image": is_image,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
             uploaded.append({
                 "filename": f.filename,
                 "file_id": resp.id
             })
+            # Hash do conteúdo – usado como chave do cache de respostas
+            db.session.add(UploadedFile(
+                file_id=resp.id,
+                sha256=digest,
+                filename=f.filename,
+                content_type=f.content_type,
+                size=os.path.getsize(tmp.name),
+            ))
             
         except Exception as e:
-            print(f"❌ Erro ao enviar arquivo {f.filename}: {e}")
+            logger.exception("erro ao enviar arquivo %s: %s", f.filename, e)
             return jsonify({"error": f"Erro ao processar arquivo {f.filename}: {str(e)}"}), 500
         finally:
             # Remove arquivo temporário
             os.unlink(tmp.name)
 
+    try:
+        with tracing.span("upload.commit", files=len(uploaded)):
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("falha ao registrar arquivos enviados: %s", e)
+
     return jsonify({"data": uploaded}), 200
\ No newline at end of file
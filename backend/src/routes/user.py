@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from ..models.user import db, User  # ← CORRIGIDO
 from ..utils.auth import token_required, admin_required, validate_json_data  # ← CORRIGIDO
+from ..utils.replica import read_replica
 import re
 
 user_bp = Blueprint('user', __name__)
@@ -19,6 +20,7 @@ def validate_username(username):
 @user_bp.route('/users', methods=['GET'])
 @token_required
 @admin_required
+@read_replica
 def get_users(current_user):
     """Lista todos os usuários (apenas admin)"""
     try:
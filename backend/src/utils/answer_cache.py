@@ -0,0 +1,170 @@
+# backend/src/utils/answer_cache.py
+"""
+Cache exato de respostas para a primeira mensagem de uma conversa.
+
+Boa parte do tráfego é a mesma pergunta inicial ("resuma este edital") sobre
+o mesmo arquivo. A chave combina o texto normalizado da pergunta, os hashes
+SHA-256 do conteúdo dos anexos (gravados em /api/upload) e o namespace do
+backend de LLM (assistant id, ou "chat:<modelo>"); assim, trocar
+OPENAI_ASSISTANT_ID ou CHAT_MODEL invalida o cache automaticamente. A coluna
+assistant_id guarda esse namespace.
+
+Variáveis de ambiente:
+  ANSWER_CACHE_ENABLED      – true | false            (padrão: false)
+  ANSWER_CACHE_TTL_SECONDS  – validade das entradas   (padrão: 7 dias)
+  ANSWER_CACHE_MAX_ENTRIES  – limite de entradas; as menos usadas saem primeiro
+  ANSWER_CACHE_EVICT_INTERVAL – segundos entre limpezas agendadas (padrão: 300)
+
+A gravação vai num savepoint: duas primeiras mensagens iguais ao mesmo tempo
+disputam a mesma chave, e a perdedora só descarta a própria gravação – a
+resposta do turno não depende do cache. A limpeza (`evict`) roda na fila de
+tarefas (utils/jobs.py), agendada no máximo uma vez por intervalo.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from ..models.user import db, AnswerCacheEntry, UploadedFile
+from . import metrics
+from .jobs import enqueue, job_handler
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_EVICT_INTERVAL = float(os.getenv("ANSWER_CACHE_EVICT_INTERVAL", "300"))
+
+_last_evict_scheduled = None
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", text).strip().rstrip(".!?… ")
+
+
+def cache_key(content, file_ids, assistant_id):
+    """
+    Chave do cache, ou None quando a requisição não é cacheável
+    (algum anexo sem hash conhecido).
+    """
+    digests = []
+    if file_ids:
+        rows = UploadedFile.query.filter(UploadedFile.file_id.in_(file_ids)).all()
+        known = {row.file_id: row.sha256 for row in rows}
+        if len(known) != len(set(file_ids)):
+            return None
+        digests = sorted(known[f] for f in set(file_ids))
+
+    raw = json.dumps([normalize_prompt(content), digests, assistant_id], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(key, assistant_id):
+    """Retorna a resposta cacheada (e contabiliza o hit) ou None"""
+    if key is None:
+        metrics.incr("answer_cache", result="uncacheable")
+        return None
+
+    oldest = datetime.utcnow() - timedelta(seconds=ANSWER_CACHE_TTL_SECONDS)
+    entry = AnswerCacheEntry.query.filter(
+        AnswerCacheEntry.key == key,
+        AnswerCacheEntry.assistant_id == assistant_id,
+        AnswerCacheEntry.created_at >= oldest,
+    ).first()
+
+    if entry is None:
+        metrics.incr("answer_cache", result="miss")
+        return None
+
+    entry.hits += 1
+    entry.last_hit_at = datetime.utcnow()
+    metrics.incr("answer_cache", result="hit")
+    return entry.reply
+
+
+def store(key, assistant_id, reply):
+    """
+    Grava a resposta (na sessão atual – o commit é do chamador). Falhas só
+    são registradas: nunca desfazem o turno que gerou a resposta.
+    """
+    if key is None:
+        return
+    try:
+        with db.session.begin_nested():
+            entry = db.session.get(AnswerCacheEntry, key)
+            if entry is None:
+                entry = AnswerCacheEntry(key=key, assistant_id=assistant_id, reply=reply, hits=0)
+                db.session.add(entry)
+            else:
+                entry.assistant_id = assistant_id
+                entry.reply = reply
+                entry.created_at = datetime.utcnow()
+    except IntegrityError:
+        # Outro worker gravou a mesma chave primeiro: a entrada dele vale
+        metrics.incr("answer_cache", result="store_conflict")
+        return
+    except SQLAlchemyError as e:
+        metrics.incr("answer_cache", result="store_error")
+        logger.warning("falha ao gravar no cache de respostas: %s", e)
+        return
+    metrics.incr("answer_cache", result="store")
+    _schedule_evict()
+
+
+def _schedule_evict():
+    """Agenda a limpeza na fila de tarefas, no máximo uma vez por intervalo (por processo)"""
+    global _last_evict_scheduled
+    now = time.monotonic()
+    if _last_evict_scheduled is not None and now - _last_evict_scheduled < ANSWER_CACHE_EVICT_INTERVAL:
+        return
+    _last_evict_scheduled = now
+    enqueue("answer_cache_evict", {})
+
+
+@job_handler("answer_cache_evict")
+def evict_job(payload):
+    evict()
+
+
+def current_namespaces():
+    """Namespaces válidos: um por backend de LLM configurado"""
+    from .llm_backends import BACKENDS
+
+    return {backend.cache_namespace() for backend in BACKENDS.values()} - {None}
+
+
+def evict(namespaces=None):
+    """Remove entradas vencidas, de namespaces antigos e o excedente de tamanho"""
+    namespaces = current_namespaces() if namespaces is None else set(namespaces)
+    oldest = datetime.utcnow() - timedelta(seconds=ANSWER_CACHE_TTL_SECONDS)
+    removed = AnswerCacheEntry.query.filter(
+        (AnswerCacheEntry.created_at < oldest) | AnswerCacheEntry.assistant_id.notin_(namespaces)
+    ).delete(synchronize_session=False)
+
+    overflow = AnswerCacheEntry.query.count() - ANSWER_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        keys = [
+            k for (k,) in db.session.query(AnswerCacheEntry.key)
+            .order_by(AnswerCacheEntry.last_hit_at.asc())
+            .limit(overflow)
+        ]
+        removed += AnswerCacheEntry.query.filter(AnswerCacheEntry.key.in_(keys)).delete(
+            synchronize_session=False
+        )
+
+    if removed:
+        metrics.incr("answer_cache_evicted", removed)
+        logger.info("entradas removidas do cache de respostas", extra={"removed": removed})
+    return removed
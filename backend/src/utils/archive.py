@@ -0,0 +1,215 @@
+# backend/src/utils/archive.py
+"""
+Arquivamento das mensagens de conversas paradas.
+
+As mensagens de conversas sem atividade há ARCHIVE_AFTER_DAYS dias saem da
+tabela `messages` e vão, compactadas (JSON + zlib), para uma única linha
+por conversa em `messages_archive`. A tabela quente e seus índices ficam
+do tamanho do uso recente.
+
+A leitura é transparente: `message_page`, `messages_since` e
+`all_messages` devolvem objetos `Message` (transientes, fora da sessão)
+combinando os dois níveis em ordem de id. Se a conversa volta a ser usada,
+as mensagens novas ficam na tabela quente; num próximo arquivamento elas
+são anexadas à linha existente.
+
+    flask --app src.main archive-messages --days 180
+
+Variáveis de ambiente:
+  ARCHIVE_AFTER_DAYS   – dias sem atividade até arquivar  (padrão: 180)
+  ARCHIVE_BATCH_SIZE   – conversas por transação          (padrão: 200)
+"""
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime
+
+from ..models.user import db, ArchivedConversation, Conversation, Message
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+
+_DATETIME_COLUMNS = {c.name for c in Message.__table__.columns if isinstance(c.type, DateTime)}
+
+
+def _pack(rows):
+    raw = json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str)
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _row_from_message(message):
+    row = {}
+    for column in Message.__table__.columns:
+        value = getattr(message, column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        row[column.key] = value
+    return row
+
+
+def _message_from_row(row):
+    """Recria um Message transiente (não é adicionado à sessão)"""
+    fields = {}
+    for key, value in row.items():
+        if key in _DATETIME_COLUMNS and value is not None:
+            value = datetime.fromisoformat(value)
+        fields[key] = value
+    return Message(**{k: v for k, v in fields.items() if hasattr(Message, k)})
+
+
+# ────────────────────────────────
+# Leitura transparente
+# ────────────────────────────────
+def archived_messages(conversation):
+    """Mensagens arquivadas da conversa, em ordem de id"""
+    if conversation.archive is None:
+        return []
+    return [_message_from_row(row) for row in _unpack(conversation.archive.payload)]
+
+
+def archived_count(conversation):
+    return conversation.archive.message_count if conversation.archive else 0
+
+
+def all_messages(conversation):
+    """Todas as mensagens (arquivadas + quentes), em ordem cronológica"""
+    hot = (
+        Message.query.filter_by(conversation_id=conversation.id)
+        .order_by(Message.timestamp.asc())
+        .all()
+    )
+    return archived_messages(conversation) + hot
+
+
+def message_page(conversation, page, per_page):
+    """Página `page` da lista completa, sem carregar o arquivo à toa"""
+    offset = max(page - 1, 0) * per_page
+    n_archived = archived_count(conversation)
+
+    items = []
+    if offset < n_archived:
+        items = archived_messages(conversation)[offset:offset + per_page]
+    hot_offset = max(offset - n_archived, 0)
+    remaining = per_page - len(items)
+    if remaining > 0:
+        items += (
+            Message.query.filter_by(conversation_id=conversation.id)
+            .order_by(Message.timestamp.asc())
+            .offset(hot_offset)
+            .limit(remaining)
+            .all()
+        )
+    return items
+
+
+def messages_since(conversation, since_id, limit):
+    """Até `limit` mensagens com id > since_id, em ordem de id"""
+    items = []
+    archive = conversation.archive
+    if archive is not None and (archive.last_message_id or 0) > since_id:
+        items = [m for m in archived_messages(conversation) if m.id > since_id][:limit]
+    remaining = limit - len(items)
+    if remaining > 0:
+        items += (
+            Message.query.filter(
+                Message.conversation_id == conversation.id,
+                Message.id > since_id,
+            )
+            .order_by(Message.id.asc())
+            .limit(remaining)
+            .all()
+        )
+    return items
+
+
+# ────────────────────────────────
+# Job de arquivamento
+# ────────────────────────────────
+def _archive_conversation(conversation_id):
+    messages = (
+        Message.query.filter_by(conversation_id=conversation_id)
+        .order_by(Message.id.asc())
+        .all()
+    )
+    if not messages:
+        return 0
+
+    entry = db.session.get(ArchivedConversation, conversation_id)
+    rows = _unpack(entry.payload) if entry is not None else []
+    rows += [_row_from_message(m) for m in messages]
+
+    if entry is None:
+        entry = ArchivedConversation(conversation_id=conversation_id)
+        db.session.add(entry)
+    entry.payload = _pack(rows)
+    entry.message_count = len(rows)
+    entry.first_message_id = rows[0]["id"]
+    entry.last_message_id = rows[-1]["id"]
+    entry.archived_at = datetime.utcnow()
+
+    Message.query.filter(Message.id.in_([m.id for m in messages])).delete(synchronize_session=False)
+    return len(messages)
+
+
+def archive_idle_conversations(days=None, batch_size=None, limit=None):
+    """
+    Move para o arquivo as mensagens de conversas sem atividade há `days`
+    dias. Commit a cada lote; retorna (conversas, mensagens) arquivadas.
+    """
+    days = ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    total_conversations = total_messages = 0
+    last_id = 0
+    while limit is None or total_conversations < limit:
+        has_hot = db.session.query(Message.id).filter(Message.conversation_id == Conversation.id).exists()
+        ids = [
+            cid for (cid,) in db.session.query(Conversation.id)
+            .filter(Conversation.updated_at < cutoff, Conversation.id > last_id, has_hot)
+            .order_by(Conversation.id.asc())
+            .limit(batch_size if limit is None else min(batch_size, limit - total_conversations))
+        ]
+        if not ids:
+            break
+        try:
+            for cid in ids:
+                total_messages += _archive_conversation(cid)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.expunge_all()
+        total_conversations += len(ids)
+        last_id = ids[-1]
+        logger.info("lote arquivado", extra={"conversations": len(ids), "last_conversation_id": last_id})
+
+    metrics.incr("archived_messages", total_messages)
+    logger.info("arquivamento concluído", extra={
+        "conversations": total_conversations, "messages": total_messages, "days": days,
+    })
+    return total_conversations, total_messages
+
+
+def register_cli(app):
+    """Comando one-shot: `flask --app src.main archive-messages`"""
+    import click
+
+    @app.cli.command("archive-messages")
+    @click.option("--days", type=int, default=None, help="Dias sem atividade (padrão: ARCHIVE_AFTER_DAYS)")
+    @click.option("--batch-size", type=int, default=None, help="Conversas por transação")
+    @click.option("--limit", type=int, default=None, help="Máximo de conversas nesta execução")
+    def archive_messages_command(days, batch_size, limit):
+        """Move mensagens de conversas paradas para messages_archive."""
+        conversations, messages = archive_idle_conversations(days, batch_size, limit)
+        click.echo(f"conversas={conversations} mensagens={messages}")
@@ -1,6 +1,8 @@
 from functools import wraps
 from flask import request, jsonify, current_app
 from ..models.user import db, User  # ← CORRIGIDO: import relativo
+from .logging_config import bind_log_context
+from . import tracing
 import jwt
 
 def token_required(f):
@@ -21,19 +23,24 @@ def token_required(f):
             return jsonify({'message': 'Token não fornecido'}), 401
         
         try:
-            # Decodifica o token
-            payload = User.verify_token(token)
-            if payload is None:
-                return jsonify({'message': 'Token inválido ou expirado'}), 401
-            
-            # Busca o usuário no banco
-            current_user = User.query.get(payload['user_id'])
-            if not current_user or not current_user.is_active:
-                return jsonify({'message': 'Usuário não encontrado ou inativo'}), 401
+            with tracing.span("auth.token_required") as span:
+                # Decodifica o token
+                payload = User.verify_token(token)
+                if payload is None:
+                    span.set_error("token inválido ou expirado")
+                    return jsonify({'message': 'Token inválido ou expirado'}), 401
+
+                # Busca o usuário no banco
+                current_user = User.query.get(payload['user_id'])
+                if not current_user or not current_user.is_active:
+                    span.set_error("usuário não encontrado ou inativo")
+                    return jsonify({'message': 'Usuário não encontrado ou inativo'}), 401
+                span.set_attribute("user.id", current_user.id)
             
         except Exception as e:
             return jsonify({'message': 'Token inválido'}), 401
         
+        bind_log_context(user_id=current_user.id)
         return f(current_user, *args, **kwargs)
     
     return decorated
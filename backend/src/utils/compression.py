@@ -0,0 +1,120 @@
+# backend/src/utils/compression.py
+"""
+Compressão negociada (brotli / gzip) das respostas do app.
+
+Respostas com tipo compressível acima de COMPRESSION_MIN_SIZE são
+comprimidas conforme o Accept-Encoding do cliente. Respostas em streaming
+(SSE / chunked) são comprimidas chunk a chunk com flush a cada pedaço, de
+modo que o cliente recebe cada evento assim que ele é gerado.
+
+Variáveis de ambiente:
+  COMPRESSION_ENABLED         – true | false                  (padrão: true)
+  COMPRESSION_MIN_SIZE        – bytes mínimos para comprimir  (padrão: 1024)
+  COMPRESSION_LEVEL           – nível gzip 1-9                (padrão: 6)
+  COMPRESSION_BROTLI_QUALITY  – qualidade brotli 0-11         (padrão: 5)
+
+Brotli só é oferecido se o pacote `brotli` estiver instalado.
+"""
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "text/event-stream",
+    "image/svg+xml",
+}
+
+
+def choose_encoding(accept_encodings):
+    """Melhor codificação aceita pelo cliente: br > gzip > None"""
+    if brotli is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)  # 31 = container gzip
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(iterable, encoding):
+    """Comprime um iterável chunk a chunk, com flush após cada chunk"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        compress = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+        finish = compressor.flush
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = compress(chunk) + flush()
+            if out:
+                yield out
+        yield finish()
+    finally:
+        # Repassa o fechamento (ex.: cliente desconectou) ao gerador original
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    if not COMPRESSION_ENABLED or request.method == "HEAD":
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    # O corpo mudou de representação: a ETag forte vira fraca
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,170 @@
+# backend/src/utils/context_window.py
+"""
+Controle do tamanho do contexto dos threads da OpenAI.
+
+Sem controle, um thread acumula todo o histórico da conversa e cada run
+fica mais lento e caro. Estratégias (CONTEXT_STRATEGY, ou por conversa em
+Conversation.context_strategy):
+
+  off       – comportamento original: o thread cresce indefinidamente
+  truncate  – o run considera só as últimas CONTEXT_MAX_MESSAGES mensagens
+              (truncation_strategy da Assistants API); o thread é mantido
+  rollover  – quando a conversa passa de CONTEXT_ROLLOVER_MESSAGES mensagens
+              no thread atual, ou o último run usou mais de
+              CONTEXT_ROLLOVER_TOKENS tokens de prompt, um thread novo é
+              criado com um resumo gerado localmente das mensagens antigas
+              + as últimas CONTEXT_ROLLOVER_KEEP mensagens; o thread antigo
+              vai para a limpeza em segundo plano
+
+O resumo é extrativo (sem chamada ao modelo): a primeira linha útil de cada
+mensagem, limitado a CONTEXT_SUMMARY_MAX_CHARS. O estado fica gravado na
+conversa (resumo, mensagem-base do thread atual, nº de trocas de thread e
+tokens de prompt do último run).
+"""
+import os
+import re
+from datetime import datetime
+
+from ..models.user import Message
+from . import archive, metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+STRATEGIES = ("off", "truncate", "rollover")
+
+CONTEXT_STRATEGY = os.getenv("CONTEXT_STRATEGY", "off").lower()
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+CONTEXT_ROLLOVER_MESSAGES = int(os.getenv("CONTEXT_ROLLOVER_MESSAGES", "40"))
+CONTEXT_ROLLOVER_TOKENS = int(os.getenv("CONTEXT_ROLLOVER_TOKENS", "60000"))
+CONTEXT_ROLLOVER_KEEP = int(os.getenv("CONTEXT_ROLLOVER_KEEP", "6"))
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", "4000"))
+
+SUMMARY_PREFIX = "Resumo da conversa até aqui (gerado automaticamente):\n"
+
+_HEADING = re.compile(r"^[#>*\-\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def strategy_for(conversation):
+    strategy = (conversation.context_strategy or CONTEXT_STRATEGY).lower()
+    return strategy if strategy in STRATEGIES else "off"
+
+
+def run_options(conversation):
+    """kwargs extras para runs.create conforme a estratégia"""
+    if strategy_for(conversation) == "truncate":
+        return {"truncation_strategy": {"type": "last_messages", "last_messages": CONTEXT_MAX_MESSAGES}}
+    return {}
+
+
+# ────────────────────────────────
+# Resumo local
+# ────────────────────────────────
+def _first_line(text, limit=200):
+    if "PERGUNTA DO USUÁRIO: " in text:
+        text = text.split("PERGUNTA DO USUÁRIO: ", 1)[1]
+    for line in text.splitlines():
+        line = _WHITESPACE.sub(" ", _HEADING.sub("", line)).strip()
+        if line:
+            return line if len(line) <= limit else line[:limit - 1] + "…"
+    return ""
+
+
+def summarize(messages, previous=None, max_chars=None):
+    """Resumo extrativo: uma linha por mensagem, mantendo o trecho mais recente"""
+    max_chars = max_chars or CONTEXT_SUMMARY_MAX_CHARS
+    lines = [previous] if previous else []
+    for m in messages:
+        line = _first_line(m.content or "")
+        if line:
+            speaker = "Usuário" if m.role == "user" else "Assistente"
+            lines.append(f"- {speaker}: {line}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = "…" + summary[-(max_chars - 1):]
+    return summary
+
+
+# ────────────────────────────────
+# Troca de thread
+# ────────────────────────────────
+def thread_message_count(conversation, exclude_message_id=None):
+    """Mensagens locais posteriores à mensagem-base do thread atual"""
+    base = conversation.context_base_message_id or 0
+    query = Message.query.filter(Message.conversation_id == conversation.id, Message.id > base)
+    if exclude_message_id is not None:
+        query = query.filter(Message.id != exclude_message_id)
+    count = query.count()
+    if conversation.archive is not None and (conversation.archive.last_message_id or 0) > base:
+        count += sum(1 for m in archive.archived_messages(conversation) if m.id > base)
+    return count
+
+
+def seed_messages(conversation, exclude_message_id=None, limit=32):
+    """
+    Mensagens para semear um thread novo após uma troca: o resumo e as
+    mensagens posteriores à mensagem-base. None se não houve troca.
+    """
+    if not conversation.context_summary:
+        return None
+    base = conversation.context_base_message_id or 0
+    history = [m for m in archive.archived_messages(conversation) if m.id > base]
+    query = Message.query.filter(Message.conversation_id == conversation.id, Message.id > base)
+    if exclude_message_id is not None:
+        query = query.filter(Message.id < exclude_message_id)
+    history += [m for m in query.order_by(Message.id.asc()) if m.content]
+    return [{"role": "user", "content": SUMMARY_PREFIX + conversation.context_summary}] + [
+        {"role": m.role, "content": m.content} for m in history[-limit:]
+    ]
+
+
+def maybe_rollover(conversation, exclude_message_id=None):
+    """
+    Com a estratégia rollover e o orçamento estourado, descarta o thread
+    atual (enfileirando a limpeza) e prepara o resumo; o próximo
+    _ensure_thread cria o thread novo a partir de `seed_messages`.
+    Retorna True se houve troca.
+    """
+    if strategy_for(conversation) != "rollover" or not conversation.thread_id:
+        return False
+
+    count = thread_message_count(conversation, exclude_message_id)
+    tokens = conversation.last_prompt_tokens or 0
+    if count < CONTEXT_ROLLOVER_MESSAGES and tokens < CONTEXT_ROLLOVER_TOKENS:
+        return False
+
+    from .openai_gc import enqueue_cleanup
+
+    base = conversation.context_base_message_id or 0
+    messages = [
+        m for m in archive.all_messages(conversation)
+        if m.id > base and (exclude_message_id is None or m.id < exclude_message_id) and m.content
+    ]
+    messages.sort(key=lambda m: m.id)
+    keep = messages[-CONTEXT_ROLLOVER_KEEP:] if CONTEXT_ROLLOVER_KEEP else []
+    older = messages[:len(messages) - len(keep)]
+
+    old_thread = conversation.thread_id
+    conversation.context_summary = summarize(older, previous=conversation.context_summary)
+    conversation.context_base_message_id = (keep[0].id - 1) if keep else (messages[-1].id if messages else base)
+    conversation.thread_id = None
+    conversation.thread_rollovers = (conversation.thread_rollovers or 0) + 1
+    conversation.last_rollover_at = datetime.utcnow()
+    conversation.last_prompt_tokens = None
+    enqueue_cleanup(thread_ids=[old_thread])
+
+    metrics.incr("thread_rollover")
+    logger.info("thread trocado por excesso de contexto", extra={
+        "old_thread_id": old_thread, "messages": count, "prompt_tokens": tokens,
+        "summarized": len(older), "kept": len(keep),
+    })
+    return True
+
+
+def record_usage(conversation, usage):
+    """Guarda os tokens de prompt do último turno (gatilho do rollover)"""
+    prompt_tokens = (usage or {}).get("prompt_tokens")
+    if prompt_tokens is not None:
+        conversation.last_prompt_tokens = prompt_tokens
+        metrics.observe("openai_prompt_tokens", prompt_tokens)
@@ -1,10 +1,20 @@
+import hashlib
 import os
 from dotenv import load_dotenv
-from ..models.user import db, User  # ← CORRIGIDO: import relativo
+from sqlalchemy import inspect, text
+from ..models.user import db, User, SchemaVersion  # ← CORRIGIDO: import relativo
+from .logging_config import get_logger
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+logger = get_logger(__name__)
+
+# auto   – só cria/sincroniza o schema se o carimbo de versão não bater (padrão)
+# always – roda a inicialização completa em todo boot (comportamento antigo)
+# never  – não toca no schema; use `flask --app src.main init-db` no deploy
+DB_INIT_ON_BOOT = os.getenv('DB_INIT_ON_BOOT', 'auto').lower()
+
 def create_admin_user():
     """Cria usuário administrador padrão se não existir"""
     admin_username = os.getenv('ADMIN_USERNAME', 'admin')
@@ -27,12 +37,12 @@ def create_admin_user():
         db.session.add(admin_user)
         try:
             db.session.commit()
-            print(f"✅ Usuário administrador criado: {admin_username}")
+            logger.info("usuário administrador criado", extra={"username": admin_username})
         except Exception as e:
             db.session.rollback()
-            print(f"⚠️  Erro ao criar admin (pode já existir): {e}")
+            logger.warning("erro ao criar admin (pode já existir): %s", e)
     else:
-        print(f"✅ Usuário administrador já existe: {admin_user.username} ({admin_user.email})")
+        logger.info("usuário administrador já existe", extra={"username": admin_user.username})
         
         # Garante que é admin e está ativo
         if not admin_user.is_admin or not admin_user.is_active:
@@ -40,17 +50,110 @@ def create_admin_user():
             admin_user.is_active = True
             try:
                 db.session.commit()
-                print("✅ Privilégios de admin atualizados")
+                logger.info("privilégios de admin atualizados")
             except Exception as e:
                 db.session.rollback()
-                print(f"⚠️  Erro ao atualizar admin: {e}")
+                logger.warning("erro ao atualizar admin: %s", e)
+
+def sync_schema():
+    """
+    Adiciona colunas novas dos modelos em tabelas já existentes.
+
+    `db.create_all()` só cria tabelas que faltam; colunas acrescentadas
+    depois (ex.: Message.cache_hit) precisam de ALTER TABLE. Apenas colunas
+    anuláveis são adicionadas automaticamente.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            logger.info("coluna adicionada", extra={"table": table.name, "column": column.name})
+
+def purge_answer_cache():
+    """Descarta respostas cacheadas de outro assistant/modelo ou vencidas"""
+    from . import answer_cache
+
+    if not answer_cache.ANSWER_CACHE_ENABLED:
+        return
+    try:
+        answer_cache.evict()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("erro ao limpar cache de respostas: %s", e)
+
+def schema_version():
+    """
+    Hash das tabelas/colunas declaradas nos modelos.
+
+    Muda sozinho quando um modelo ganha tabela ou coluna, então não há
+    número de versão para lembrar de incrementar.
+    """
+    parts = []
+    for table in db.metadata.sorted_tables:
+        columns = ','.join(f'{c.name}:{c.type!r}:{c.nullable}' for c in table.columns)
+        parts.append(f'{table.name}({columns})')
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def get_schema_stamp():
+    """Versão gravada no banco, ou None (tabela ausente / nunca inicializado)"""
+    try:
+        row = SchemaVersion.query.order_by(SchemaVersion.id.desc()).first()
+    except Exception:
+        db.session.rollback()
+        return None
+    return row.version if row else None
+
+def stamp_schema(version):
+    db.session.add(SchemaVersion(version=version))
+    db.session.commit()
+
+def setup_database():
+    """Cria/sincroniza o schema, garante o admin e grava o carimbo de versão"""
+    db.create_all(bind_key=None)  # nunca DDL na réplica
+    sync_schema()
+    create_admin_user()
+    purge_answer_cache()
+    version = schema_version()
+    stamp_schema(version)
+    logger.info("banco inicializado", extra={"schema_version": version})
+    return version
 
 def init_database(app):
-    """Inicializa o banco de dados e cria usuário admin"""
+    """
+    Inicialização do banco no boot, conforme DB_INIT_ON_BOOT.
+
+    No modo `auto` o custo no caminho comum é uma única consulta ao carimbo
+    de versão; o trabalho de schema só roda no primeiro boot após uma
+    mudança de modelo (ou via comando `init-db`).
+    """
+    if DB_INIT_ON_BOOT == 'never':
+        return
     with app.app_context():
         try:
-            db.create_all()
-            create_admin_user()
+            if DB_INIT_ON_BOOT != 'always' and get_schema_stamp() == schema_version():
+                return
+            setup_database()
         except Exception as e:
-            print(f"⚠️  Aviso na inicialização do banco: {e}")
-            # Continua a execução mesmo com erro
\ No newline at end of file
+            db.session.rollback()
+            logger.warning("aviso na inicialização do banco: %s", e)
+            # Continua a execução mesmo com erro
+
+def register_cli(app):
+    """Comandos one-shot: `flask --app src.main init-db`"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Cria/sincroniza o schema, o admin e grava o carimbo de versão."""
+        import click
+
+        version = setup_database()
+        click.echo(f'schema_version={version}')
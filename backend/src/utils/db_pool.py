@@ -0,0 +1,109 @@
+# backend/src/utils/db_pool.py
+"""
+Configuração explícita do pool de conexões do SQLAlchemy.
+
+Com `preload_app = True` o engine nasce no master do gunicorn (o boot já
+consulta o banco); os workers herdam o pool com sockets compartilhados.
+O hook `post_fork` do gunicorn.conf.py chama `dispose_after_fork()`, que
+descarta o pool herdado sem fechar as conexões do processo pai.
+
+`pool_pre_ping` testa a conexão no checkout, então conexões mortas após um
+restart do Postgres são trocadas antes de chegar ao request.
+
+Variáveis de ambiente (ignoradas para SQLite, exceto pre_ping/recycle):
+  DB_POOL_SIZE      – conexões mantidas por worker            (padrão: 5)
+  DB_MAX_OVERFLOW   – conexões extras sob pico                (padrão: 10)
+  DB_POOL_TIMEOUT   – segundos esperando uma conexão livre    (padrão: 10)
+  DB_POOL_RECYCLE   – recicla conexões mais velhas que N s    (padrão: 1800)
+  DB_POOL_PRE_PING  – true | false                            (padrão: true)
+"""
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mede o tempo de espera por uma conexão livre"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            metrics.incr("db_pool_timeout")
+            raise
+        finally:
+            metrics.observe("db_pool_wait_ms", (time.perf_counter() - start) * 1000)
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS para a URL informada"""
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if database_url and not database_url.startswith("sqlite"):
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    # Inclui as conexões descartadas pelo pre_ping (ex.: Postgres reiniciou)
+    metrics.incr("db_pool_invalidated")
+    logger.warning("conexão do pool invalidada: %s", exception)
+
+
+def init_pool(app, db):
+    """Registra os eventos de monitoramento nos engines do app"""
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine.pool, "invalidate", _on_invalidate)
+            event.listen(engine.pool, "connect", lambda *args: metrics.incr("db_pool_connect"))
+
+
+def dispose_after_fork(app, db):
+    """
+    Chamado em cada worker logo após o fork: descarta o pool herdado do
+    master. `close=False` não fecha os sockets, que ainda pertencem ao pai.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def pool_stats(app, db):
+    """Estado atual dos pools do processo, por bind"""
+    stats = {}
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            entry = {"class": type(pool).__name__, "status": pool.status()}
+            if isinstance(pool, QueuePool):
+                entry.update(
+                    size=pool.size(),
+                    checked_in=pool.checkedin(),
+                    checked_out=pool.checkedout(),
+                    overflow=pool.overflow(),
+                    max_overflow=pool._max_overflow,
+                    timeout_s=pool.timeout(),
+                )
+            stats[bind or "default"] = entry
+    return stats
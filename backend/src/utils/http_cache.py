@@ -0,0 +1,33 @@
+# backend/src/utils/http_cache.py
+"""
+GET condicional (ETag / If-None-Match) para respostas JSON.
+
+A ETag é derivada de metadados baratos (updated_at, contagem e último id de
+mensagem), calculados antes de montar o payload; se o cliente já tem a
+versão atual, a resposta é um 304 sem corpo e o payload nem é construído.
+"""
+import hashlib
+
+from flask import Response, jsonify, request
+
+
+def make_etag(*parts):
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def conditional_json(etag, build_payload, status=200):
+    """
+    Retorna 304 se If-None-Match casar com `etag`; senão serializa o
+    resultado de `build_payload()` com a ETag e Cache-Control: no-cache
+    (o navegador sempre revalida, mas reaproveita o corpo em cache).
+    """
+    # Comparação fraca: a compressão da resposta pode marcar a ETag como W/
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+        response.status_code = status
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,253 @@
+# backend/src/utils/idempotency.py
+"""
+Idempotência de requests caros (envio de mensagem) via cabeçalho
+`Idempotency-Key`.
+
+Quando o cliente estoura o timeout ou o usuário clica duas vezes, a nova
+tentativa com a mesma chave não cria outra mensagem nem outro run:
+
+  - chave nova          → o request roda normalmente; a linha fica
+                          "in_progress" e, ao final, guarda a resposta
+  - chave concluída     → a resposta gravada é devolvida
+                          (cabeçalho Idempotent-Replayed: true)
+  - chave em andamento  → o request espera o original terminar por até
+                          IDEMPOTENCY_WAIT_SECONDS e devolve o resultado
+                          dele; se ainda não terminou, 409 com Retry-After
+  - mesma chave com outro corpo → 422
+
+O estado fica no banco (tabela idempotency_keys), compartilhado entre os
+workers. Respostas 5xx e 429 não são gravadas: a chave é liberada e uma
+nova tentativa roda de novo. Uma chave "in_progress" de um worker que
+morreu é assumida após IDEMPOTENCY_LEASE_SECONDS.
+
+A rota pode decidir o que fica gravado com `defer_result(response,
+resolve)` – `resolve()` devolve (status, corpo JSON) para gravar ou None
+para liberar a chave (ex.: turno cancelado/com falha, que responde 200 mas
+não deve ser repetido por um dia). Respostas em streaming (SSE) só terminam
+depois do after_request: a chave continua "in_progress" enquanto o stream
+corre e `resolve()` é chamado no fechamento da resposta (call_on_close).
+Stream sem resolve não tem o que repetir: a chave é liberada ao fechar.
+
+Variáveis de ambiente:
+  IDEMPOTENCY_TTL_SECONDS    – validade das chaves concluídas  (padrão: 86400)
+  IDEMPOTENCY_WAIT_SECONDS   – espera por um original em curso (padrão: 15)
+  IDEMPOTENCY_LEASE_SECONDS  – tempo até assumir chave travada (padrão: 300)
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from ..models.user import db, IdempotencyKey
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "15"))
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+_POLL_INTERVAL = 0.5
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _load(key):
+    # rollback encerra a transação anterior: a leitura enxerga commits de outros workers
+    db.session.rollback()
+    return db.session.query(IdempotencyKey).filter_by(key=key).populate_existing().first()
+
+
+def _begin(key, user_id, fingerprint):
+    """
+    Tenta reservar a chave. Retorna ("run", None), ("replay", entry),
+    ("busy", entry) ou ("conflict", entry).
+    """
+    while True:
+        now = datetime.utcnow()
+        db.session.add(IdempotencyKey(
+            key=key, user_id=user_id, fingerprint=fingerprint, status="in_progress",
+            created_at=now, updated_at=now, expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        ))
+        try:
+            db.session.commit()
+            return "run", None
+        except IntegrityError:
+            db.session.rollback()
+
+        entry = _load(key)
+        if entry is None:
+            continue  # liberada entre o INSERT e a leitura
+        if entry.expires_at < now:
+            IdempotencyKey.query.filter_by(key=key, updated_at=entry.updated_at).delete(synchronize_session=False)
+            db.session.commit()
+            continue
+        if entry.fingerprint != fingerprint:
+            return "conflict", entry
+        if entry.status == "done":
+            return "replay", entry
+        if entry.updated_at < now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS):
+            # Original abandonado (worker morto): assume a chave
+            taken = IdempotencyKey.query.filter_by(key=key, updated_at=entry.updated_at).update(
+                {"updated_at": now}, synchronize_session=False
+            )
+            db.session.commit()
+            if taken:
+                return "run", None
+            continue
+        return "busy", entry
+
+
+def _wait(key):
+    """Espera o request original; retorna o estado final ou None se ainda em curso"""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        entry = _load(key)
+        if entry is None or entry.status == "done":
+            return entry or "released"
+    return None
+
+
+def _replay(entry):
+    metrics.incr("idempotency", result="replay")
+    response = make_response(entry.response or "", entry.status_code or 200)
+    response.mimetype = "application/json"
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _store(key, status_code, body):
+    """Grava a resposta final, ou libera a chave se ela não deve ser repetida"""
+    try:
+        db.session.rollback()
+        if status_code is None or status_code >= 500 or status_code == 429:
+            IdempotencyKey.query.filter_by(key=key).delete(synchronize_session=False)
+        else:
+            now = datetime.utcnow()
+            IdempotencyKey.query.filter_by(key=key).update({
+                "status": "done",
+                "status_code": status_code,
+                "response": body,
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            }, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("falha ao gravar chave de idempotência: %s", e)
+
+
+def _resolve(response):
+    """(status, corpo) informado pela rota com defer_result, ou (None, None) para liberar"""
+    try:
+        result = response.idempotency_result()
+    except Exception as e:
+        logger.warning("falha ao obter resultado da resposta: %s", e)
+        result = None
+    return result if result is not None else (None, None)
+
+
+def _finish(key, response):
+    resolve = getattr(response, "idempotency_result", None)
+    if not response.is_streamed:
+        if resolve is not None:
+            _store(key, *_resolve(response))
+        else:
+            _store(key, response.status_code, response.get_data(as_text=True))
+        return
+    # Streaming: a chave segue "in_progress" até o stream fechar
+    app = current_app._get_current_object()
+
+    def on_close():
+        status_code, body = _resolve(response) if resolve is not None else (None, None)
+        with app.app_context():
+            _store(key, status_code, body)
+
+    response.call_on_close(on_close)
+
+
+def defer_result(response, resolve):
+    """
+    Resultado da resposta para a idempotência: `resolve()` devolve (status,
+    corpo) ou None. Em streaming é chamado quando o stream fecha.
+    """
+    response.idempotency_result = resolve
+    return response
+
+
+def _purge_expired(user_id):
+    IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id, IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+
+def idempotent(scope):
+    """
+    Torna a rota idempotente pelo cabeçalho Idempotency-Key (opcional).
+    Deve ficar logo abaixo de @token_required (recebe current_user).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            raw_key = request.headers.get(HEADER)
+            if not raw_key:
+                return f(current_user, *args, **kwargs)
+            if len(raw_key) > MAX_KEY_LENGTH:
+                return jsonify({"message": f"{HEADER} muito longo"}), 400
+
+            key = _digest(current_user.id, scope, raw_key)
+            fingerprint = _digest(request.method, request.path, request.get_data())
+            try:
+                _purge_expired(current_user.id)
+                outcome, entry = _begin(key, current_user.id, fingerprint)
+                while outcome == "busy":
+                    metrics.incr("idempotency", result="wait")
+                    entry = _wait(key)
+                    if entry is None:
+                        response = jsonify({"message": "Esta solicitação ainda está em processamento."})
+                        response.status_code = 409
+                        response.headers["Retry-After"] = "5"
+                        return response
+                    if entry == "released":
+                        # O original falhou e liberou a chave: tenta de novo
+                        outcome, entry = _begin(key, current_user.id, fingerprint)
+                    else:
+                        outcome = "replay"
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("idempotência indisponível: %s", e)
+                return f(current_user, *args, **kwargs)
+
+            if outcome == "conflict":
+                metrics.incr("idempotency", result="conflict")
+                return jsonify({"message": f"{HEADER} já usada com outro conteúdo"}), 422
+            if outcome == "replay":
+                logger.info("resposta repetida por Idempotency-Key", extra={"scope": scope})
+                return _replay(entry)
+
+            metrics.incr("idempotency", result="run")
+            try:
+                response = make_response(f(current_user, *args, **kwargs))
+            except Exception:
+                _finish(key, make_response("", 500))
+                raise
+            _finish(key, response)
+            return response
+
+        return decorated
+    return decorator
@@ -0,0 +1,237 @@
+# backend/src/utils/jobs.py
+"""
+Fila de tarefas em segundo plano persistida no banco.
+
+`enqueue()` só adiciona a linha à sessão atual: a tarefa é gravada no mesmo
+commit da operação que a originou (ex.: apagar a conversa). Cada worker do
+gunicorn sobe uma thread que, a cada JOBS_POLL_INTERVAL segundos, reserva
+um lote de tarefas vencidas (UPDATE condicional, seguro entre processos),
+executa o handler registrado para o tipo e marca o resultado. Falhas são
+repetidas com backoff exponencial até JOBS_MAX_ATTEMPTS; tarefas "running"
+de um worker que morreu voltam para a fila após JOBS_LEASE_SECONDS. As
+concluídas há mais de JOBS_KEEP_DONE_HOURS são apagadas a cada hora.
+
+Handlers devem ser idempotentes:
+
+    @job_handler("openai_cleanup")
+    def cleanup(payload): ...
+
+Para rodar a fila num processo separado: `flask --app src.main run-jobs`.
+
+Variáveis de ambiente:
+  JOBS_WORKER_ENABLED   – thread de jobs nos workers web    (padrão: true)
+  JOBS_POLL_INTERVAL    – segundos entre verificações       (padrão: 5)
+  JOBS_BATCH_SIZE       – tarefas reservadas por vez        (padrão: 10)
+  JOBS_MAX_ATTEMPTS     – tentativas antes de "failed"      (padrão: 5)
+  JOBS_LEASE_SECONDS    – tempo até reaver tarefa travada   (padrão: 600)
+  JOBS_KEEP_DONE_HOURS  – retenção das tarefas concluídas   (padrão: 24)
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models.user import db, BackgroundJob
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+JOBS_WORKER_ENABLED = os.getenv("JOBS_WORKER_ENABLED", "true").lower() == "true"
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "5"))
+JOBS_BATCH_SIZE = int(os.getenv("JOBS_BATCH_SIZE", "10"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "600"))
+JOBS_KEEP_DONE_HOURS = int(os.getenv("JOBS_KEEP_DONE_HOURS", "24"))
+
+# Limpeza das tarefas concluídas (JOBS_KEEP_DONE_HOURS) a cada hora
+_PURGE_INTERVAL = 3600
+
+_handlers = {}
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def job_handler(kind):
+    """Registra a função que executa as tarefas do tipo `kind`"""
+    def register(f):
+        _handlers[kind] = f
+        return f
+    return register
+
+
+def enqueue(kind, payload, delay=0):
+    """Adiciona a tarefa à sessão atual (o commit é do chamador)"""
+    job = BackgroundJob(
+        kind=kind,
+        payload=json.dumps(payload, ensure_ascii=False),
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    db.session.info["jobs_enqueued"] = True
+    metrics.incr("jobs_enqueued", kind=kind)
+    return job
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker(session):
+    # Acorda a thread só depois do commit: antes dele a tarefa ainda não é visível
+    if session.info.pop("jobs_enqueued", False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_wakeup(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+# ────────────────────────────────
+# Execução
+# ────────────────────────────────
+def _claim(limit):
+    """Reserva até `limit` tarefas vencidas; retorna as reservadas"""
+    now = datetime.utcnow()
+    lease_expired = now - timedelta(seconds=JOBS_LEASE_SECONDS)
+    candidates = [
+        job_id for (job_id,) in db.session.query(BackgroundJob.id)
+        .filter(
+            ((BackgroundJob.status == "pending") & (BackgroundJob.run_after <= now))
+            | ((BackgroundJob.status == "running") & (BackgroundJob.updated_at < lease_expired))
+        )
+        .order_by(BackgroundJob.run_after.asc())
+        .limit(limit)
+    ]
+    claimed = []
+    for job_id in candidates:
+        # UPDATE condicional: só um processo consegue mudar o status/updated_at
+        taken = BackgroundJob.query.filter(
+            BackgroundJob.id == job_id,
+            ((BackgroundJob.status == "pending") & (BackgroundJob.run_after <= now))
+            | ((BackgroundJob.status == "running") & (BackgroundJob.updated_at < lease_expired)),
+        ).update({"status": "running", "updated_at": now}, synchronize_session=False)
+        if taken:
+            claimed.append(job_id)
+    db.session.commit()
+    return [db.session.get(BackgroundJob, job_id) for job_id in claimed]
+
+
+def _execute(job):
+    handler = _handlers.get(job.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f"nenhum handler para {job.kind}")
+        handler(json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(BackgroundJob, job.id)
+        job.attempts = (job.attempts or 0) + 1
+        job.last_error = str(e)[:2000]
+        if job.attempts >= JOBS_MAX_ATTEMPTS:
+            job.status = "failed"
+            logger.error("tarefa falhou definitivamente: %s", e, extra={"job_id": job.id, "kind": job.kind})
+        else:
+            job.status = "pending"
+            job.run_after = datetime.utcnow() + timedelta(seconds=min(2 ** job.attempts * 10, 3600))
+            logger.warning("tarefa falhou; nova tentativa agendada: %s", e,
+                           extra={"job_id": job.id, "kind": job.kind, "attempts": job.attempts})
+        metrics.incr("jobs_finished", kind=job.kind, result=job.status)
+    else:
+        job.attempts = (job.attempts or 0) + 1
+        job.status = "done"
+        job.last_error = None
+        metrics.incr("jobs_finished", kind=job.kind, result="done")
+    metrics.observe("job_ms", (time.perf_counter() - started) * 1000, kind=job.kind)
+    db.session.commit()
+
+
+def _purge_done():
+    cutoff = datetime.utcnow() - timedelta(hours=JOBS_KEEP_DONE_HOURS)
+    removed = BackgroundJob.query.filter(
+        BackgroundJob.status == "done", BackgroundJob.updated_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def run_pending(limit=None):
+    """Executa um lote de tarefas vencidas; retorna quantas rodaram"""
+    jobs = _claim(limit or JOBS_BATCH_SIZE)
+    for job in jobs:
+        _execute(job)
+    return len(jobs)
+
+
+def _loop(app):
+    with app.app_context():
+        last_purge = None
+        while True:
+            try:
+                # Dentro do try: banco fora do ar não mata a thread
+                if last_purge is None or time.monotonic() - last_purge >= _PURGE_INTERVAL:
+                    _purge_done()
+                    last_purge = time.monotonic()
+                ran = run_pending()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("erro na fila de tarefas: %s", e)
+                ran = 0
+            finally:
+                db.session.remove()
+            if not ran:
+                _wakeup.wait(JOBS_POLL_INTERVAL)
+                _wakeup.clear()
+
+
+def ensure_worker(app):
+    """Sobe a thread de tarefas deste processo (uma por pid, após o fork)"""
+    global _worker, _worker_pid
+    if not JOBS_WORKER_ENABLED or _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+        _worker = threading.Thread(target=_loop, args=(app,), name="jobs-worker", daemon=True)
+        _worker.start()
+
+
+def init_jobs(app):
+    """
+    A thread é iniciada no primeiro request de cada worker – com
+    preload_app, threads criadas no master não sobrevivem ao fork.
+    """
+    @app.before_request
+    def _start_jobs_worker():
+        ensure_worker(app)
+
+    import click
+
+    @app.cli.command("run-jobs")
+    @click.option("--once", is_flag=True, help="Executa as tarefas vencidas e sai")
+    def run_jobs_command(once):
+        """Processa a fila de tarefas em primeiro plano."""
+        if once:
+            total = 0
+            while True:
+                ran = run_pending()
+                if not ran:
+                    break
+                total += ran
+            click.echo(f"tarefas={total}")
+            return
+        _loop(app)
+
+
+def queue_stats():
+    """Contagem de tarefas por status (para o admin)"""
+    from sqlalchemy import func
+
+    rows = db.session.query(BackgroundJob.status, func.count(BackgroundJob.id)).group_by(BackgroundJob.status)
+    return {status: count for status, count in rows}
@@ -0,0 +1,74 @@
+# backend/src/utils/json_provider.py
+"""
+Provider JSON do Flask baseado em orjson (com fallback para a stdlib).
+
+Serializa datetime/date nativamente em ISO 8601 – os `to_dict()` dos
+modelos devolvem os objetos datetime direto, sem gerar strings
+intermediárias com `.isoformat()`. O formato de saída é o mesmo de antes.
+"""
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # opcional
+    orjson = None
+
+
+def json_default(o):
+    """Tipos extras aceitos na serialização (também usado com json.dump)"""
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(json_default)
+    # Ordenar chaves só custa CPU; nenhum cliente depende da ordem
+    sort_keys = False
+
+    def _orjson_options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=json_default, option=self._orjson_options()).decode("utf-8")
+        kwargs.setdefault("ensure_ascii", False)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        # orjson já produz bytes: evita a volta str → bytes do caminho padrão
+        body = orjson.dumps(obj, default=json_default, option=self._orjson_options(indent=pretty))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,653 @@
+# backend/src/utils/llm_backends.py
+"""
+Backends de geração de resposta do chat.
+
+  assistants – Assistants API (thread + run + polling), o caminho original;
+               necessário para file_search / anexos
+  chat       – Chat Completions em streaming, com o prompt montado a partir
+               do histórico local (tabela messages): uma única chamada por
+               turno, sem thread nem polling
+  local      – stand-in determinístico, sem rede (testes e desenvolvimento)
+
+O backend vem de LLM_BACKEND (padrão do deploy) ou de
+Conversation.llm_backend. Turnos que o backend não suporta (ex.: anexos no
+backend chat) caem no assistants.
+
+Todos expõem `stream(turn)`, um gerador de eventos:
+
+    ("started", {"run_id": ...})   – opcional, quando há um run remoto
+    ("delta", "texto")             – trecho da resposta
+    ("done", Reply)                – sempre o último evento
+
+e `complete(turn)`, que consome o stream e devolve o Reply. Enquanto
+aguarda um run, o assistants emite ("waiting", {...}) a cada consulta –
+o streaming SSE usa esses eventos como heartbeat para perceber que o
+cliente desconectou.
+
+Cancelamento: os backends consultam `turn.cancelled()` durante a geração
+(o endpoint de cancelamento marca a mensagem pendente como "cancelled" no
+banco) e, se o gerador for fechado no meio (cliente desconectou), o run
+remoto é cancelado com runs.cancel.
+
+Variáveis de ambiente:
+  LLM_BACKEND            – assistants | chat | local         (padrão: assistants)
+  CHAT_MODEL             – modelo do backend chat            (padrão: gpt-4o-mini)
+  CHAT_SYSTEM_PROMPT     – instruções do backend chat
+  CHAT_HISTORY_MESSAGES  – mensagens de histórico no prompt  (padrão: 20)
+  CHAT_MAX_TOKENS        – limite de tokens da resposta      (padrão: sem limite)
+  LOCAL_BACKEND_DELAY    – atraso por trecho no backend local (padrão: 0)
+  CANCEL_CHECK_INTERVAL  – segundos entre verificações de cancelamento (padrão: 1)
+  RUN_MAX_WAIT_SECONDS   – espera máxima pelo run do assistants (padrão: 60);
+                           entra no orçamento da fila (utils/run_queue.py)
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+from ..models.user import db, Message, UploadedFile
+from . import archive, context_window, metrics, openai_breaker, tracing
+from .logging_config import get_logger
+from .openai_client import get_openai_client
+
+logger = get_logger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "assistants").lower()
+ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+CHAT_SYSTEM_PROMPT = os.getenv(
+    "CHAT_SYSTEM_PROMPT",
+    "Você é o LeilãoGPT, um assistente especializado em leilões e editais. "
+    "Responda em português, de forma objetiva, usando markdown quando ajudar.",
+)
+CHAT_HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "20"))
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "0")) or None
+LOCAL_BACKEND_DELAY = float(os.getenv("LOCAL_BACKEND_DELAY", "0"))
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "1"))
+RUN_MAX_WAIT_SECONDS = int(os.getenv("RUN_MAX_WAIT_SECONDS", "60"))
+
+# Máximo de mensagens locais usadas para semear um thread novo
+THREAD_SEED_MAX_MESSAGES = 32
+
+FALLBACK_REPLY = "Desculpe, estou temporariamente indisponível. Tente novamente mais tarde."
+CANCELLED_REPLY = "Resposta cancelada."
+UNAVAILABLE_REPLY = "O serviço de IA está instável no momento. Tente novamente em instantes."
+
+
+@dataclass
+class Turn:
+    """Um turno do chat: a mensagem do usuário já gravada e seus anexos"""
+    conversation: object
+    content: str
+    file_ids: list = field(default_factory=list)
+    original_files: list = field(default_factory=list)
+    user_message_id: int = None
+    is_cancelled: object = None   # callable → True se o usuário cancelou o turno
+
+    def cancelled(self):
+        return bool(self.is_cancelled and self.is_cancelled())
+
+
+class _CancelCheck:
+    """Consulta `turn.cancelled()` no máximo a cada CANCEL_CHECK_INTERVAL segundos"""
+
+    def __init__(self, turn):
+        self.turn = turn
+        self.last = time.monotonic()
+
+    def __call__(self):
+        now = time.monotonic()
+        if now - self.last < CANCEL_CHECK_INTERVAL:
+            return False
+        self.last = now
+        return self.turn.cancelled()
+
+
+@dataclass
+class Reply:
+    text: str
+    completed: bool = False       # True se a resposta veio do modelo (cacheável)
+    backend: str = None
+    usage: dict = None            # prompt_tokens / completion_tokens / total_tokens
+    run_id: str = None
+    status: str = "completed"     # completed | failed | timeout | cancelled | unavailable
+    model: str = None
+    queue_ms: float = None        # run na fila da OpenAI / espera pela primeira resposta
+    run_ms: float = None          # execução do run / geração
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        key: getattr(usage, key, None)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
+
+
+class LLMBackend:
+    name = None
+    uses_openai = True  # sujeito ao circuit breaker (utils/openai_breaker.py)
+
+    def supports(self, turn):
+        return True
+
+    def cache_namespace(self):
+        """Parte da chave do cache de respostas (troca de modelo = cache novo)"""
+        return self.name
+
+    def stream(self, turn):
+        raise NotImplementedError
+
+    def cancel(self, conversation, run_id):
+        """Cancela o run remoto (backends sem run remoto: nada a fazer)"""
+
+    def complete(self, turn):
+        reply = None
+        for kind, data in self.stream(turn):
+            if kind == "done":
+                reply = data
+        return reply
+
+
+# ────────────────────────────────
+# Assistants API
+# ────────────────────────────────
+def get_file_info(client, file_id):
+    """Obtém informações do arquivo da OpenAI"""
+    try:
+        file_info = client.files.retrieve(file_id)
+        return file_info
+    except Exception as e:
+        logger.warning("erro ao obter info do arquivo %s: %s", file_id, e)
+        return None
+
+
+def _ensure_thread(client, conversation, exclude_message_id=None):
+    """
+    Garante que a conversa tenha um thread na OpenAI.
+
+    Se a conversa já tem mensagens locais sem thread (ex.: primeira resposta
+    servida pelo cache), o thread novo é semeado com esse histórico, incluindo
+    os documentos anexados, para que o assistant tenha o mesmo contexto.
+    """
+    if conversation.thread_id:
+        logger.debug("reutilizando thread", extra={"thread_id": conversation.thread_id})
+        return conversation.thread_id
+
+    # Após uma troca de thread: resumo + mensagens recentes
+    seed = context_window.seed_messages(conversation, exclude_message_id, THREAD_SEED_MAX_MESSAGES)
+    if seed is None:
+        history = archive.archived_messages(conversation)[:THREAD_SEED_MAX_MESSAGES]
+        query = Message.query.filter(Message.conversation_id == conversation.id)
+        if exclude_message_id is not None:
+            # Só o que veio antes do turno atual (turnos enfileirados ficam de fora)
+            query = query.filter(Message.id < exclude_message_id)
+        history += query.order_by(Message.timestamp.asc()).limit(THREAD_SEED_MAX_MESSAGES - len(history)).all()
+        seed = [{"role": m.role, "content": m.content} for m in history if m.content]
+
+    if seed:
+        documents = [
+            {"file_id": f.file_id, "tools": [{"type": "file_search"}]}
+            for f in UploadedFile.query.filter_by(conversation_id=conversation.id)
+            if not (f.content_type or "").startswith("image/")
+        ]
+        if documents:
+            seed[0]["attachments"] = documents
+
+    # Sempre cria thread simples - anexamos arquivos via mensagem
+    with tracing.span("openai.threads.create", tracing.KIND_CLIENT, seeded_messages=len(seed)) as span:
+        thread = client.beta.threads.create(messages=seed) if seed else client.beta.threads.create()
+        span.set_attribute("thread_id", thread.id)
+    logger.info("thread criado", extra={"thread_id": thread.id, "seeded_messages": len(seed)})
+
+    conversation.thread_id = thread.id
+    db.session.commit()
+    return thread.id
+
+
+def _build_thread_message(client, conversation, content, file_ids, original_files):
+    """Monta a mensagem do thread (texto, imagens e documentos anexados)"""
+    # Prepara conteúdo da mensagem - ESTRUTURA CORRIGIDA
+    message_content = []
+
+    # Adiciona texto
+    if content.strip():
+        message_content.append({
+            "type": "text",
+            "text": content
+        })
+
+    # Para arquivos, usa informações do frontend para detectar tipo
+    if file_ids:
+        for i, file_id in enumerate(file_ids):
+            # Usa informações do arquivo original se disponível
+            if original_files and i < len(original_files):
+                original_file = original_files[i]
+                filename = original_file.get('name', '').lower()
+                file_type = original_file.get('type', '').lower()
+
+                # Detecta se é imagem pelo tipo MIME ou nome
+                is_image = (
+                    file_type.startswith('image/') or
+                    filename.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.svg')) or
+                    'image' in filename
+                )
+
+                if is_image:
+                    # Para imagens, usa image_file
+                    message_content.append({
+                        "type": "image_file",
+                        "image_file": {"file_id": file_id}
+                    })
+                    logger.debug("anexo imagem", extra={"file_id": file_id, "file_type": file_type})
+                else:
+                    # Para documentos (PDF, DOC, etc.), adiciona como anexo simples
+                    # O assistant deve estar configurado com file_search habilitado
+                    logger.debug("anexo documento", extra={"file_id": file_id, "file_type": file_type})
+                    # Não adiciona ao content da mensagem - será processado automaticamente
+                    # se o assistant tiver file_search habilitado
+            else:
+                # Fallback: usa API da OpenAI para detectar tipo
+                file_info = get_file_info(client, file_id)
+                if file_info:
+                    filename = getattr(file_info, 'filename', '').lower()
+                    is_image = (
+                        filename.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.svg')) or
+                        'image' in filename
+                    )
+
+                    if is_image:
+                        message_content.append({
+                            "type": "image_file", 
+                            "image_file": {"file_id": file_id}
+                        })
+                        logger.debug("anexo imagem (API)", extra={"file_id": file_id})
+                    else:
+                        logger.debug("anexo documento (API)", extra={"file_id": file_id})
+                else:
+                    logger.debug("anexo de tipo não identificado", extra={"file_id": file_id})
+
+    # Cria mensagem no thread
+    message_data = {
+        "thread_id": conversation.thread_id,
+        "role": "user",
+        "content": message_content
+    }
+
+    # Se há documentos (PDFs, etc.), adiciona attachments
+    document_files = []
+    if file_ids and original_files:
+        for i, file_id in enumerate(file_ids):
+            if i < len(original_files):
+                original_file = original_files[i]
+                file_type = original_file.get('type', '').lower()
+                is_image = file_type.startswith('image/')
+
+                if not is_image:  # Se não é imagem, é documento
+                    document_files.append({
+                        "file_id": file_id,
+                        "tools": [{"type": "file_search"}]
+                    })
+
+    if document_files:
+        message_data["attachments"] = document_files
+
+    return message_data, document_files
+
+
+class AssistantsBackend(LLMBackend):
+    name = "assistants"
+
+    def cache_namespace(self):
+        return ASSISTANT_ID
+
+    def cancel(self, conversation, run_id):
+        if not run_id or not run_id.startswith("run_") or not conversation.thread_id:
+            return False
+        try:
+            with tracing.span("openai.runs.cancel", tracing.KIND_CLIENT, run_id=run_id):
+                get_openai_client().beta.threads.runs.cancel(thread_id=conversation.thread_id, run_id=run_id)
+        except Exception as e:
+            # Run já terminado: a API responde 400; não há o que cancelar
+            logger.info("run não cancelado: %s", e, extra={"run_id": run_id})
+            return False
+        metrics.incr("run_cancelled", backend=self.name)
+        logger.info("run cancelado", extra={"run_id": run_id})
+        return True
+
+    def stream(self, turn):
+        """
+        Executa o assistant no thread da conversa e aguarda a resposta.
+        A resposta chega inteira num único delta.
+        """
+        conversation = turn.conversation
+        content, file_ids, original_files = turn.content, turn.file_ids, turn.original_files
+        reply = Reply(FALLBACK_REPLY, backend=self.name, status="failed")
+        try:
+            client = get_openai_client()  # ← USA O CLIENTE CENTRALIZADO
+
+            # Troca de thread se o contexto passou do orçamento; cria ou reutiliza thread
+            context_window.maybe_rollover(conversation, exclude_message_id=turn.user_message_id)
+            _ensure_thread(client, conversation, exclude_message_id=turn.user_message_id)
+
+            message_data, document_files = _build_thread_message(
+                client, conversation, content, file_ids, original_files
+            )
+            with tracing.span("openai.messages.create", tracing.KIND_CLIENT,
+                              thread_id=conversation.thread_id, attachments=len(document_files)):
+                thread_message = client.beta.threads.messages.create(**message_data)
+            logger.debug(
+                "mensagem criada no thread",
+                extra={"message_id": thread_message.id, "documents": len(document_files)},
+            )
+
+            # Executa o assistant
+            with tracing.span("openai.runs.create", tracing.KIND_CLIENT, thread_id=conversation.thread_id) as span:
+                run = client.beta.threads.runs.create(
+                    thread_id=conversation.thread_id,
+                    assistant_id=ASSISTANT_ID,
+                    **context_window.run_options(conversation),
+                )
+                span.set_attribute("run_id", run.id)
+                span.set_attribute("run_status", run.status)
+            run_started = time.perf_counter()
+            in_progress_at = run_started if run.status == "in_progress" else None
+            reply.run_id = run.id
+            logger.info("run iniciado", extra={"run_id": run.id})
+
+            # Aguarda conclusão
+            max_wait = RUN_MAX_WAIT_SECONDS
+            wait_time = 0
+            cancelled = False
+            try:
+                # Dentro do try: desconectar já no "started" também cancela o run
+                yield "started", {"run_id": run.id}
+                while run.status in ("queued", "in_progress") and wait_time < max_wait:
+                    time.sleep(1)
+                    wait_time += 1
+                    if turn.cancelled():
+                        # O endpoint de cancelamento já chamou runs.cancel
+                        cancelled = True
+                        break
+                    with tracing.span("openai.runs.retrieve", tracing.KIND_CLIENT,
+                                      run_id=run.id, poll=wait_time) as span:
+                        run = client.beta.threads.runs.retrieve(
+                            thread_id=conversation.thread_id, run_id=run.id
+                        )
+                        span.set_attribute("run_status", run.status)
+                    if in_progress_at is None and run.status != "queued":
+                        in_progress_at = time.perf_counter()
+                    logger.debug(
+                        "aguardando run",
+                        extra={"run_id": run.id, "run_status": run.status, "wait_s": wait_time},
+                    )
+                    yield "waiting", {"run_id": run.id, "run_status": run.status}
+            except GeneratorExit:
+                # Cliente desconectou: o run não fica consumindo tokens sem ninguém esperando
+                self.cancel(conversation, run.id)
+                raise
+
+            run_finished = time.perf_counter()
+            run_ms = round((run_finished - run_started) * 1000, 2)
+            reply.model = getattr(run, "model", None)
+            created_at, started_at = getattr(run, "created_at", None), getattr(run, "started_at", None)
+            if created_at and started_at:
+                # Divisão fila/execução pelos timestamps da API; o total é o medido aqui
+                reply.queue_ms = min(max(started_at - created_at, 0) * 1000, run_ms)
+            else:
+                # Sem timestamps: fila = até o primeiro status fora de "queued" (granularidade do polling)
+                reply.queue_ms = ((in_progress_at or run_finished) - run_started) * 1000
+            reply.run_ms = run_ms - reply.queue_ms
+            if cancelled or run.status in ("cancelling", "cancelled"):
+                logger.info("run cancelado pelo usuário", extra={"run_id": run.id, "run_ms": run_ms})
+                assistant_reply = CANCELLED_REPLY
+                reply.status = "cancelled"
+            elif run.status == "completed":
+                logger.info("run completado", extra={"run_id": run.id, "run_ms": run_ms})
+                reply.usage = _usage_dict(getattr(run, "usage", None))
+
+                # Busca resposta do assistant
+                with tracing.span("openai.messages.list", tracing.KIND_CLIENT, thread_id=conversation.thread_id):
+                    messages = client.beta.threads.messages.list(
+                        thread_id=conversation.thread_id,
+                        order="desc",
+                        limit=1
+                    ).data
+
+                if messages:
+                    assistant_reply = ""
+                    for content_block in messages[0].content:
+                        if hasattr(content_block, 'text'):
+                            assistant_reply += content_block.text.value
+
+                    if assistant_reply:
+                        reply.completed = True
+                        reply.status = "completed"
+                    else:
+                        assistant_reply = "Desculpe, não consegui processar sua mensagem."
+                else:
+                    assistant_reply = "Desculpe, não recebi resposta do assistente."
+
+            elif run.status == "failed":
+                error_info = getattr(run, 'last_error', 'Erro desconhecido')
+                logger.error(
+                    "run falhou: %s", error_info, extra={"run_id": run.id, "run_ms": run_ms}
+                )
+                error_code = getattr(error_info, "code", None)
+                if error_code in ("server_error", "rate_limit_exceeded"):
+                    # Falha do lado da OpenAI (não do pedido): conta para o breaker
+                    openai_breaker.breaker.record_failure(f"run_{error_code}")
+                assistant_reply = "Desculpe, ocorreu um erro ao processar sua mensagem."
+            elif wait_time >= max_wait:
+                logger.warning("timeout aguardando run", extra={"run_id": run.id, "run_ms": run_ms})
+                openai_breaker.breaker.record_failure("run_timeout")
+                assistant_reply = "Desculpe, a resposta está demorando muito. Tente novamente."
+                reply.status = "timeout"
+            else:
+                logger.warning(
+                    "run terminou com status inesperado",
+                    extra={"run_id": run.id, "run_status": run.status, "run_ms": run_ms},
+                )
+                assistant_reply = "Desculpe, ocorreu um erro inesperado."
+            reply.text = assistant_reply
+
+        except Exception as api_error:
+            if openai_breaker.is_circuit_open(api_error):
+                logger.warning("OpenAI indisponível (circuito aberto): %s", api_error)
+                reply.text, reply.status = UNAVAILABLE_REPLY, "unavailable"
+            else:
+                logger.exception("erro na API OpenAI: %s", api_error)
+
+        yield "delta", reply.text
+        yield "done", reply
+
+
+# ────────────────────────────────
+# Chat Completions (histórico local)
+# ────────────────────────────────
+class ChatCompletionsBackend(LLMBackend):
+    name = "chat"
+
+    def supports(self, turn):
+        # file_search / imagens por file_id só existem na Assistants API
+        return not turn.file_ids
+
+    def cache_namespace(self):
+        return f"chat:{CHAT_MODEL}"
+
+    def build_messages(self, turn):
+        """System prompt + resumo (se houve troca de contexto) + histórico recente + pergunta"""
+        conversation = turn.conversation
+        messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+        if conversation.context_summary:
+            messages.append({
+                "role": "system",
+                "content": context_window.SUMMARY_PREFIX + conversation.context_summary,
+            })
+
+        base = conversation.context_base_message_id or 0
+        history = (
+            Message.query.filter(
+                Message.conversation_id == conversation.id,
+                Message.id > base,
+                Message.id < turn.user_message_id,
+            )
+            .order_by(Message.id.desc())
+            .limit(CHAT_HISTORY_MESSAGES)
+            .all()
+        )
+        if len(history) < CHAT_HISTORY_MESSAGES and conversation.archive is not None:
+            older = [m for m in archive.archived_messages(conversation) if m.id > base]
+            history += older[::-1][:CHAT_HISTORY_MESSAGES - len(history)]
+
+        for m in reversed(history):
+            if m.role in ("user", "assistant") and m.content:
+                messages.append({"role": m.role, "content": m.content})
+        messages.append({"role": "user", "content": turn.content})
+        return messages
+
+    def stream(self, turn):
+        conversation = turn.conversation
+        reply = Reply(FALLBACK_REPLY, backend=self.name, status="failed")
+        parts = []
+        started = time.perf_counter()
+        check_cancel = _CancelCheck(turn)
+        cancelled = False
+        try:
+            client = get_openai_client()
+            kwargs = {}
+            if CHAT_MAX_TOKENS:
+                kwargs["max_tokens"] = CHAT_MAX_TOKENS
+            with tracing.span("openai.chat.completions.create", tracing.KIND_CLIENT, model=CHAT_MODEL):
+                response = client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=self.build_messages(turn),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **kwargs,
+                )
+            reply.model = CHAT_MODEL
+            first_chunk_at = None
+            yield "started", {"run_id": None}
+            # Span manual (não fica ativo): o stream atravessa os yields para o chamador
+            stream_span = tracing.start_span("openai.chat.completions.stream", tracing.KIND_CLIENT)
+            try:
+                for chunk in response:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                        reply.queue_ms = (first_chunk_at - started) * 1000
+                        stream_span.set_attribute("first_chunk_ms", round(reply.queue_ms, 2))
+                    reply.model = getattr(chunk, "model", None) or reply.model
+                    if chunk.usage is not None:
+                        reply.usage = _usage_dict(chunk.usage)
+                    for choice in chunk.choices or []:
+                        text = choice.delta.content if choice.delta else None
+                        if text:
+                            parts.append(text)
+                            yield "delta", text
+                    if check_cancel():
+                        cancelled = True
+                        break
+            finally:
+                # Cancelado / cliente desconectou / gerador fechado: encerra a conexão HTTP
+                response.close()
+                stream_span.set_attribute("chunks", len(parts))
+                stream_span.set_attribute("cancelled", cancelled or None)
+                stream_span.end()
+
+            if first_chunk_at is not None:
+                reply.run_ms = (time.perf_counter() - first_chunk_at) * 1000
+            if cancelled:
+                metrics.incr("run_cancelled", backend=self.name)
+                reply.text = "".join(parts) or CANCELLED_REPLY
+                reply.status = "cancelled"
+            elif parts:
+                reply.text = "".join(parts)
+                reply.completed = True
+                reply.status = "completed"
+            else:
+                reply.text = "Desculpe, não recebi resposta do assistente."
+            logger.info("resposta via chat completions", extra={
+                "model": CHAT_MODEL, "run_ms": round((time.perf_counter() - started) * 1000, 2),
+                "usage": reply.usage,
+            })
+        except GeneratorExit:
+            raise
+        except Exception as api_error:
+            if openai_breaker.is_circuit_open(api_error):
+                logger.warning("OpenAI indisponível (circuito aberto): %s", api_error)
+                reply.text, reply.status = UNAVAILABLE_REPLY, "unavailable"
+            else:
+                logger.exception("erro na API OpenAI (chat): %s", api_error)
+            if parts:
+                # Falhou no meio do stream: entrega o que chegou
+                reply.text = "".join(parts)
+                yield "done", reply
+                return
+            yield "delta", reply.text
+            yield "done", reply
+            return
+
+        if conversation.thread_id:
+            # O thread da Assistants API ficou sem os turnos feitos por aqui:
+            # descarta-o para que um turno futuro com anexos o recrie do histórico
+            from .openai_gc import enqueue_cleanup
+
+            enqueue_cleanup(thread_ids=[conversation.thread_id])
+            conversation.thread_id = None
+        if not parts:
+            yield "delta", reply.text
+        yield "done", reply
+
+
+# ────────────────────────────────
+# Stand-in local
+# ────────────────────────────────
+class LocalBackend(LLMBackend):
+    name = "local"
+    uses_openai = False
+
+    def stream(self, turn):
+        text = (
+            "## Resposta local\n\n"
+            f"Recebi sua mensagem ({len(turn.content)} caracteres"
+            f"{f', {len(turn.file_ids)} anexo(s)' if turn.file_ids else ''}): "
+            f"{turn.content[:200]}"
+        )
+        yield "started", {"run_id": None}
+        started = time.perf_counter()
+        check_cancel = _CancelCheck(turn)
+        for i in range(0, len(text), 32):
+            if LOCAL_BACKEND_DELAY:
+                time.sleep(LOCAL_BACKEND_DELAY)
+            if check_cancel():
+                yield "done", Reply(text[:i] or CANCELLED_REPLY, backend=self.name, status="cancelled",
+                                    model=self.name, queue_ms=0, run_ms=(time.perf_counter() - started) * 1000)
+                return
+            yield "delta", text[i:i + 32]
+        prompt_tokens = max(1, len(turn.content) // 4)
+        completion_tokens = max(1, len(text) // 4)
+        yield "done", Reply(
+            text, completed=True, backend=self.name,
+            model=self.name, queue_ms=0, run_ms=(time.perf_counter() - started) * 1000,
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                   "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+
+BACKENDS = {cls.name: cls() for cls in (AssistantsBackend, ChatCompletionsBackend, LocalBackend)}
+
+
+def cancel_run(conversation, run_id):
+    """Cancela um run remoto pelo id (endpoint de cancelamento)"""
+    return any(backend.cancel(conversation, run_id) for backend in BACKENDS.values())
+
+
+def backend_for(turn):
+    """Backend configurado para a conversa, com fallback para assistants"""
+    name = (getattr(turn.conversation, "llm_backend", None) or LLM_BACKEND).lower()
+    backend = BACKENDS.get(name, BACKENDS["assistants"])
+    if not backend.supports(turn):
+        metrics.incr("llm_backend_fallback", backend=backend.name)
+        backend = BACKENDS["assistants"]
+    return backend
@@ -0,0 +1,185 @@
+# backend/src/utils/logging_config.py
+"""
+Logging estruturado (JSON) com handler baseado em fila.
+
+As threads de request apenas enfileiram o registro (sem I/O); uma thread
+``QueueListener`` por processo escreve em stdout. Cada registro carrega
+request_id / trace_id / user_id / conversation_id do contexto Flask atual,
+além de qualquer campo passado via ``extra={...}`` (ex.: ``duration_ms``).
+
+Variáveis de ambiente:
+  LOG_LEVEL       – DEBUG | INFO | WARNING | ERROR   (padrão: INFO)
+  LOG_FORMAT      – json | text                      (padrão: json)
+  LOG_QUEUE_SIZE  – tamanho máximo da fila; excedentes são descartados
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Atributos padrão do LogRecord – tudo que não estiver aqui veio de `extra`
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_CONTEXT_FIELDS = ("request_id", "trace_id", "user_id", "conversation_id")
+
+_handler = None
+_listener = None
+_exception_formatter = logging.Formatter()
+
+
+class RequestContextFilter(logging.Filter):
+    """Anexa os ids do request atual ao registro (roda na thread do request)"""
+
+    def filter(self, record):
+        if has_request_context():
+            for field in _CONTEXT_FIELDS:
+                if getattr(record, field, None) is None:
+                    setattr(record, field, g.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata o registro como uma linha JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_") and value is not None:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloqueia: com a fila cheia o registro é descartado"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        """
+        Resolve a mensagem e o traceback na thread de origem, mas sem
+        dobrá-los em `msg` (o prepare padrão faz isso e zera exc_info): o
+        traceback segue em `exc_text` e o JsonFormatter o emite como exc_info.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            # O traceback prende os frames (e variáveis locais) até a escrita
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_output_handler():
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        stream.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+            defaults={"request_id": "-"},
+        ))
+    else:
+        stream.setFormatter(JsonFormatter())
+    return stream
+
+
+def _start_listener():
+    """(Re)cria fila e thread de escrita – usado no boot e após fork"""
+    global _listener
+    _handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(
+        _handler.queue, _build_output_handler(), respect_handler_level=False
+    )
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+
+
+def setup_logging(app=None):
+    """Configura o logging do processo e registra hooks de request no app"""
+    global _handler
+
+    if _handler is None:
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        _handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+
+        _start_listener()
+        atexit.register(_stop_listener)
+        # Threads não sobrevivem ao fork do gunicorn (preload_app): recria no filho
+        os.register_at_fork(after_in_child=_start_listener)
+
+    if app is not None:
+        _register_request_hooks(app)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def bind_log_context(**fields):
+    """Associa campos (ex.: conversation_id) aos logs do request atual"""
+    if has_request_context():
+        for key, value in fields.items():
+            setattr(g, key, value)
+
+
+def _register_request_hooks(app):
+    logger = logging.getLogger("src.request")
+
+    @app.before_request
+    def _start_request_log():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_log(response):
+        started = g.get("request_started")
+        if started is not None:
+            logger.info(
+                "request",
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
+        if g.get("request_id"):
+            response.headers["X-Request-ID"] = g.request_id
+        return response
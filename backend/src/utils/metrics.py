@@ -0,0 +1,59 @@
+# backend/src/utils/metrics.py
+"""
+Métricas simples em memória (por processo).
+
+Contadores e observações de tempo identificados por nome + labels, expostos
+em GET /api/admin/metrics. Ex.:
+
+    metrics.incr("answer_cache", result="hit")
+    metrics.observe("openai_run_ms", 1520.4, status="completed")
+"""
+import threading
+import time
+
+_lock = threading.Lock()
+_counters = {}
+_observations = {}
+_started_at = time.time()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def incr(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        count, total, maximum = _observations.get(key, (0, 0.0, 0.0))
+        _observations[key] = (count + 1, total + value, max(maximum, value))
+
+
+def snapshot():
+    """Retorna as métricas atuais em formato serializável"""
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        observations = [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "sum": round(total, 3),
+                "avg": round(total / count, 3) if count else None,
+                "max": round(maximum, 3),
+            }
+            for (name, labels), (count, total, maximum) in sorted(_observations.items())
+        ]
+    return {
+        "uptime_s": round(time.time() - _started_at, 1),
+        "counters": counters,
+        "observations": observations,
+    }
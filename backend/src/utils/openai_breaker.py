@@ -0,0 +1,226 @@
+# backend/src/utils/openai_breaker.py
+"""
+Circuit breaker e retries das chamadas à OpenAI.
+
+Com a OpenAI lenta ou falhando, cada send_message esperava até o timeout do
+run (60 s) para devolver o pedido de desculpas genérico – com dois workers
+sync, um incidente lá virava indisponibilidade total aqui. Agora todas as
+chamadas do SDK passam por `BreakerTransport` (utils/openai_transport.py,
+transporte httpx como o do cassete), que alimenta um breaker por processo:
+
+  closed     – as chamadas passam; o resultado de cada uma entra numa janela
+               de OPENAI_BREAKER_WINDOW_SECONDS. Com pelo menos
+               OPENAI_BREAKER_MIN_CALLS chamadas na janela e a taxa de falhas
+               (erro de conexão/timeout, 5xx, 429, run que estourou o tempo)
+               ou de chamadas lentas acima do limite, o circuito abre
+  open       – as chamadas falham na hora (CircuitOpenError); send_message e
+               upload respondem 503 com Retry-After antes de gravar qualquer
+               coisa. Após OPENAI_BREAKER_OPEN_SECONDS passa a half_open
+  half_open  – até OPENAI_BREAKER_HALF_OPEN_CALLS chamadas de teste passam;
+               se todas derem certo o circuito fecha, uma falha reabre
+
+Os retries (só de chamadas idempotentes) ficam no mesmo transporte.
+
+O estado aparece em /health, em GET /api/admin/metrics ("openai_breaker")
+e nos contadores openai_breaker* / openai_retry.
+
+Variáveis de ambiente:
+  OPENAI_BREAKER_ENABLED          – true | false                      (padrão: true)
+  OPENAI_BREAKER_WINDOW_SECONDS   – janela de observação              (padrão: 60)
+  OPENAI_BREAKER_MIN_CALLS        – chamadas mínimas para abrir       (padrão: 5)
+  OPENAI_BREAKER_FAILURE_RATE     – fração de falhas que abre         (padrão: 0.5)
+  OPENAI_BREAKER_SLOW_MS          – chamada considerada lenta         (padrão: 20000)
+  OPENAI_BREAKER_SLOW_RATE        – fração de lentas que abre         (padrão: 0.8)
+  OPENAI_BREAKER_OPEN_SECONDS     – tempo aberto até o teste          (padrão: 30)
+  OPENAI_BREAKER_HALF_OPEN_CALLS  – chamadas de teste                 (padrão: 1)
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from flask import jsonify
+
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+OPENAI_BREAKER_ENABLED = os.getenv("OPENAI_BREAKER_ENABLED", "true").lower() == "true"
+OPENAI_BREAKER_WINDOW_SECONDS = float(os.getenv("OPENAI_BREAKER_WINDOW_SECONDS", "60"))
+OPENAI_BREAKER_MIN_CALLS = int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "5"))
+OPENAI_BREAKER_FAILURE_RATE = float(os.getenv("OPENAI_BREAKER_FAILURE_RATE", "0.5"))
+OPENAI_BREAKER_SLOW_MS = float(os.getenv("OPENAI_BREAKER_SLOW_MS", "20000"))
+OPENAI_BREAKER_SLOW_RATE = float(os.getenv("OPENAI_BREAKER_SLOW_RATE", "0.8"))
+OPENAI_BREAKER_OPEN_SECONDS = float(os.getenv("OPENAI_BREAKER_OPEN_SECONDS", "30"))
+OPENAI_BREAKER_HALF_OPEN_CALLS = int(os.getenv("OPENAI_BREAKER_HALF_OPEN_CALLS", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada sem ir à rede: o circuito da OpenAI está aberto"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"OpenAI indisponível (circuito aberto); tente em {retry_after} s")
+        self.retry_after = retry_after
+
+
+def is_circuit_open(error):
+    """True se o erro (ou a causa, já embrulhada pelo SDK) é um CircuitOpenError"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CircuitOpenError):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (instante, falhou, lenta)
+        self.state = CLOSED
+        self._opened_at = None
+        self._trials = 0
+        self._trial_successes = 0
+        self.last_failure = None
+        self.opened_count = 0
+
+    # ─── transições (com o lock) ──────────────────────────
+    def _transition(self, state, reason=None):
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened_count += 1
+        if state in (HALF_OPEN, CLOSED):
+            self._trials = self._trial_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        metrics.incr("openai_breaker_transition", to=state)
+        log = logger.warning if state == OPEN else logger.info
+        log("circuito da OpenAI: %s → %s", previous, state, extra={"breaker": self.name, "reason": reason})
+
+    def _retry_after(self, now):
+        if self.state != OPEN:
+            return 0
+        return max(0.0, self._opened_at + OPENAI_BREAKER_OPEN_SECONDS - now)
+
+    def _prune(self, now):
+        cutoff = now - OPENAI_BREAKER_WINDOW_SECONDS
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    # ─── API ──────────────────────────────────────────────
+    def available(self):
+        """Uma chamada agora passaria? (não reserva a vaga de teste)"""
+        if not OPENAI_BREAKER_ENABLED:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                return self._retry_after(now) <= 0
+            if self.state == HALF_OPEN:
+                return self._trials < OPENAI_BREAKER_HALF_OPEN_CALLS
+            return True
+
+    def retry_after(self):
+        """Segundos até o próximo teste (inteiro, para o cabeçalho Retry-After)"""
+        with self._lock:
+            return max(1, math.ceil(self._retry_after(time.monotonic())))
+
+    def acquire(self):
+        """
+        Reserva a chamada: "call" (circuito fechado) ou "trial" (teste em
+        half_open). Levanta CircuitOpenError se a chamada deve falhar na hora.
+        """
+        if not OPENAI_BREAKER_ENABLED:
+            return "call"
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self._retry_after(now) > 0:
+                    metrics.incr("openai_breaker", result="rejected")
+                    raise CircuitOpenError(max(1, math.ceil(self._retry_after(now))))
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trials >= OPENAI_BREAKER_HALF_OPEN_CALLS:
+                    metrics.incr("openai_breaker", result="rejected")
+                    raise CircuitOpenError(1)
+                self._trials += 1
+                return "trial"
+            return "call"
+
+    def record(self, token, failed, elapsed_ms=None, reason=None):
+        """Resultado de uma chamada reservada com acquire()"""
+        if not OPENAI_BREAKER_ENABLED:
+            return
+        slow = bool(OPENAI_BREAKER_SLOW_MS and elapsed_ms is not None and elapsed_ms >= OPENAI_BREAKER_SLOW_MS)
+        with self._lock:
+            now = time.monotonic()
+            if failed:
+                self.last_failure = reason
+            if token == "trial":
+                if self.state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._transition(OPEN, reason or "chamada de teste lenta")
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= OPENAI_BREAKER_HALF_OPEN_CALLS:
+                    self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return  # chamada iniciada antes de o circuito abrir
+            self._outcomes.append((now, failed, slow))
+            self._prune(now)
+            total = len(self._outcomes)
+            if total < OPENAI_BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            slows = sum(1 for _, _, s in self._outcomes if s)
+            if failures / total >= OPENAI_BREAKER_FAILURE_RATE:
+                self._transition(OPEN, f"{failures}/{total} falhas")
+            elif OPENAI_BREAKER_SLOW_MS and slows / total >= OPENAI_BREAKER_SLOW_RATE:
+                self._transition(OPEN, f"{slows}/{total} chamadas lentas")
+
+    def record_failure(self, reason):
+        """Falha percebida fora do HTTP (ex.: run que estourou o tempo de espera)"""
+        metrics.incr("openai_breaker_failure", reason=reason)
+        self.record("call", True, reason=reason)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            total = len(self._outcomes)
+            return {
+                "enabled": OPENAI_BREAKER_ENABLED,
+                "state": self.state,
+                "retry_after_s": round(self._retry_after(now), 1),
+                "window_calls": total,
+                "window_failures": sum(1 for _, f, _ in self._outcomes if f),
+                "window_slow": sum(1 for _, _, s in self._outcomes if s),
+                "opened_count": self.opened_count,
+                "last_failure": self.last_failure,
+            }
+
+
+breaker = CircuitBreaker("openai")
+
+
+def unavailable_response():
+    """503 com Retry-After enquanto o circuito está aberto (antes de gravar qualquer coisa)"""
+    retry_after = breaker.retry_after()
+    metrics.incr("openai_breaker", result="fast_fail")
+    response = jsonify({
+        "message": "O serviço de IA está instável no momento. Tente novamente em instantes.",
+        "error": "openai_unavailable",
+        "retry_after": retry_after,
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
@@ -0,0 +1,217 @@
+# backend/src/utils/openai_cassette.py
+"""
+Transporte httpx de gravação/reprodução ("cassete") para as chamadas OpenAI.
+
+Modo record: cada chamada feita pelo SDK é repassada à API real e gravada
+como uma linha JSON (método, caminho, corpo, resposta e latência), junto com
+o request_id do Flask que a originou. As entradas de ``send_message`` e
+``upload_files`` também são gravadas (``kind = "inbound"``) para que o
+formato do tráfego possa ser reproduzido depois por ``bench/replay_traffic.py``.
+Cada linha leva o instante absoluto (``ts``, epoch): com vários workers
+gravando o mesmo arquivo, os intervalos são calculados na reprodução. O
+corpo da resposta é copiado enquanto passa para o SDK – respostas em
+streaming chegam ao chamador trecho a trecho, e a linha é gravada quando o
+stream fecha.
+
+Modo replay: as respostas são servidas do arquivo, na ordem gravada, com a
+latência original multiplicada por ``OPENAI_REPLAY_LATENCY_SCALE``.
+
+Atenção: o cassete contém o texto das mensagens dos usuários e as respostas
+do assistente – trate o arquivo como dado sensível.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+from flask import g, has_request_context
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Ids da OpenAI (thread_abc, run_abc, msg_abc, file-abc, vs_abc...) viram "{id}"
+_ID_SEGMENT = re.compile(r"^(thread|run|msg|file|vs|asst|step|batch)[_-][A-Za-z0-9]+$")
+_DROP_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def path_template(path):
+    return "/".join("{id}" if _ID_SEGMENT.match(seg) else seg for seg in path.split("/"))
+
+
+def _current_request_id():
+    return g.get("request_id") if has_request_context() else None
+
+
+def _request_body(request):
+    body = request.read()
+    if not body:
+        return None
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            return json.loads(body)
+        except ValueError:
+            pass
+    # Uploads multipart: guarda só tamanho e hash, nunca o arquivo
+    return {"_bytes": len(body), "_sha256": hashlib.sha256(body).hexdigest()}
+
+
+class _CassetteWriter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        entry.setdefault("ts", round(time.time(), 4))
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Repassa os trechos da resposta e entrega o corpo completo ao fechar"""
+
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._chunks = []
+        self._completed = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._chunks.append(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._completed:
+                self._completed = True
+                try:
+                    self._on_complete(b"".join(self._chunks))
+                except Exception as e:
+                    logger.warning("falha ao gravar no cassete: %s", e)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Repassa ao transporte real e grava cada interação no cassete"""
+
+    def __init__(self, path, inner=None):
+        self.inner = inner or httpx.HTTPTransport()
+        self.writer = _CassetteWriter(path)
+
+    def handle_request(self, request):
+        ts = round(time.time(), 4)
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        entry = {
+            "kind": "openai",
+            "ts": ts,
+            "request_id": _current_request_id(),
+            "method": request.method,
+            "path": request.url.path,
+            "query": str(request.url.query, "ascii") if request.url.query else "",
+            "request_body": _request_body(request),
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items()
+                        if k.lower() not in _DROP_RESPONSE_HEADERS},
+        }
+
+        def complete(raw):
+            # Bytes como vieram da rede: decodifica (gzip/br) como o SDK faria
+            body = httpx.Response(response.status_code, headers=response.headers, content=raw).read()
+            entry["body"] = body.decode("utf-8", errors="replace")
+            entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.writer.write(entry)
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, complete),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def record_inbound(self, route, payload):
+        self.writer.write({
+            "kind": "inbound",
+            "request_id": _current_request_id(),
+            "route": route,
+            "payload": payload,
+        })
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """
+    Serve respostas do cassete sem acessar a rede.
+
+    A busca tenta primeiro o caminho exato (preserva a sequência de status
+    de um mesmo run) e depois o caminho com ids normalizados. Quando a fila
+    de um caminho se esgota, a última resposta é repetida – útil quando o
+    build novo faz mais polls que o gravado.
+    """
+
+    def __init__(self, path, latency_scale=1.0):
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._exact = defaultdict(deque)
+        self._template = defaultdict(deque)
+        self._last = {}
+        self.misses = 0
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("kind") != "openai":
+                    continue
+                self._exact[(entry["method"], entry["path"])].append(entry)
+                self._template[(entry["method"], path_template(entry["path"]))].append(entry)
+
+    def _next(self, method, path):
+        with self._lock:
+            for index, key in ((self._exact, (method, path)),
+                               (self._template, (method, path_template(path)))):
+                queue = index.get(key)
+                if queue:
+                    entry = queue.popleft()
+                    self._last[key] = entry
+                    return entry
+                if key in self._last:
+                    return self._last[key]
+            self.misses += 1
+            return None
+
+    def handle_request(self, request):
+        request.read()
+        entry = self._next(request.method, request.url.path)
+        if entry is None:
+            logger.warning("cassete sem resposta", extra={"method": request.method, "path": request.url.path})
+            return httpx.Response(
+                404,
+                json={"error": {"message": "cassette miss", "type": "invalid_request_error"}},
+                request=request,
+            )
+
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed_ms"] / 1000.0 * self.latency_scale)
+
+        return httpx.Response(
+            entry["status"],
+            headers=entry.get("headers") or {},
+            content=entry["body"].encode("utf-8"),
+            request=request,
+        )
+
+    def record_inbound(self, route, payload):
+        pass
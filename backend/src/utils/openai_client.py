@@ -1,16 +1,66 @@
 # backend/src/utils/openai_client.py
 import os
-import openai
+import threading
+from typing import TYPE_CHECKING
 
-def get_openai_client() -> openai.OpenAI:
+if TYPE_CHECKING:  # o SDK é importado só na primeira chamada (~0,5 s de boot)
+    import openai
+
+# live | record | replay  (ver utils/openai_cassette.py)
+OPENAI_TRANSPORT = os.getenv("OPENAI_TRANSPORT", "live").lower()
+OPENAI_CASSETTE_PATH = os.getenv("OPENAI_CASSETTE_PATH", "openai_cassette.jsonl")
+OPENAI_REPLAY_LATENCY_SCALE = float(os.getenv("OPENAI_REPLAY_LATENCY_SCALE", "1.0"))
+# Timeout de cada chamada HTTP (o padrão do SDK é 600 s)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+_client = None
+_transport = None
+_client_lock = threading.Lock()
+
+
+def _build_transport():
+    if OPENAI_TRANSPORT == "record":
+        from .openai_cassette import RecordingTransport
+        return RecordingTransport(OPENAI_CASSETTE_PATH)
+    if OPENAI_TRANSPORT == "replay":
+        from .openai_cassette import ReplayTransport
+        return ReplayTransport(OPENAI_CASSETTE_PATH, OPENAI_REPLAY_LATENCY_SCALE)
+    return None
+
+
+def get_openai_client() -> "openai.OpenAI":
     """
     Retorna uma instância configurada do SDK OpenAI.
-    
+
     Requer a variável de ambiente OPENAI_API_KEY no arquivo .env
     ou exportada no ambiente do servidor.
+
+    A instância é criada uma única vez por processo e reaproveitada, de modo
+    que o pool de conexões HTTP (e o cassete, em record/replay) é compartilhado.
+    Todas as chamadas passam pelo circuit breaker (utils/openai_transport.py),
+    que também decide os retries – os do SDK ficam desligados.
     """
-    
-    return openai.OpenAI(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        # Ajuste aqui se precisar de proxy, organização etc.
-    )
\ No newline at end of file
+    global _client, _transport
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+
+                from .openai_transport import BreakerTransport
+
+                _transport = _build_transport()
+                _client = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY") or ("replay" if OPENAI_TRANSPORT == "replay" else None),
+                    http_client=openai.DefaultHttpxClient(transport=BreakerTransport(_transport)),
+                    max_retries=0,
+                    timeout=OPENAI_TIMEOUT,
+                    # Ajuste aqui se precisar de proxy, organização etc.
+                )
+    return _client
+
+
+def record_inbound(route, payload):
+    """Grava a requisição de entrada no cassete (apenas em modo record)"""
+    if OPENAI_TRANSPORT == "record":
+        get_openai_client()
+        _transport.record_inbound(route, payload)
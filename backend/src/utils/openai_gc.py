@@ -0,0 +1,152 @@
+# backend/src/utils/openai_gc.py
+"""
+Remoção de conversas e limpeza dos recursos correspondentes na OpenAI.
+
+Apagar uma conversa remove as linhas locais na hora e enfileira (no mesmo
+commit) uma tarefa "openai_cleanup" com os threads e arquivos dela. A
+tarefa roda fora do request (utils/jobs.py), apaga os vector stores que o
+file_search criou em cada thread, o thread e os arquivos, e trata 404 como
+sucesso – repetir a tarefa é sempre seguro.
+
+A remoção em massa é feita em SQL por lotes de conversas, sem carregar
+objetos: mensagens, arquivo de mensagens, registros de upload e conversas.
+
+Variáveis de ambiente:
+  OPENAI_GC_BATCH_SIZE   – recursos por tarefa de limpeza        (padrão: 50)
+  DELETE_CHUNK_SIZE      – conversas por lote na remoção em massa (padrão: 500)
+"""
+import os
+
+from ..models.user import db, ArchivedConversation, Conversation, Message, UploadedFile
+from . import metrics
+from .jobs import enqueue, job_handler
+from .logging_config import get_logger
+from .openai_client import get_openai_client
+
+logger = get_logger(__name__)
+
+OPENAI_GC_BATCH_SIZE = int(os.getenv("OPENAI_GC_BATCH_SIZE", "50"))
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "500"))
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def enqueue_cleanup(thread_ids=(), file_ids=()):
+    """Enfileira a limpeza em tarefas de até OPENAI_GC_BATCH_SIZE recursos"""
+    resources = [("thread", t) for t in thread_ids if t] + [("file", f) for f in file_ids if f]
+    for chunk in _chunks(resources, OPENAI_GC_BATCH_SIZE):
+        enqueue("openai_cleanup", {
+            "thread_ids": [value for kind, value in chunk if kind == "thread"],
+            "file_ids": [value for kind, value in chunk if kind == "file"],
+        })
+
+
+def _resources_of(conversation_ids):
+    thread_ids = [
+        t for (t,) in db.session.query(Conversation.thread_id)
+        .filter(Conversation.id.in_(conversation_ids), Conversation.thread_id.isnot(None))
+    ]
+    file_ids = [
+        f for (f,) in db.session.query(UploadedFile.file_id)
+        .filter(UploadedFile.conversation_id.in_(conversation_ids))
+    ]
+    return thread_ids, file_ids
+
+
+def delete_conversation(conversation):
+    """Remove uma conversa (cascade do ORM) e agenda a limpeza remota"""
+    thread_ids, file_ids = _resources_of([conversation.id])
+    UploadedFile.query.filter(UploadedFile.conversation_id == conversation.id).delete(
+        synchronize_session=False
+    )
+    db.session.delete(conversation)
+    enqueue_cleanup(thread_ids, file_ids)
+
+
+def delete_user_conversations(user_id, chunk_size=None):
+    """
+    Remove todas as conversas do usuário em lotes, com DELETEs por conjunto
+    (um commit por lote). Retorna o número de conversas removidas.
+    """
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    removed = 0
+    while True:
+        ids = [
+            cid for (cid,) in db.session.query(Conversation.id)
+            .filter(Conversation.user_id == user_id)
+            .order_by(Conversation.id.asc())
+            .limit(chunk_size)
+        ]
+        if not ids:
+            break
+        thread_ids, file_ids = _resources_of(ids)
+
+        # Mensagens primeiro, em sublotes: conversas longas não geram um DELETE gigante
+        while True:
+            message_ids = db.session.query(Message.id).filter(Message.conversation_id.in_(ids)).limit(
+                chunk_size * 20
+            )
+            deleted = Message.query.filter(Message.id.in_(message_ids.scalar_subquery())).delete(
+                synchronize_session=False
+            )
+            if not deleted:
+                break
+        ArchivedConversation.query.filter(ArchivedConversation.conversation_id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        UploadedFile.query.filter(UploadedFile.conversation_id.in_(ids)).delete(synchronize_session=False)
+        Conversation.query.filter(Conversation.id.in_(ids)).delete(synchronize_session=False)
+        enqueue_cleanup(thread_ids, file_ids)
+        db.session.commit()
+        removed += len(ids)
+
+    db.session.expire_all()
+    return removed
+
+
+def _is_not_found(error):
+    import openai
+
+    return isinstance(error, openai.NotFoundError)
+
+
+@job_handler("openai_cleanup")
+def cleanup_openai_resources(payload):
+    """Apaga vector stores dos threads, os threads e os arquivos (404 = já apagado)"""
+    client = get_openai_client()
+    errors = []
+
+    for thread_id in payload.get("thread_ids", []):
+        try:
+            thread = client.beta.threads.retrieve(thread_id)
+            file_search = getattr(thread.tool_resources, "file_search", None) if thread.tool_resources else None
+            for vector_store_id in (file_search.vector_store_ids if file_search else None) or []:
+                try:
+                    client.vector_stores.delete(vector_store_id)
+                    metrics.incr("openai_gc_deleted", resource="vector_store")
+                except Exception as e:
+                    if not _is_not_found(e):
+                        raise
+            client.beta.threads.delete(thread_id)
+            metrics.incr("openai_gc_deleted", resource="thread")
+        except Exception as e:
+            if not _is_not_found(e):
+                errors.append(f"thread {thread_id}: {e}")
+
+    for file_id in payload.get("file_ids", []):
+        try:
+            client.files.delete(file_id)
+            metrics.incr("openai_gc_deleted", resource="file")
+        except Exception as e:
+            if not _is_not_found(e):
+                errors.append(f"file {file_id}: {e}")
+
+    if errors:
+        # A tarefa inteira é repetida; o que já foi apagado responde 404
+        raise RuntimeError("; ".join(errors))
+    logger.info("recursos da OpenAI removidos", extra={
+        "threads": len(payload.get("thread_ids", [])), "files": len(payload.get("file_ids", [])),
+    })
@@ -0,0 +1,98 @@
+# backend/src/utils/openai_transport.py
+"""
+Transporte httpx das chamadas à OpenAI: circuit breaker + retries.
+
+Cada chamada do SDK passa pelo breaker de utils/openai_breaker.py (que
+recusa na hora com o circuito aberto e recebe o resultado e a latência).
+
+Retries: só chamadas idempotentes (GET/HEAD/DELETE – ex.: runs.retrieve,
+messages.list) são repetidas, no máximo OPENAI_RETRY_MAX vezes, em erro de
+conexão, 429 ou 5xx, com backoff exponencial com jitter (respeitando
+Retry-After). Criações (threads, mensagens, runs, arquivos) não são
+repetidas: uma nova tentativa poderia duplicar o recurso. O retry próprio
+do SDK fica desligado (max_retries=0 em utils/openai_client.py).
+
+Importado só junto do SDK (httpx fica fora do boot).
+
+Variáveis de ambiente:
+  OPENAI_RETRY_MAX         – retries de chamadas idempotentes  (padrão: 2)
+  OPENAI_RETRY_BASE_DELAY  – base do backoff, segundos         (padrão: 0.5)
+  OPENAI_RETRY_MAX_DELAY   – teto do backoff, segundos         (padrão: 4)
+"""
+import os
+import random
+import time
+
+import httpx
+
+from . import metrics
+from .logging_config import get_logger
+from .openai_breaker import breaker
+
+logger = get_logger(__name__)
+
+OPENAI_RETRY_MAX = int(os.getenv("OPENAI_RETRY_MAX", "2"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "4"))
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "DELETE"))
+RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+def _backoff(attempt, response=None):
+    """Full jitter; Retry-After da resposta (até o teto) tem precedência"""
+    delay = random.uniform(0, min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * 2 ** attempt))
+    if response is not None:
+        try:
+            delay = max(delay, min(float(response.headers.get("retry-after", "")), OPENAI_RETRY_MAX_DELAY))
+        except ValueError:
+            pass
+    return delay
+
+
+class BreakerTransport(httpx.BaseTransport):
+    """Passa cada chamada pelo breaker; repete só as idempotentes"""
+
+    def __init__(self, inner=None, circuit=None):
+        self.inner = inner or httpx.HTTPTransport()
+        self.circuit = circuit or breaker
+
+    def _attempt(self, request):
+        token = self.circuit.acquire()
+        started = time.perf_counter()
+        try:
+            response = self.inner.handle_request(request)
+        except Exception as e:
+            self.circuit.record(token, True, reason=type(e).__name__)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        failed = response.status_code >= 500 or response.status_code == 429
+        self.circuit.record(token, failed, elapsed_ms, reason=f"HTTP {response.status_code}" if failed else None)
+        return response
+
+    def handle_request(self, request):
+        retries = OPENAI_RETRY_MAX if request.method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(request)
+            except httpx.TransportError:
+                if attempt >= retries or not self.circuit.available():
+                    raise
+                delay = _backoff(attempt)
+            else:
+                if (response.status_code not in RETRYABLE_STATUS or attempt >= retries
+                        or not self.circuit.available()):
+                    return response
+                delay = _backoff(attempt, response)
+                response.close()
+            attempt += 1
+            metrics.incr("openai_retry", method=request.method)
+            logger.info("repetindo chamada à OpenAI", extra={
+                "method": request.method, "path": request.url.path, "attempt": attempt,
+                "delay_s": round(delay, 2),
+            })
+            time.sleep(delay)
+
+    def close(self):
+        self.inner.close()
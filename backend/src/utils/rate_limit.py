@@ -0,0 +1,321 @@
+# backend/src/utils/rate_limit.py
+"""
+Rate limiting por token bucket e limite de runs simultâneos por usuário.
+
+O estado fica num store plugável, compartilhado entre os workers do gunicorn:
+  memory  – dicionário local (apenas um processo; útil em dev)
+  sqlite  – arquivo SQLite no disco local, compartilhado pelos workers do host
+  redis   – qualquer servidor compatível com Redis (requer o pacote `redis`)
+
+Variáveis de ambiente:
+  RATE_LIMIT_ENABLED               – true | false                (padrão: true)
+  RATE_LIMIT_STORAGE               – memory | sqlite | redis     (padrão: sqlite)
+  RATE_LIMIT_SQLITE_PATH           – caminho do arquivo SQLite
+  RATE_LIMIT_REDIS_URL             – ex.: redis://localhost:6379/0
+  RATE_LIMIT_CHAT                  – ex.: "20/minute"
+  RATE_LIMIT_UPLOAD                – ex.: "30/minute"
+  RATE_LIMIT_MAX_CONCURRENT_RUNS   – runs simultâneos por usuário (padrão: 2)
+
+Requisições autenticadas são contadas por usuário; anônimas, por IP
+(`request.remote_addr`, ajustado pelo ProxyFix conforme TRUSTED_PROXY_HOPS
+– proxies reversos confiáveis na frente do app; padrão: 1, o do Railway).
+Ao exceder o limite a resposta é 429 com o cabeçalho Retry-After.
+Se o store falhar, a requisição passa (fail-open) e o erro é logado.
+"""
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import Response, g, jsonify, request
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "sqlite").lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv(
+    "RATE_LIMIT_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "leilaogpt_ratelimit.db")
+)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_CONCURRENT_RUNS = int(os.getenv("RATE_LIMIT_MAX_CONCURRENT_RUNS", "2"))
+
+# Slots de concorrência expiram sozinhos se o worker morrer sem liberar
+SLOT_TTL_SECONDS = int(os.getenv("RATE_LIMIT_SLOT_TTL", "180"))
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(spec):
+    """'20/minute' → (capacidade, tokens por segundo)"""
+    amount, _, period = spec.partition("/")
+    amount = int(amount)
+    seconds = _PERIODS[period.strip().rstrip("s") or "minute"]
+    return amount, amount / seconds
+
+
+LIMITS = {
+    "chat": parse_rate(os.getenv("RATE_LIMIT_CHAT", "20/minute")),
+    "upload": parse_rate(os.getenv("RATE_LIMIT_UPLOAD", "30/minute")),
+}
+
+
+# ─── Stores ────────────────────────────────────────────────
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def acquire(self, key, limit, ttl):
+        now = time.time()
+        with self._lock:
+            slots = {t: exp for t, exp in self._slots.get(key, {}).items() if exp > now}
+            if len(slots) >= limit:
+                self._slots[key] = slots
+                return None
+            token = uuid.uuid4().hex
+            slots[token] = now + ttl
+            self._slots[key] = slots
+            return token
+
+    def release(self, key, token):
+        with self._lock:
+            self._slots.get(key, {}).pop(token, None)
+
+
+class SQLiteStore:
+    """Store em arquivo SQLite – uma conexão por thread/processo"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots (key TEXT, token TEXT PRIMARY KEY, expires REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slots_key ON slots (key)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate, cost=1):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return (True, 0.0) if allowed else (False, (cost - tokens) / rate)
+
+    def acquire(self, key, limit, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM slots WHERE key = ? AND expires <= ?", (key, now))
+            (in_use,) = conn.execute("SELECT COUNT(*) FROM slots WHERE key = ?", (key,)).fetchone()
+            token = None
+            if in_use < limit:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO slots (key, token, expires) VALUES (?, ?, ?)", (key, token, now + ttl)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return token
+
+    def release(self, key, token):
+        self._connect().execute("DELETE FROM slots WHERE token = ?", (token,))
+
+
+class RedisStore:
+    _TAKE_SCRIPT = """
+    local cap, rate, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local data = redis.call('HMGET', KEYS[1], 't', 'u')
+    local tokens = tonumber(data[1]) or cap
+    local updated = tonumber(data[2]) or now
+    tokens = math.min(cap, tokens + (now - updated) * rate)
+    local allowed, wait = 0, 0
+    if tokens >= cost then tokens = tokens - cost; allowed = 1 else wait = (cost - tokens) / rate end
+    redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(cap / rate) + 1)
+    return {allowed, tostring(wait)}
+    """
+    _ACQUIRE_SCRIPT = """
+    local limit, now, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    if redis.call('ZCARD', KEYS[1]) >= limit then return 0 end
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return 1
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_STORAGE=redis requer o pacote 'redis'") from e
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self._TAKE_SCRIPT)
+        self._acquire = self._redis.register_script(self._ACQUIRE_SCRIPT)
+
+    def take(self, key, capacity, rate, cost=1):
+        allowed, wait = self._take(keys=[f"rl:{key}"], args=[capacity, rate, time.time(), cost])
+        return bool(allowed), float(wait)
+
+    def acquire(self, key, limit, ttl):
+        token = uuid.uuid4().hex
+        ok = self._acquire(keys=[f"slots:{key}"], args=[limit, time.time(), ttl, token])
+        return token if ok else None
+
+    def release(self, key, token):
+        self._redis.zrem(f"slots:{key}", token)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if RATE_LIMIT_STORAGE == "redis":
+                    _store = RedisStore(RATE_LIMIT_REDIS_URL)
+                elif RATE_LIMIT_STORAGE == "sqlite":
+                    _store = SQLiteStore(RATE_LIMIT_SQLITE_PATH)
+                else:
+                    _store = MemoryStore()
+    return _store
+
+
+# ─── Identidade do cliente ─────────────────────────────────
+def client_identity():
+    """user:<id> quando autenticado, senão ip:<endereço>"""
+    user_id = g.get("user_id")
+    if user_id is None:
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            from ..models.user import User
+            payload = User.verify_token(auth_header.split(" ", 1)[1])
+            if payload:
+                user_id = payload.get("user_id")
+    if user_id is not None:
+        return f"user:{user_id}"
+    # remote_addr já vem corrigido pelo ProxyFix (main.py), que só confia nos
+    # TRUSTED_PROXY_HOPS saltos mais à direita do X-Forwarded-For – o valor
+    # mais à esquerda é do cliente e trocá-lo daria um bucket novo a cada request
+    return f"ip:{request.remote_addr}"
+
+
+def _too_many_requests(retry_after, message):
+    response = jsonify({"message": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+# ─── Decorators ────────────────────────────────────────────
+def rate_limit(scope):
+    """Aplica o token bucket `scope` (ver LIMITS) à rota"""
+    capacity, rate = LIMITS[scope]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+            identity = client_identity()
+            try:
+                allowed, retry_after = get_store().take(f"{scope}:{identity}", capacity, rate)
+            except Exception as e:
+                logger.warning("rate limit indisponível: %s", e)
+                return f(*args, **kwargs)
+            if not allowed:
+                logger.info("rate limit excedido", extra={"scope": scope, "identity": identity})
+                return _too_many_requests(
+                    retry_after, "Muitas requisições. Aguarde alguns segundos e tente novamente."
+                )
+            return f(*args, **kwargs)
+
+        return decorated
+    return decorator
+
+
+def limit_concurrent_runs(f):
+    """Limita quantos runs do mesmo usuário podem estar em andamento ao mesmo tempo"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not RATE_LIMIT_ENABLED:
+            return f(*args, **kwargs)
+        key = f"runs:{client_identity()}"
+        try:
+            token = get_store().acquire(key, RATE_LIMIT_MAX_CONCURRENT_RUNS, SLOT_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("limite de concorrência indisponível: %s", e)
+            return f(*args, **kwargs)
+        if token is None:
+            logger.info("limite de runs simultâneos excedido", extra={"key": key})
+            return _too_many_requests(
+                5, "Você já tem respostas em andamento. Aguarde a conclusão e tente novamente."
+            )
+        def release():
+            try:
+                get_store().release(key, token)
+            except Exception as e:
+                logger.warning("falha ao liberar slot de concorrência: %s", e)
+
+        try:
+            result = f(*args, **kwargs)
+        except BaseException:
+            release()
+            raise
+        if isinstance(result, Response) and result.is_streamed:
+            # Streaming: o run continua enquanto a resposta é enviada;
+            # o slot só é liberado quando o WSGI fecha a resposta
+            result.call_on_close(release)
+        else:
+            release()
+        return result
+
+    return decorated
@@ -0,0 +1,139 @@
+# backend/src/utils/replica.py
+"""
+Roteamento opcional de leituras para uma réplica do banco.
+
+Endpoints de relatório (dashboard admin, listagens, backup) são marcados
+com `@read_replica`; dentro deles os SELECTs vão para o bind "replica",
+enquanto qualquer escrita (flush, INSERT/UPDATE/DELETE) continua no
+primário. Sem DATABASE_REPLICA_URL tudo segue no primário, como antes.
+
+A réplica só é usada se o atraso de replicação estiver dentro da
+tolerância (medido no Postgres com pg_last_xact_replay_timestamp, no
+máximo a cada REPLICA_LAG_CHECK_INTERVAL segundos) e se ela responder;
+caso contrário a leitura cai no primário. Um usuário que acabou de
+escrever também lê do primário durante a janela de tolerância
+(read-your-writes, por processo).
+
+Variáveis de ambiente:
+  DATABASE_REPLICA_URL         – URL da réplica              (padrão: desativado)
+  REPLICA_MAX_LAG_SECONDS      – atraso máximo tolerado      (padrão: 30)
+  REPLICA_LAG_CHECK_INTERVAL   – intervalo entre medições    (padrão: 10)
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "10"))
+
+REPLICA_BIND = "replica"
+
+_lock = threading.Lock()
+_state = {"checked_at": None, "healthy": False, "lag_s": None, "error": None}
+_recent_writers = {}
+
+
+def replica_binds():
+    """Entrada para SQLALCHEMY_BINDS (vazia sem réplica configurada)"""
+    return {REPLICA_BIND: DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+
+
+def read_replica(f):
+    """Marca o endpoint como apto a ler da réplica"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.db_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+def _measure_lag(engine):
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as conn:
+        lag = conn.execute(text(
+            "SELECT CASE WHEN pg_is_in_recovery() "
+            "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+            "ELSE 0 END"
+        )).scalar()
+    return float(lag or 0.0)
+
+
+def _replica_usable(engine):
+    now = time.monotonic()
+    checked_at = _state["checked_at"]
+    if checked_at is None or now - checked_at >= REPLICA_LAG_CHECK_INTERVAL:
+        with _lock:
+            if _state["checked_at"] == checked_at:
+                _state["checked_at"] = now
+                try:
+                    lag = _measure_lag(engine)
+                    _state.update(healthy=lag <= REPLICA_MAX_LAG_SECONDS, lag_s=round(lag, 3), error=None)
+                    if lag > REPLICA_MAX_LAG_SECONDS:
+                        logger.warning("réplica atrasada; leituras no primário", extra={"lag_s": lag})
+                except Exception as e:
+                    _state.update(healthy=False, lag_s=None, error=str(e))
+                    logger.warning("réplica indisponível; leituras no primário: %s", e)
+    return _state["healthy"]
+
+
+def _wrote_recently():
+    user_id = g.get("user_id")
+    if user_id is None:
+        return False
+    wrote_at = _recent_writers.get(user_id)
+    return wrote_at is not None and time.monotonic() - wrote_at < REPLICA_MAX_LAG_SECONDS
+
+
+class RoutingSession(Session):
+    """Sessão que manda SELECTs de endpoints `@read_replica` para a réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+            and has_app_context()
+            and g.get("db_replica")
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                if _replica_usable(engine) and not _wrote_recently():
+                    metrics.incr("db_reads", target="replica")
+                    return engine
+                metrics.incr("db_reads", target="primary_fallback")
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _remember_writer(session, flush_context):
+    # Quem escreveu lê do primário até a réplica alcançar (read-your-writes)
+    if has_app_context() and g.get("user_id") is not None:
+        _recent_writers[g.user_id] = time.monotonic()
+        if len(_recent_writers) > 10000:
+            cutoff = time.monotonic() - REPLICA_MAX_LAG_SECONDS
+            for user_id, wrote_at in list(_recent_writers.items()):
+                if wrote_at < cutoff:
+                    _recent_writers.pop(user_id, None)
+
+
+def replica_status():
+    """Estado da réplica para /api/admin/system-info"""
+    return {
+        "configured": bool(DATABASE_REPLICA_URL),
+        "healthy": _state["healthy"],
+        "lag_s": _state["lag_s"],
+        "max_lag_s": REPLICA_MAX_LAG_SECONDS,
+        "error": _state["error"],
+    }
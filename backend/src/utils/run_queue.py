@@ -0,0 +1,265 @@
+# backend/src/utils/run_queue.py
+"""
+Fila de runs por conversa.
+
+A OpenAI recusa mensagem/run num thread que já tem um run ativo; duas
+mensagens rápidas na mesma conversa viravam uma resposta de erro. Agora
+cada turno espera a vez:
+
+  - ordem (FIFO): a mensagem pendente do assistente (status "pending") de
+    menor id da conversa é a próxima; cada turno espera as anteriores
+  - exclusão: um lock por conversa, compartilhado entre os workers –
+    advisory lock no PostgreSQL (pg_try_advisory_lock numa conexão própria,
+    liberado sozinho se o processo morrer) ou, nos demais bancos, flock num
+    arquivo por conversa (workers do mesmo host)
+  - profundidade: com RUN_QUEUE_MAX_DEPTH turnos pendentes na conversa, o
+    próximo envio é recusado com 429 antes de gravar qualquer coisa
+
+Quem espera na fila segura um worker sync inteiro, e o gunicorn mata o
+worker que passa de `timeout` no mesmo request. Por isso a espera tem
+orçamento (`wait_budget`): espera + run (RUN_MAX_WAIT_SECONDS do
+llm_backends) + o que o request já gastou + RUN_QUEUE_SAFETY_SECONDS ficam
+abaixo de WORKER_TIMEOUT_SECONDS. Sem orçamento com um turno à frente, o
+envio é recusado com 429 na hora em vez de parar o worker esperando.
+
+Pendências mais velhas que RUN_QUEUE_STALE_SECONDS (worker que morreu no
+meio do run) não seguram a fila; o padrão acompanha o timeout do worker,
+já que nenhum request vivo passa dele.
+
+Variáveis de ambiente:
+  WORKER_TIMEOUT_SECONDS   – timeout do worker do gunicorn       (padrão: 120)
+  RUN_QUEUE_ENABLED        – true | false                         (padrão: true)
+  RUN_QUEUE_MAX_DEPTH      – turnos pendentes por conversa         (padrão: 2)
+  RUN_QUEUE_WAIT_SECONDS   – teto da espera pela vez               (padrão: 30)
+  RUN_QUEUE_SAFETY_SECONDS – folga até o timeout do worker         (padrão: 15)
+  RUN_QUEUE_POLL_INTERVAL  – segundos entre tentativas             (padrão: 0.5)
+  RUN_QUEUE_STALE_SECONDS  – pendência considerada abandonada      (padrão: WORKER_TIMEOUT_SECONDS + 10)
+  RUN_QUEUE_LOCK_DIR       – diretório dos locks em arquivo (sem PostgreSQL)
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text, update
+
+from ..models.user import db, Message
+from .logging_config import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: só locks do processo
+    fcntl = None
+
+logger = get_logger(__name__)
+
+WORKER_TIMEOUT_SECONDS = int(os.getenv("WORKER_TIMEOUT_SECONDS", "120"))
+RUN_QUEUE_ENABLED = os.getenv("RUN_QUEUE_ENABLED", "true").lower() == "true"
+RUN_QUEUE_MAX_DEPTH = int(os.getenv("RUN_QUEUE_MAX_DEPTH", "2"))
+RUN_QUEUE_WAIT_SECONDS = float(os.getenv("RUN_QUEUE_WAIT_SECONDS", "30"))
+RUN_QUEUE_SAFETY_SECONDS = float(os.getenv("RUN_QUEUE_SAFETY_SECONDS", "15"))
+RUN_QUEUE_POLL_INTERVAL = float(os.getenv("RUN_QUEUE_POLL_INTERVAL", "0.5"))
+RUN_QUEUE_STALE_SECONDS = int(os.getenv("RUN_QUEUE_STALE_SECONDS", str(WORKER_TIMEOUT_SECONDS + 10)))
+RUN_QUEUE_LOCK_DIR = os.getenv(
+    "RUN_QUEUE_LOCK_DIR", os.path.join(tempfile.gettempdir(), "leilaogpt_run_locks")
+)
+
+# Classe do advisory lock (pg_advisory_lock(int4, int4)): "LG"
+_PG_LOCK_CLASS = 0x4C47
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+# ─── Locks ─────────────────────────────────────────────────
+class _PgAdvisoryLock:
+    """Advisory lock de sessão numa conexão dedicada (independe dos commits do request)"""
+
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+        self._conn = None
+
+    def try_acquire(self):
+        conn = db.engine.connect()
+        try:
+            taken = conn.execute(
+                text("SELECT pg_try_advisory_lock(:cls, :obj)"),
+                {"cls": _PG_LOCK_CLASS, "obj": self.conversation_id},
+            ).scalar()
+        except Exception:
+            conn.close()
+            raise
+        if not taken:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                text("SELECT pg_advisory_unlock(:cls, :obj)"),
+                {"cls": _PG_LOCK_CLASS, "obj": self.conversation_id},
+            )
+            self._conn.commit()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+class _FileLock:
+    """flock num arquivo por conversa: vale entre os workers do mesmo host"""
+
+    def __init__(self, conversation_id):
+        self.path = os.path.join(RUN_QUEUE_LOCK_DIR, f"conversation-{conversation_id}.lock")
+        self._fd = None
+
+    def try_acquire(self):
+        os.makedirs(RUN_QUEUE_LOCK_DIR, exist_ok=True)
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class _ProcessLock:
+    """Fallback sem fcntl: lock só dentro do processo"""
+
+    def __init__(self, conversation_id):
+        with _local_locks_guard:
+            self._lock = _local_locks.setdefault(conversation_id, threading.Lock())
+        self._held = False
+
+    def try_acquire(self):
+        self._held = self._lock.acquire(blocking=False)
+        return self._held
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._lock.release()
+
+
+def _lock_for(conversation_id):
+    if db.engine.dialect.name == "postgresql":
+        return _PgAdvisoryLock(conversation_id)
+    if fcntl is not None:
+        return _FileLock(conversation_id)
+    return _ProcessLock(conversation_id)
+
+
+# ─── Fila ──────────────────────────────────────────────────
+def _pending_filter(conversation_id):
+    cutoff = datetime.utcnow() - timedelta(seconds=RUN_QUEUE_STALE_SECONDS)
+    return (
+        (Message.conversation_id == conversation_id)
+        & (Message.role == "assistant")
+        & (Message.status == "pending")
+        & (Message.timestamp > cutoff)
+    )
+
+
+def _scalar(statement):
+    # Conexão própria: enxerga o que outros workers já gravaram
+    with db.engine.connect() as conn:
+        return conn.execute(statement).scalar()
+
+
+def depth(conversation_id):
+    """Turnos pendentes (ativo + enfileirados) na conversa"""
+    return _scalar(select(func.count(Message.id)).where(_pending_filter(conversation_id))) or 0
+
+
+def wait_budget(run_seconds, elapsed_seconds=0.0):
+    """
+    Segundos que o turno ainda pode esperar na fila sem que o request passe
+    do timeout do worker (espera + run + o já gasto + folga)
+    """
+    budget = WORKER_TIMEOUT_SECONDS - RUN_QUEUE_SAFETY_SECONDS - run_seconds - elapsed_seconds
+    return max(0.0, min(RUN_QUEUE_WAIT_SECONDS, budget))
+
+
+def refusal(conversation_id, wait_seconds):
+    """
+    Motivo para recusar o turno antes de gravar qualquer coisa: "full"
+    (fila cheia), "no_budget" (há turno à frente e não dá tempo de esperar)
+    ou None
+    """
+    if not RUN_QUEUE_ENABLED:
+        return None
+    pending = depth(conversation_id)
+    if pending >= RUN_QUEUE_MAX_DEPTH:
+        return "full"
+    if pending and wait_seconds <= 0:
+        return "no_budget"
+    return None
+
+
+def mark_failed(message_id):
+    """
+    Tira a mensagem pendente da fila numa conexão própria – para quando a
+    sessão do request não conseguiu gravar o resultado
+    """
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(Message)
+            .where(Message.id == message_id, Message.status == "pending")
+            .values(status="failed")
+        )
+
+
+class RunSlot:
+    """
+    Vez de um turno na conversa, identificado pela mensagem pendente do
+    assistente. `try_acquire()` não bloqueia: quem chama decide como esperar
+    (o SSE manda heartbeats entre as tentativas).
+    """
+
+    def __init__(self, conversation_id, message_id):
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self._lock = None
+
+    def position(self):
+        """Turnos pendentes à frente deste"""
+        return _scalar(
+            select(func.count(Message.id)).where(
+                _pending_filter(self.conversation_id), Message.id < self.message_id
+            )
+        ) or 0
+
+    def try_acquire(self):
+        if not RUN_QUEUE_ENABLED or self._lock is not None:
+            return True
+        if self.position():
+            return False
+        lock = _lock_for(self.conversation_id)
+        if not lock.try_acquire():
+            return False
+        self._lock = lock
+        return True
+
+    def release(self):
+        if self._lock is None:
+            return
+        try:
+            self._lock.release()
+        except Exception as e:
+            logger.warning("falha ao liberar lock da conversa: %s", e,
+                           extra={"conversation_id": self.conversation_id})
+        self._lock = None
@@ -0,0 +1,135 @@
+# backend/src/utils/startup.py
+"""
+Relatório de tempo de inicialização do processo.
+
+Com STARTUP_PROFILE=true, um finder em `sys.meta_path` mede o tempo de
+import de cada módulo (tempo próprio, sem contar os imports aninhados) e
+`phase()` mede as etapas do boot em main.py. Ao final, `finish()` registra
+no log o total, as etapas e os módulos mais lentos; o mesmo relatório fica
+disponível em `report()` (exposto em /api/admin/system-info).
+
+Sem a variável, apenas as etapas são cronometradas – custo desprezível.
+
+Variáveis de ambiente:
+  STARTUP_PROFILE      – true | false                         (padrão: false)
+  STARTUP_REPORT_TOP   – quantos módulos listar no relatório  (padrão: 15)
+
+Precisa estar no ambiente do processo (não no .env), pois o finder é
+instalado antes de o .env ser carregado.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+STARTUP_REPORT_TOP = int(os.getenv("STARTUP_REPORT_TOP", "15"))
+
+_started = None
+_finished = None
+_phases = []
+_imports = {}
+_stack = []
+_lock = threading.Lock()
+
+
+class _TimedLoader:
+    """Envolve o loader original medindo exec_module"""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        name = module.__name__
+        start = time.perf_counter()
+        _stack.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += total
+            _imports[name] = (total - children, total)
+
+
+class _TimingFinder:
+    """Primeiro finder de sys.meta_path: delega aos demais e cronometra"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if _finished is not None or threading.current_thread() is not threading.main_thread():
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+_finder = _TimingFinder()
+
+
+def begin():
+    """Marca o início do boot (e instala o finder se STARTUP_PROFILE)"""
+    global _started
+    if _started is not None:
+        return
+    _started = time.perf_counter()
+    if STARTUP_PROFILE:
+        sys.meta_path.insert(0, _finder)
+
+
+@contextmanager
+def phase(name):
+    """Cronometra uma etapa do boot"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def finish(logger):
+    """Encerra a medição e registra o relatório no log"""
+    global _finished
+    with _lock:
+        if _finished is not None:
+            return
+        _finished = time.perf_counter()
+        if _finder in sys.meta_path:
+            sys.meta_path.remove(_finder)
+    data = report()
+    logger.info("inicialização concluída", extra={
+        "startup_ms": data["total_ms"],
+        "phases": data["phases"],
+        "slowest_imports": data.get("slowest_imports"),
+    })
+
+
+def report():
+    """Tempo total, etapas e (com STARTUP_PROFILE) os imports mais lentos"""
+    end = _finished if _finished is not None else time.perf_counter()
+    data = {
+        "total_ms": round((end - (_started or end)) * 1000, 1),
+        "phases": {name: round(seconds * 1000, 1) for name, seconds in _phases},
+        "profile": STARTUP_PROFILE,
+    }
+    if STARTUP_PROFILE:
+        slowest = sorted(_imports.items(), key=lambda item: item[1][0], reverse=True)[:STARTUP_REPORT_TOP]
+        data["imported_modules"] = len(_imports)
+        data["slowest_imports"] = [
+            {"module": name, "self_ms": round(own * 1000, 1), "cumulative_ms": round(total * 1000, 1)}
+            for name, (own, total) in slowest
+        ]
+    return data
@@ -0,0 +1,170 @@
+# backend/src/utils/text_codec.py
+"""
+Compressão transparente de textos grandes guardados no banco.
+
+`CompressedText` é um tipo de coluna (TEXT no banco) usado em
+Message.content. Com MESSAGE_COMPRESSION ligado, valores acima de
+MESSAGE_COMPRESSION_MIN_SIZE bytes são gravados como
+
+    "\\x1b<codec>:" + base64(conteúdo comprimido)
+
+e decodificados automaticamente ao carregar o modelo, então to_dict(), o
+arquivo de mensagens e o restante do código continuam vendo texto puro.
+Valores sem o marcador são lidos como estão, o que permite ligar/desligar
+a opção a qualquer momento; `flask --app src.main recompress-messages`
+regrava as linhas existentes no formato configurado.
+
+Buscas em SQL (LIKE) não enxergam o conteúdo das linhas comprimidas.
+
+Variáveis de ambiente:
+  MESSAGE_COMPRESSION           – off | zlib | zstd                (padrão: off)
+  MESSAGE_COMPRESSION_MIN_SIZE  – bytes mínimos para comprimir     (padrão: 4096)
+  MESSAGE_COMPRESSION_LEVEL     – nível do codec                   (padrão: 6)
+
+zstd requer o pacote `zstandard`; sem ele, a gravação usa zlib.
+"""
+import base64
+import os
+import zlib
+
+from sqlalchemy.types import Text, TypeDecorator
+
+from .logging_config import get_logger
+
+try:
+    import zstandard
+except ImportError:  # opcional
+    zstandard = None
+
+logger = get_logger(__name__)
+
+MESSAGE_COMPRESSION = os.getenv("MESSAGE_COMPRESSION", "off").lower()
+MESSAGE_COMPRESSION_MIN_SIZE = int(os.getenv("MESSAGE_COMPRESSION_MIN_SIZE", "4096"))
+MESSAGE_COMPRESSION_LEVEL = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", "6"))
+
+if MESSAGE_COMPRESSION == "zstd" and zstandard is None:
+    logger.warning("MESSAGE_COMPRESSION=zstd sem o pacote zstandard; usando zlib")
+    MESSAGE_COMPRESSION = "zlib"
+
+MARKER = "\x1b"
+_RAW = "raw"
+
+
+def _compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=MESSAGE_COMPRESSION_LEVEL).compress(data)
+    return zlib.compress(data, MESSAGE_COMPRESSION_LEVEL)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("conteúdo comprimido com zstd, mas o pacote zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"codec desconhecido: {codec}")
+
+
+def encode(text, codec=None):
+    """Texto puro → valor gravado no banco"""
+    if text is None:
+        return None
+    codec = MESSAGE_COMPRESSION if codec is None else codec
+    if codec != "off":
+        data = text.encode("utf-8")
+        if len(data) >= MESSAGE_COMPRESSION_MIN_SIZE:
+            packed = base64.b64encode(_compress(codec, data)).decode("ascii")
+            # Só compensa se o resultado (com base64) ficar menor
+            if len(packed) + len(codec) + 2 < len(data):
+                return f"{MARKER}{codec}:{packed}"
+    if text.startswith(MARKER):
+        # Texto que por acaso começa com o marcador: guarda escapado
+        return f"{MARKER}{_RAW}:{text}"
+    return text
+
+
+def decode(stored):
+    """Valor gravado no banco → texto puro"""
+    if stored is None or not stored.startswith(MARKER):
+        return stored
+    codec, _, body = stored[1:].partition(":")
+    if codec == _RAW:
+        return body
+    return _decompress(codec, base64.b64decode(body)).decode("utf-8")
+
+
+def is_encoded(stored):
+    return stored is not None and stored.startswith(MARKER) and not stored.startswith(f"{MARKER}{_RAW}:")
+
+
+class CompressedText(TypeDecorator):
+    """TEXT com compressão transparente (ver docstring do módulo)"""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+# ────────────────────────────────
+# Migração das linhas existentes
+# ────────────────────────────────
+def recompress_messages(batch_size=500, start_id=0, pause=0.0):
+    """
+    Regrava Message.content no formato configurado, em lotes por id.
+
+    Lê o valor cru da coluna e só atualiza as linhas cuja forma gravada
+    muda (comprimir, descomprimir ou trocar de codec). Pode ser
+    interrompida e retomada com `start_id`. Retorna (lidas, regravadas).
+    """
+    import time
+
+    from sqlalchemy import select, type_coerce, update
+
+    from ..models.user import db, Message
+
+    table = Message.__table__
+    raw_content = type_coerce(table.c.content, Text)
+    scanned = rewritten = 0
+    last_id = start_id
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, raw_content)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id.asc())
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for message_id, stored in rows:
+            text = decode(stored)
+            if encode(text) != stored:
+                # O tipo da coluna aplica encode() ao texto puro
+                db.session.execute(update(table).where(table.c.id == message_id).values(content=text))
+                rewritten += 1
+        db.session.commit()
+        scanned += len(rows)
+        last_id = rows[-1][0]
+        logger.info("lote recomprimido", extra={"scanned": scanned, "rewritten": rewritten, "last_id": last_id})
+        if pause:
+            time.sleep(pause)
+    return scanned, rewritten
+
+
+def register_cli(app):
+    """Comando one-shot: `flask --app src.main recompress-messages`"""
+    import click
+
+    @app.cli.command("recompress-messages")
+    @click.option("--batch-size", type=int, default=500)
+    @click.option("--start-id", type=int, default=0, help="Retoma a partir deste id")
+    @click.option("--pause", type=float, default=0.0, help="Segundos de pausa entre lotes")
+    def recompress_messages_command(batch_size, start_id, pause):
+        """Regrava Message.content conforme MESSAGE_COMPRESSION."""
+        scanned, rewritten = recompress_messages(batch_size, start_id, pause)
+        click.echo(f"lidas={scanned} regravadas={rewritten} codec={MESSAGE_COMPRESSION}")
@@ -0,0 +1,253 @@
+# backend/src/utils/titles.py
+"""
+Títulos automáticos de conversas.
+
+O título deixou de ser gerado dentro do request de envio: na primeira
+mensagem, send_message só enfileira uma tarefa "conversation_title"
+(utils/jobs.py) no mesmo commit, e a resposta do chat não espera por ela.
+A tarefa só altera conversas que ainda estão como "Nova Conversa" – um
+título definido pelo usuário nesse meio-tempo é preservado.
+
+O título por palavras-chave usa um índice (palavra → categoria) e a lista
+de stopwords montados uma vez no import. Com TITLE_LLM=true, a tarefa pede
+um título curto ao modelo e usa o de palavras-chave se a chamada falhar.
+
+Conversas antigas sem título:
+
+    flask --app src.main retitle-conversations [--llm]
+
+Variáveis de ambiente:
+  TITLE_LLM        – gera títulos com o modelo             (padrão: false)
+  TITLE_MODEL      – modelo usado para os títulos          (padrão: gpt-4o-mini)
+  TITLE_MAX_CHARS  – tamanho máximo do título              (padrão: 30)
+"""
+import os
+import re
+
+from ..models.user import db, Conversation, Message
+from . import archive, metrics, tracing
+from .jobs import enqueue, job_handler
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+TITLE_LLM = os.getenv("TITLE_LLM", "false").lower() == "true"
+TITLE_MODEL = os.getenv("TITLE_MODEL", "gpt-4o-mini")
+TITLE_MAX_CHARS = int(os.getenv("TITLE_MAX_CHARS", "30"))
+
+DEFAULT_TITLE = "Nova Conversa"
+
+# Palavras-chave para diferentes tipos de solicitação (a ordem define a prioridade)
+KEYWORDS = {
+    'análise': ['analise', 'analisar', 'análise', 'examinar', 'avaliar'],
+    'resumo': ['resumir', 'resumo', 'sintetizar', 'síntese'],
+    'explicação': ['explicar', 'explique', 'como', 'o que é', 'definir'],
+    'tradução': ['traduzir', 'tradução', 'translate'],
+    'código': ['codigo', 'código', 'programar', 'script', 'função'],
+    'texto': ['escrever', 'redação', 'texto', 'artigo'],
+    'cálculo': ['calcular', 'matemática', 'equação', 'formula'],
+    'email': ['email', 'e-mail', 'carta', 'mensagem'],
+    'relatório': ['relatório', 'relatorio', 'report'],
+    'apresentação': ['apresentação', 'slide', 'powerpoint'],
+    'pesquisa': ['pesquisar', 'buscar', 'encontrar'],
+    'comparação': ['comparar', 'diferença', 'versus', 'vs'],
+    'dúvida': ['dúvida', 'duvida', 'pergunta', 'questão'],
+    'ajuda': ['ajuda', 'socorro', 'help', 'auxilio'],
+    'edital': ['edital', 'licitação', 'concurso'],
+    'contrato': ['contrato', 'acordo', 'termo'],
+    'imagem': ['imagem', 'foto', 'figura', 'picture'],
+    'documento': ['documento', 'pdf', 'arquivo', 'doc'],
+}
+
+STOPWORDS = frozenset([
+    'para', 'com', 'sobre', 'por', 'em', 'de', 'da', 'do', 'das', 'dos',
+    'que', 'qual', 'como', 'quando', 'onde', 'porque', 'este', 'esta',
+    'isso', 'aquilo', 'muito', 'mais', 'menos', 'melhor', 'pior',
+    'favor', 'pode', 'consegue', 'gostaria', 'preciso', 'quero',
+])
+
+# palavra → (prioridade, categoria); a primeira categoria que a contém vence
+_KEYWORD_INDEX = {}
+for _rank, (_category, _words) in enumerate(KEYWORDS.items()):
+    for _word in _words:
+        _KEYWORD_INDEX.setdefault(_word, (_rank, _category))
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def clean_content(content):
+    """Remove as instruções de sistema que o frontend prefixa à pergunta"""
+    if content and "SISTEMA:" in content and "PERGUNTA DO USUÁRIO: " in content:
+        return content.split("PERGUNTA DO USUÁRIO: ", 1)[1]
+    return content
+
+
+def generate_smart_title(content):
+    """Gera título inteligente baseado no conteúdo da mensagem"""
+    if not content:
+        return DEFAULT_TITLE
+
+    words = _PUNCTUATION.sub('', content.lower()).split()
+
+    # Identifica o tipo de solicitação
+    matches = [_KEYWORD_INDEX[w] for w in words if w in _KEYWORD_INDEX]
+    request_type = min(matches)[1] if matches else None
+
+    # Identifica substantivos importantes (palavras com mais de 3 letras)
+    important_words = [w for w in words if len(w) > 3 and w not in STOPWORDS]
+
+    if request_type and important_words:
+        # Ex: "Análise Edital", "Resumo Documento"
+        title = f"{request_type.title()} {important_words[0].title()}"
+    elif request_type:
+        title = request_type.title()
+    elif important_words:
+        title = " ".join(important_words[:2]).title()
+    else:
+        # Fallback: primeiras palavras
+        title = " ".join(words[:3]).title()
+
+    title = title[:TITLE_MAX_CHARS].strip()
+    return title if title else DEFAULT_TITLE
+
+
+def llm_title(content):
+    """Título curto gerado pelo modelo; None se a chamada falhar"""
+    from .openai_client import get_openai_client
+
+    try:
+        with tracing.span("openai.chat.completions.create", tracing.KIND_CLIENT, model=TITLE_MODEL):
+            response = get_openai_client().chat.completions.create(
+                model=TITLE_MODEL,
+                messages=[
+                    {"role": "system", "content": (
+                        "Crie um título curto (até 5 palavras, em português, sem aspas "
+                        "nem pontuação final) para uma conversa que começa com a mensagem do usuário."
+                    )},
+                    {"role": "user", "content": content[:2000]},
+                ],
+                max_tokens=20,
+                temperature=0.2,
+            )
+        title = (response.choices[0].message.content or "").strip().strip('"\'').strip()
+    except Exception as e:
+        logger.warning("falha ao gerar título com o modelo: %s", e)
+        metrics.incr("conversation_title", source="llm_error")
+        return None
+    return title[:TITLE_MAX_CHARS].strip() or None
+
+
+def title_for(content, use_llm=None):
+    content = clean_content(content)
+    use_llm = TITLE_LLM if use_llm is None else use_llm
+    if use_llm and content:
+        title = llm_title(content)
+        if title:
+            metrics.incr("conversation_title", source="llm")
+            return title
+    metrics.incr("conversation_title", source="keywords")
+    return generate_smart_title(content)
+
+
+def needs_title(conversation):
+    return not conversation.title or conversation.title == DEFAULT_TITLE
+
+
+def _first_user_message(conversation):
+    if conversation.archive is not None:
+        archived = next((m for m in archive.archived_messages(conversation) if m.role == "user"), None)
+        if archived is not None:
+            return archived
+    return (
+        Message.query.filter_by(conversation_id=conversation.id, role="user")
+        .order_by(Message.id.asc())
+        .first()
+    )
+
+
+# ────────────────────────────────
+# Tarefa em segundo plano
+# ────────────────────────────────
+def enqueue_title(conversation_id):
+    """
+    Agenda o título da conversa (na sessão atual – o commit é do chamador).
+    O traceparent do request vai junto: o span da tarefa entra no mesmo trace.
+    """
+    payload = {"conversation_id": conversation_id}
+    parent = tracing.traceparent()
+    if parent:
+        payload["traceparent"] = parent
+    enqueue("conversation_title", payload)
+
+
+@job_handler("conversation_title")
+def generate_conversation_title(payload):
+    with tracing.span("title.generate", parent=payload.get("traceparent") or None,
+                      conversation_id=payload["conversation_id"]) as span:
+        conversation = db.session.get(Conversation, payload["conversation_id"])
+        if conversation is None or not needs_title(conversation):
+            span.set_attribute("skipped", True)
+            return
+        message = _first_user_message(conversation)
+        if message is None:
+            span.set_attribute("skipped", True)
+            return
+        title = title_for(message.content)
+        # UPDATE condicional: não sobrescreve um título dado pelo usuário enquanto a tarefa rodava
+        Conversation.query.filter(
+            Conversation.id == conversation.id,
+            (Conversation.title.is_(None)) | (Conversation.title == DEFAULT_TITLE),
+        ).update({"title": title}, synchronize_session=False)
+    logger.debug("título gerado automaticamente", extra={"conversation_id": conversation.id, "title": title})
+
+
+# ────────────────────────────────
+# Retitulação em lote
+# ────────────────────────────────
+def retitle_conversations(batch_size=200, limit=None, use_llm=False):
+    """
+    Gera títulos para conversas ainda sem título, em lotes por id com um
+    commit por lote. Retorna (lidas, retituladas).
+    """
+    scanned = retitled = 0
+    last_id = 0
+    while limit is None or scanned < limit:
+        conversations = (
+            Conversation.query.filter(
+                Conversation.id > last_id,
+                (Conversation.title.is_(None)) | (Conversation.title == DEFAULT_TITLE),
+            )
+            .order_by(Conversation.id.asc())
+            .limit(batch_size if limit is None else min(batch_size, limit - scanned))
+            .all()
+        )
+        if not conversations:
+            break
+        for conversation in conversations:
+            message = _first_user_message(conversation)
+            if message is None:
+                continue
+            title = title_for(message.content, use_llm=use_llm)
+            if title != DEFAULT_TITLE:
+                conversation.title = title
+                retitled += 1
+        db.session.commit()
+        scanned += len(conversations)
+        last_id = conversations[-1].id
+        db.session.expunge_all()
+        logger.info("lote retitulado", extra={"scanned": scanned, "retitled": retitled, "last_id": last_id})
+    return scanned, retitled
+
+
+def register_cli(app):
+    """Comando one-shot: `flask --app src.main retitle-conversations`"""
+    import click
+
+    @app.cli.command("retitle-conversations")
+    @click.option("--batch-size", type=int, default=200)
+    @click.option("--limit", type=int, default=None, help="Máximo de conversas nesta execução")
+    @click.option("--llm", is_flag=True, help="Usa o modelo (TITLE_MODEL) para os títulos")
+    def retitle_conversations_command(batch_size, limit, llm):
+        """Gera títulos para as conversas "Nova Conversa" existentes."""
+        scanned, retitled = retitle_conversations(batch_size, limit, use_llm=llm)
+        click.echo(f"lidas={scanned} retituladas={retitled}")
@@ -0,0 +1,475 @@
+# backend/src/utils/tracing.py
+"""
+Tracing por fase do pipeline do chat (spans compatíveis com OpenTelemetry).
+
+Quando um chat leva 40 s, o trace mostra onde o tempo foi: cada request
+vira um span raiz ("POST /api/chat/conversations/<int:conversation_id>/messages")
+com spans filhos para token_required, cada comando SQL (db.query), cada
+commit do send_message, threads.create / messages.create / runs.create,
+cada consulta do polling (runs.retrieve), messages.list, o upload de
+arquivos e a geração de título (esta na thread de tarefas, no mesmo trace
+do request que a enfileirou).
+
+Sem dependências: os ids seguem o W3C Trace Context (o cabeçalho
+`traceparent` de entrada é respeitado, inclusive a decisão de amostragem) e
+os spans são exportados em OTLP/JSON, em lotes, por uma thread por processo:
+
+  file – uma linha OTLP/JSON por lote em TRACING_FILE (o receiver
+         `otlpjsonfile` do OpenTelemetry Collector lê esse formato)
+  otlp – POST em TRACING_OTLP_ENDPOINT (OTLP/HTTP com JSON; ex.: um
+         Collector ou Jaeger local na porta 4318)
+
+Correlação com os logs: todo registro de log do request carrega `trace_id`
+e o span raiz carrega `request.id`; a resposta devolve X-Trace-Id. Requests
+fora da amostra também recebem trace_id (e o propagam), mas não gravam
+spans.
+
+Variáveis de ambiente:
+  TRACING_ENABLED        – true | false                           (padrão: false)
+  TRACING_EXPORTER       – file | otlp                            (padrão: file)
+  TRACING_FILE           – arquivo do exportador file             (padrão: traces.jsonl)
+  TRACING_OTLP_ENDPOINT  – URL OTLP/HTTP de traces (padrão: OTEL_EXPORTER_OTLP_ENDPOINT
+                           + /v1/traces, ou http://localhost:4318/v1/traces)
+  TRACING_SAMPLE_RATE    – fração de traces gravados, 0 a 1       (padrão: 0.1)
+  TRACING_SERVICE_NAME   – service.name do recurso                (padrão: leilaogpt-backend)
+  TRACING_DB_STATEMENT_CHARS – tamanho máximo do SQL no span      (padrão: 300)
+  TRACING_QUEUE_SIZE     – spans aguardando exportação; excedentes são descartados
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import g, has_request_context, request
+
+from . import metrics
+from .logging_config import bind_log_context, get_logger
+
+logger = get_logger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT") or (
+    os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/") + "/v1/traces"
+)
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "leilaogpt-backend")
+TRACING_DB_STATEMENT_CHARS = int(os.getenv("TRACING_DB_STATEMENT_CHARS", "300"))
+TRACING_QUEUE_SIZE = int(os.getenv("TRACING_QUEUE_SIZE", "10000"))
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+_BATCH_SIZE = 256
+_FLUSH_INTERVAL = 2.0
+
+# SpanKind do OTLP
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+# Status do OTLP
+_STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current = ContextVar("tracing_span", default=None)
+_queue = None
+_exporter_thread = None
+_dropped = 0
+
+
+# ────────────────────────────────
+# Spans
+# ────────────────────────────────
+class Span:
+    """Span em andamento; `recording=False` só propaga o contexto (fora da amostra)"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "recording",
+                 "attributes", "start_ns", "_start_perf", "end_ns", "error", "_previous")
+
+    def __init__(self, name, trace_id, parent_id=None, kind=KIND_INTERNAL, recording=True, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.recording = recording
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None} if recording else {}
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.end_ns = None
+        self.error = None
+        self._previous = None
+
+    def set_attribute(self, key, value):
+        if self.recording and value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error):
+        if self.recording:
+            self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.recording else '00'}"
+
+    def end(self):
+        """Encerra o span (chamadas repetidas são ignoradas) e o envia ao exportador"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start_perf)
+        if self.recording:
+            _export(self)
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns if self.end_ns is not None else self.start_ns + (time.perf_counter_ns() - self._start_perf)
+        return (end - self.start_ns) / 1e6
+
+
+def _parse_traceparent(value):
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def current_span():
+    """Span ativo: o mais interno aberto com `span()`, senão o raiz do request"""
+    active = _current.get()
+    if active is None and has_request_context():
+        active = g.get("trace_span")
+    return active
+
+
+def current_trace_id():
+    active = current_span()
+    return active.trace_id if active is not None else None
+
+
+def traceparent():
+    """Cabeçalho W3C do span ativo (para propagar a tarefas e chamadas externas)"""
+    active = current_span()
+    return active.traceparent() if active is not None else None
+
+
+def start_span(name, kind=KIND_INTERNAL, parent=None, attributes=None):
+    """
+    Cria um span filho do ativo (ou de `parent`: Span ou traceparent); sem
+    pai, inicia um trace novo e sorteia a amostragem. Não o torna ativo.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    if parent is None:
+        parent = current_span()
+    if isinstance(parent, Span):
+        return Span(name, parent.trace_id, parent.span_id, kind, parent.recording, attributes)
+    remote = _parse_traceparent(parent) if isinstance(parent, str) else None
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+        return Span(name, trace_id, parent_id, kind, sampled, attributes)
+    sampled = random.random() < TRACING_SAMPLE_RATE
+    return Span(name, os.urandom(16).hex(), None, kind, sampled, attributes)
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, parent=None, **attributes):
+    """
+    Span ativo durante o bloco; exceções ficam registradas como erro.
+    Com o tracing desligado não faz nada (o custo é uma checagem).
+
+        with tracing.span("openai.runs.create", thread_id=...) as sp:
+            run = client.beta.threads.runs.create(...)
+            sp.set_attribute("openai.run_id", run.id)
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP
+        return
+    current = start_span(name, kind, parent, attributes)
+    current._previous = _current.get()
+    _current.set(current)
+    try:
+        yield current
+    except GeneratorExit:
+        current.set_attribute("cancelled", True)
+        raise
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        # Restaura o pai em vez de usar o token do ContextVar: o bloco pode
+        # atravessar yields de um gerador (streaming) e ser fechado fora de ordem
+        if _current.get() is current:
+            _current.set(current._previous)
+        current.end()
+
+
+def traced(name=None, **attributes):
+    """Decorator: executa a função dentro de um span (nome padrão: módulo.função)"""
+    def decorator(f):
+        span_name = name or f"{f.__module__.rsplit('.', 1)[-1]}.{f.__name__}"
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return f(*args, **kwargs)
+            with span(span_name, **attributes):
+                return f(*args, **kwargs)
+
+        return decorated
+    return decorator
+
+
+class _NoopSpan:
+    trace_id = span_id = None
+    recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def end(self):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+# ────────────────────────────────
+# Exportação (OTLP/JSON)
+# ────────────────────────────────
+def _attribute(key, value):
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(s):
+    data = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": s.kind,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+    }
+    if s.parent_id:
+        data["parentSpanId"] = s.parent_id
+    if s.error:
+        data["status"] = {"code": _STATUS_ERROR, "message": s.error[:500]}
+    return data
+
+
+def _otlp_payload(spans):
+    resource = {
+        "service.name": TRACING_SERVICE_NAME,
+        "host.name": socket.gethostname(),
+        "process.pid": os.getpid(),
+    }
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute(k, v) for k, v in resource.items()]},
+        "scopeSpans": [{"scope": {"name": "leilaogpt"}, "spans": [_otlp_span(s) for s in spans]}],
+    }]}
+
+
+def _write_batch(spans):
+    body = json.dumps(_otlp_payload(spans), ensure_ascii=False, separators=(",", ":"))
+    if TRACING_EXPORTER == "otlp":
+        req = urllib.request.Request(
+            TRACING_OTLP_ENDPOINT, data=body.encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            resp.read()
+    else:
+        with open(TRACING_FILE, "a", encoding="utf-8") as fd:
+            fd.write(body + "\n")
+
+
+def _export(s):
+    global _dropped
+    if _queue is None:
+        return
+    try:
+        _queue.put_nowait(s)
+    except queue.Full:
+        _dropped += 1
+
+
+def _drain(block_until):
+    batch = []
+    while len(batch) < _BATCH_SIZE:
+        timeout = block_until - time.monotonic()
+        try:
+            item = _queue.get(timeout=timeout) if timeout > 0 else _queue.get_nowait()
+        except queue.Empty:
+            break
+        batch.append(item)
+    return batch
+
+
+def _export_loop():
+    while True:
+        batch = _drain(time.monotonic() + _FLUSH_INTERVAL)
+        if batch:
+            try:
+                _write_batch(batch)
+                metrics.incr("trace_spans_exported", len(batch))
+            except Exception as e:
+                metrics.incr("trace_export_errors")
+                logger.warning("falha ao exportar spans: %s", e, extra={"spans": len(batch)})
+
+
+def _start_exporter():
+    """(Re)cria fila e thread de exportação – usado no boot e após fork"""
+    global _queue, _exporter_thread
+    _queue = queue.Queue(maxsize=TRACING_QUEUE_SIZE)
+    _exporter_thread = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+    _exporter_thread.start()
+
+
+def flush():
+    """Exporta o que estiver na fila (saída do processo e comandos CLI)"""
+    if _queue is None:
+        return
+    spans = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            break
+        spans.append(item)
+    for start in range(0, len(spans), _BATCH_SIZE):
+        try:
+            _write_batch(spans[start:start + _BATCH_SIZE])
+        except Exception as e:
+            logger.warning("falha ao exportar spans: %s", e)
+
+
+def stats():
+    return {
+        "enabled": TRACING_ENABLED,
+        "exporter": TRACING_EXPORTER,
+        "sample_rate": TRACING_SAMPLE_RATE,
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "dropped": _dropped,
+    }
+
+
+# ────────────────────────────────
+# Banco de dados
+# ────────────────────────────────
+def _install_db_hooks():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_db_span(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span()
+        if parent is None or not parent.recording:
+            return  # SQL fora de um trace amostrado não gera span
+        context._trace_span = start_span("db.query", KIND_CLIENT, parent, {
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:TRACING_DB_STATEMENT_CHARS],
+            "db.executemany": executemany or None,
+        })
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _end_db_span(conn, cursor, statement, parameters, context, executemany):
+        db_span = getattr(context, "_trace_span", None)
+        if db_span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                db_span.set_attribute("db.rowcount", cursor.rowcount)
+            db_span.end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _fail_db_span(exception_context):
+        db_span = getattr(exception_context.execution_context, "_trace_span", None)
+        if db_span is not None:
+            db_span.set_error(exception_context.original_exception)
+            db_span.end()
+
+
+# ────────────────────────────────
+# Requests
+# ────────────────────────────────
+def _register_request_hooks(app):
+    @app.before_request
+    def _start_request_span():
+        # Nada de span ativo "vazando" de um request anterior na mesma thread
+        _current.set(None)
+        root = start_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            KIND_SERVER,
+            parent=request.headers.get("traceparent", ""),
+            attributes={
+                "http.method": request.method,
+                "http.target": request.path,
+                "request.id": g.get("request_id"),
+            },
+        )
+        g.trace_span = root
+        bind_log_context(trace_id=root.trace_id)
+
+    @app.after_request
+    def _finish_request_span(response):
+        root = g.get("trace_span")
+        if root is None:
+            return response
+        root.set_attribute("http.status_code", response.status_code)
+        root.set_attribute("user.id", g.get("user_id"))
+        root.set_attribute("conversation.id", g.get("conversation_id"))
+        if response.status_code >= 500:
+            root.set_error(f"HTTP {response.status_code}")
+        if response.is_streamed:
+            # SSE: o request só termina quando o stream fecha
+            root.set_attribute("http.streamed", True)
+            g.trace_deferred = True
+            response.call_on_close(root.end)
+        response.headers[TRACE_ID_HEADER] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        root = g.get("trace_span")
+        if root is None or g.get("trace_deferred"):
+            return
+        if error is not None:
+            root.set_error(error)
+        root.end()
+        _current.set(None)
+
+
+def init_tracing(app):
+    """Liga o tracing (TRACING_ENABLED): hooks de request, SQL e exportador"""
+    if not TRACING_ENABLED:
+        return
+    _install_db_hooks()
+    _register_request_hooks(app)
+    _start_exporter()
+    atexit.register(flush)
+    # Threads não sobrevivem ao fork do gunicorn (preload_app): recria no filho
+    os.register_at_fork(after_in_child=_start_exporter)
+    logger.info("tracing ligado", extra={
+        "exporter": TRACING_EXPORTER, "sample_rate": TRACING_SAMPLE_RATE,
+        "target": TRACING_OTLP_ENDPOINT if TRACING_EXPORTER == "otlp" else TRACING_FILE,
+    })
@@ -0,0 +1,306 @@
+# backend/src/utils/usage.py
+"""
+Contabilidade de tokens e latência por mensagem, usuário e dia.
+
+Cada resposta do assistente grava na própria Message o modelo, os tokens
+de prompt/resposta, o tempo de fila (fila da conversa + fila do run na
+OpenAI), o tempo de execução do run e o tempo total do request. No mesmo
+commit, a linha de `usage_daily` do (dia, usuário, modelo, tipo de
+documento) é incrementada – os relatórios não varrem a tabela de mensagens.
+
+    GET /api/admin/usage?from=2024-01-01&to=2024-01-31&group_by=user,document_type
+    GET /api/admin/usage.csv?...   (mesmos filtros, em CSV)
+
+`flask --app src.main rebuild-usage --since 2024-01-01` recalcula as linhas
+a partir das mensagens (ex.: após corrigir dados), lendo a tabela quente e
+o arquivo (utils/archive.py). Só são substituídos os (dia, usuário) que
+ainda têm mensagens; o consumo de conversas excluídas sobrevive nos dias em
+que o usuário não tem outras mensagens, mas some dos demais – rodar só
+sobre períodos em que isso é aceitável.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from ..models.user import db, ArchivedConversation, Conversation, Message, UploadedFile, UsageDaily, User
+from . import archive, metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+GROUP_BY = ("day", "user", "model", "document_type")
+
+_SUM_COLUMNS = (
+    "messages", "cache_hits", "failed", "prompt_tokens", "completion_tokens",
+    "queue_ms", "run_ms", "total_ms",
+)
+
+_DOCUMENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/msword": "office",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "office",
+    "application/vnd.ms-excel": "office",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "office",
+    "text/plain": "text",
+    "text/csv": "text",
+    "text/markdown": "text",
+}
+
+
+def _kind(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type.startswith("image/"):
+        return "image"
+    return _DOCUMENT_TYPES.get(content_type, "other")
+
+
+def document_type_for(file_ids):
+    """Tipo dos anexos do turno (None sem anexos; "mixed" se houver tipos diferentes)"""
+    if not file_ids:
+        return None
+    kinds = {
+        _kind(content_type)
+        for (content_type,) in db.session.query(UploadedFile.content_type).filter(
+            UploadedFile.file_id.in_(file_ids)
+        )
+    } or {"other"}
+    return kinds.pop() if len(kinds) == 1 else "mixed"
+
+
+def _ms(value):
+    return int(round(value)) if value is not None else None
+
+
+# ────────────────────────────────
+# Registro
+# ────────────────────────────────
+def record(message, user_id, reply=None, queue_ms=None, total_ms=None):
+    """
+    Grava consumo/latência na mensagem do assistente e incrementa o
+    agregado diário (na sessão atual – o commit é do chamador).
+    """
+    usage = (reply.usage if reply else None) or {}
+    message.model = reply.model if reply else None
+    message.prompt_tokens = usage.get("prompt_tokens")
+    message.completion_tokens = usage.get("completion_tokens")
+    message.queue_ms = _ms((queue_ms or 0) + ((reply.queue_ms or 0) if reply else 0))
+    message.run_ms = _ms(reply.run_ms) if reply else None
+    message.total_ms = _ms(total_ms)
+
+    _increment(
+        day=(message.timestamp or datetime.utcnow()).date(),
+        user_id=user_id,
+        model=message.model or "",
+        document_type=message.document_type or "none",
+        values={
+            "messages": 1,
+            "cache_hits": 1 if message.cache_hit else 0,
+            "failed": 1 if message.status in ("failed", "cancelled") else 0,
+            "prompt_tokens": message.prompt_tokens or 0,
+            "completion_tokens": message.completion_tokens or 0,
+            "queue_ms": message.queue_ms or 0,
+            "run_ms": message.run_ms or 0,
+            "total_ms": message.total_ms or 0,
+        },
+    )
+    if message.total_ms is not None:
+        metrics.observe("turn_total_ms", message.total_ms, model=message.model or "cache")
+
+
+def _increment(day, user_id, model, document_type, values):
+    """UPDATE col = col + valor; sem linha, INSERT (savepoint cobre a corrida entre workers)"""
+    key = {"day": day, "user_id": user_id, "model": model, "document_type": document_type}
+    total_ms = values.get("total_ms", 0)
+    changes = {getattr(UsageDaily, col): getattr(UsageDaily, col) + value for col, value in values.items()}
+    changes[UsageDaily.max_total_ms] = case(
+        (UsageDaily.max_total_ms < total_ms, total_ms), else_=UsageDaily.max_total_ms
+    )
+    changes[UsageDaily.updated_at] = datetime.utcnow()
+
+    for _ in range(2):
+        if UsageDaily.query.filter_by(**key).update(changes, synchronize_session=False):
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(UsageDaily(**key, **values, max_total_ms=total_ms))
+            return
+        except IntegrityError:
+            continue  # outro worker inseriu a linha: tenta o UPDATE de novo
+    logger.warning("não foi possível registrar o consumo diário", extra=key)
+
+
+# ────────────────────────────────
+# Relatórios
+# ────────────────────────────────
+def parse_period(start, end, default_days=30):
+    """Datas ISO (AAAA-MM-DD); padrão: últimos `default_days` dias. ValueError se inválidas"""
+    end = date.fromisoformat(end) if end else datetime.utcnow().date()
+    start = date.fromisoformat(start) if start else end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError("período inválido")
+    return start, end
+
+
+def report(start, end, group_by=("day", "user"), user_id=None):
+    """Linhas agregadas de usage_daily no período, agrupadas por `group_by`"""
+    dimensions = {
+        "day": UsageDaily.day,
+        "user": UsageDaily.user_id,
+        "model": UsageDaily.model,
+        "document_type": UsageDaily.document_type,
+    }
+    group_by = [g for g in GROUP_BY if g in group_by] or ["day"]
+    columns = [dimensions[g].label(g) for g in group_by]
+    sums = [func.sum(getattr(UsageDaily, col)).label(col) for col in _SUM_COLUMNS]
+    query = (
+        db.session.query(*columns, *sums, func.max(UsageDaily.max_total_ms).label("max_total_ms"))
+        .filter(UsageDaily.day >= start, UsageDaily.day <= end)
+        .group_by(*[dimensions[g] for g in group_by])
+        .order_by(*[dimensions[g] for g in group_by])
+    )
+    if user_id is not None:
+        query = query.filter(UsageDaily.user_id == user_id)
+
+    rows = [dict(row._mapping) for row in query]
+    usernames = {}
+    if "user" in group_by and rows:
+        usernames = dict(
+            db.session.query(User.id, User.username).filter(User.id.in_({r["user"] for r in rows}))
+        )
+    for row in rows:
+        for col in _SUM_COLUMNS:
+            row[col] = int(row[col] or 0)
+        if "day" in row:
+            row["day"] = row["day"].isoformat()
+        if "user" in row:
+            row["username"] = usernames.get(row["user"])
+        answered = row["messages"] - row["cache_hits"]
+        row["total_tokens"] = row["prompt_tokens"] + row["completion_tokens"]
+        row["avg_total_ms"] = round(row["total_ms"] / row["messages"]) if row["messages"] else None
+        row["avg_run_ms"] = round(row["run_ms"] / answered) if answered > 0 else None
+        row["avg_queue_ms"] = round(row["queue_ms"] / answered) if answered > 0 else None
+    return rows
+
+
+def to_csv(rows):
+    import csv
+    import io
+
+    buffer = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return buffer.getvalue()
+
+
+# ────────────────────────────────
+# Recalculo
+# ────────────────────────────────
+def _hot_usage(since):
+    """Agregado (dia, usuário, modelo, tipo) das mensagens na tabela quente"""
+    day = func.date(Message.timestamp)
+    rows = (
+        db.session.query(
+            day.label("day"),
+            Conversation.user_id,
+            func.coalesce(Message.model, "").label("model"),
+            func.coalesce(Message.document_type, "none").label("document_type"),
+            func.count(Message.id),
+            func.sum(case((Message.cache_hit.is_(True), 1), else_=0)),
+            func.sum(case((Message.status.in_(("failed", "cancelled")), 1), else_=0)),
+            func.coalesce(func.sum(Message.prompt_tokens), 0),
+            func.coalesce(func.sum(Message.completion_tokens), 0),
+            func.coalesce(func.sum(Message.queue_ms), 0),
+            func.coalesce(func.sum(Message.run_ms), 0),
+            func.coalesce(func.sum(Message.total_ms), 0),
+            func.coalesce(func.max(Message.total_ms), 0),
+        )
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(Message.role == "assistant", Message.timestamp >= datetime.combine(since, datetime.min.time()))
+        .filter(Message.status.is_(None) | (Message.status != "pending"))
+        .group_by(day, Conversation.user_id, "model", "document_type")
+        .all()
+    )
+    totals = {}
+    for row in rows:
+        row_day = row[0] if isinstance(row[0], date) else date.fromisoformat(str(row[0]))
+        sums = [int(v or 0) for v in row[4:12]]
+        totals[(row_day, row[1], row[2], row[3])] = sums + [int(row[12] or 0)]
+    return totals
+
+
+def _add_archived_usage(totals, since):
+    """Soma as mensagens arquivadas desde `since` ao agregado"""
+    start = datetime.combine(since, datetime.min.time())
+    # Arquivadas antes de `since` só têm mensagens anteriores a ele
+    conversations = (
+        Conversation.query.join(ArchivedConversation)
+        .filter(ArchivedConversation.archived_at >= start)
+        .all()
+    )
+    for conversation in conversations:
+        for message in archive.archived_messages(conversation):
+            if message.role != "assistant" or message.status == "pending" or message.timestamp is None:
+                continue
+            if message.timestamp < start:
+                continue
+            key = (
+                message.timestamp.date(), conversation.user_id,
+                message.model or "", message.document_type or "none",
+            )
+            sums = totals.setdefault(key, [0] * (len(_SUM_COLUMNS) + 1))
+            values = (
+                1,
+                1 if message.cache_hit else 0,
+                1 if message.status in ("failed", "cancelled") else 0,
+                message.prompt_tokens or 0,
+                message.completion_tokens or 0,
+                message.queue_ms or 0,
+                message.run_ms or 0,
+                message.total_ms or 0,
+            )
+            for i, value in enumerate(values):
+                sums[i] += int(value)
+            sums[-1] = max(sums[-1], int(message.total_ms or 0))
+
+
+def rebuild_usage(since):
+    """
+    Recalcula usage_daily a partir de `since` com as mensagens do
+    assistente (tabela quente + arquivo). Só os (dia, usuário) com
+    mensagens são substituídos: o consumo já contado de conversas
+    excluídas continua nos outros. Retorna o número de linhas gravadas.
+    """
+    totals = _hot_usage(since)
+    _add_archived_usage(totals, since)
+
+    days_by_user = {}
+    for row_day, user_id, _, _ in totals:
+        days_by_user.setdefault(user_id, set()).add(row_day)
+    for user_id, days in days_by_user.items():
+        UsageDaily.query.filter(
+            UsageDaily.user_id == user_id, UsageDaily.day.in_(days)
+        ).delete(synchronize_session=False)
+    for (row_day, user_id, model, document_type), sums in totals.items():
+        db.session.add(UsageDaily(
+            day=row_day, user_id=user_id, model=model, document_type=document_type,
+            **dict(zip(_SUM_COLUMNS, sums)),
+            max_total_ms=sums[-1],
+        ))
+    db.session.commit()
+    logger.info("consumo diário recalculado", extra={"since": since.isoformat(), "rows": len(totals)})
+    return len(totals)
+
+
+def register_cli(app):
+    """Comando one-shot: `flask --app src.main rebuild-usage`"""
+    import click
+
+    @app.cli.command("rebuild-usage")
+    @click.option("--since", default=None, help="Data inicial AAAA-MM-DD (padrão: últimos 30 dias)")
+    def rebuild_usage_command(since):
+        """Recalcula usage_daily a partir das mensagens."""
+        start, _ = parse_period(since, None)
+        click.echo(f"linhas={rebuild_usage(start)} desde={start.isoformat()}")
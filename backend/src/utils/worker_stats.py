@@ -0,0 +1,309 @@
+# backend/src/utils/worker_stats.py
+"""
+Estatísticas de runtime por worker do gunicorn, agregadas no admin.
+
+`psutil` no system-info só mostra o host e o worker que atendeu; com
+`max_requests = 1000` mascarando o crescimento de memória não dava para
+ver qual worker estava com problema. Agora cada worker publica, a cada
+WORKER_STATS_INTERVAL segundos, um arquivo JSON próprio
+(`worker-<pid>.json` em WORKER_STATS_DIR, gravado de forma atômica) com:
+
+  - RSS atual e crescimento desde o primeiro request do worker
+  - conexões abertas / em uso nos pools do SQLAlchemy
+  - requests em andamento e runs (turnos do chat) em andamento
+  - requests atendidos e quantos faltam para o restart por max_requests
+  - coletas do GC por geração, objetos não coletáveis e threads
+
+GET /api/admin/system-info lê todos os arquivos ("workers"). Arquivos de
+processos que já morreram (ex.: reciclados por max_requests) são
+removidos na leitura; um worker vivo que parou de publicar há mais de
+WORKER_STATS_STALE_SECONDS aparece com `stale: true` – sinal de worker
+travado. O diretório é local: vale para os workers do mesmo host.
+
+A thread de publicação sobe no primeiro request de cada worker (com
+preload_app, threads criadas no master não sobrevivem ao fork).
+
+Variáveis de ambiente:
+  WORKER_STATS_ENABLED        – true | false                     (padrão: true)
+  WORKER_STATS_DIR            – diretório dos arquivos por worker
+  WORKER_STATS_INTERVAL       – segundos entre publicações       (padrão: 5)
+  WORKER_STATS_STALE_SECONDS  – publicação considerada atrasada  (padrão: 30)
+"""
+import atexit
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import g
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+WORKER_STATS_ENABLED = os.getenv("WORKER_STATS_ENABLED", "true").lower() == "true"
+WORKER_STATS_DIR = os.getenv(
+    "WORKER_STATS_DIR", os.path.join(tempfile.gettempdir(), "leilaogpt_workers")
+)
+WORKER_STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", "5"))
+WORKER_STATS_STALE_SECONDS = float(os.getenv("WORKER_STATS_STALE_SECONDS", "30"))
+
+_lock = threading.Lock()
+_requests_in_flight = 0
+_runs_in_flight = 0
+_requests_served = 0
+_max_requests = None
+_first_rss = None
+_started_at = time.time()
+_publisher_pid = None
+
+
+# ────────────────────────────────
+# Contadores do processo
+# ────────────────────────────────
+def _request_started():
+    global _requests_in_flight, _requests_served
+    with _lock:
+        _requests_in_flight += 1
+        _requests_served += 1
+
+
+def _request_finished():
+    global _requests_in_flight
+    with _lock:
+        _requests_in_flight -= 1
+
+
+@contextmanager
+def run_in_flight():
+    """Marca um turno do chat em andamento neste worker"""
+    global _runs_in_flight
+    with _lock:
+        _runs_in_flight += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _runs_in_flight -= 1
+
+
+def set_max_requests(max_requests):
+    """Limite do worker (max_requests + jitter), informado pelo post_fork do gunicorn"""
+    global _max_requests, _started_at, _requests_served, _first_rss
+    # max_requests = 0 no gunicorn vira sys.maxsize (sem restart)
+    _max_requests = max_requests if max_requests and max_requests < sys.maxsize else None
+    # Relógio e contadores herdados do master (preload_app): recomeçam no worker
+    _started_at = time.time()
+    _requests_served = 0
+    _first_rss = None
+
+
+def _rss_bytes():
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as fd:
+                return int(fd.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return None
+
+
+def _db_connections(app):
+    from ..models.user import db
+    from .db_pool import pool_stats
+
+    opened = in_use = 0
+    for entry in pool_stats(app, db).values():
+        in_use += entry.get("checked_out", 0)
+        opened += entry.get("checked_out", 0) + entry.get("checked_in", 0)
+    return opened, in_use
+
+
+def collect(app):
+    """Retrato atual deste worker"""
+    global _first_rss
+    rss = _rss_bytes()
+    if _first_rss is None:
+        _first_rss = rss
+    try:
+        db_open, db_in_use = _db_connections(app)
+    except Exception as e:
+        logger.debug("pool indisponível para estatísticas: %s", e)
+        db_open = db_in_use = None
+    gc_stats = gc.get_stats()
+    with _lock:
+        served = _requests_served
+        data = {
+            "pid": os.getpid(),
+            "ppid": os.getppid(),
+            "started_at": datetime.fromtimestamp(_started_at, tz=timezone.utc).isoformat(),
+            "uptime_s": round(time.time() - _started_at, 1),
+            "updated_at": time.time(),
+            "rss_bytes": rss,
+            "rss_growth_bytes": rss - _first_rss if rss is not None and _first_rss is not None else None,
+            "db_connections_open": db_open,
+            "db_connections_in_use": db_in_use,
+            "requests_in_flight": _requests_in_flight,
+            "runs_in_flight": _runs_in_flight,
+            "requests_served": served,
+            "max_requests": _max_requests,
+            "requests_until_restart": max(_max_requests - served, 0) if _max_requests else None,
+            "gc_collections": [s["collections"] for s in gc_stats],
+            "gc_collected": [s["collected"] for s in gc_stats],
+            "gc_uncollectable": sum(s["uncollectable"] for s in gc_stats),
+            "gc_pending": list(gc.get_count()),
+            "threads": threading.active_count(),
+        }
+    return data
+
+
+# ────────────────────────────────
+# Registro em arquivos
+# ────────────────────────────────
+def _path(pid):
+    return os.path.join(WORKER_STATS_DIR, f"worker-{pid}.json")
+
+
+def publish(app):
+    """
+    Grava o retrato deste worker (write + rename: quem lê nunca vê meio
+    arquivo). O temporário é único por gravação: a thread de publicação e o
+    aggregate() do request podem gravar ao mesmo tempo.
+    """
+    data = collect(app)
+    os.makedirs(WORKER_STATS_DIR, exist_ok=True)
+    path = _path(data["pid"])
+    fd, tmp = tempfile.mkstemp(prefix=f"worker-{data['pid']}.", suffix=".tmp", dir=WORKER_STATS_DIR)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def unregister():
+    """Remove o arquivo deste worker (saída do processo / worker_exit do gunicorn)"""
+    try:
+        os.unlink(_path(os.getpid()))
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def aggregate(app):
+    """
+    Todos os workers do host, com totais; descarta os de processos mortos.
+    Com o registro desligado, só o worker que atendeu.
+    """
+    if not WORKER_STATS_ENABLED:
+        return _summary([dict(collect(app), age_s=0.0, stale=False, current=True)])
+    try:
+        publish(app)  # o worker que atende entra com dados frescos
+    except OSError as e:
+        logger.warning("falha ao publicar estatísticas do worker: %s", e)
+
+    workers = []
+    now = time.time()
+    try:
+        names = sorted(os.listdir(WORKER_STATS_DIR))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        path = os.path.join(WORKER_STATS_DIR, name)
+        try:
+            with open(path, encoding="utf-8") as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            continue
+        if not _alive(data.get("pid", 0)):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            continue
+        age = now - data.get("updated_at", 0)
+        data["age_s"] = round(age, 1)
+        data["stale"] = age > WORKER_STATS_STALE_SECONDS
+        data["current"] = data["pid"] == os.getpid()
+        workers.append(data)
+    return _summary(workers)
+
+
+def _summary(workers):
+    def total(key):
+        return sum(w.get(key) or 0 for w in workers)
+
+    return {
+        "workers": workers,
+        "totals": {
+            "workers": len(workers),
+            "stale_workers": sum(1 for w in workers if w["stale"]),
+            "rss_bytes": total("rss_bytes"),
+            "db_connections_open": total("db_connections_open"),
+            "requests_in_flight": total("requests_in_flight"),
+            "runs_in_flight": total("runs_in_flight"),
+            "requests_served": total("requests_served"),
+        },
+    }
+
+
+def _publish_loop(app):
+    while True:
+        try:
+            publish(app)
+        except Exception as e:
+            logger.warning("falha ao publicar estatísticas do worker: %s", e)
+        time.sleep(WORKER_STATS_INTERVAL)
+
+
+def ensure_publisher(app):
+    """Sobe a thread de publicação deste processo (uma por pid, após o fork)"""
+    global _publisher_pid
+    if not WORKER_STATS_ENABLED or _publisher_pid == os.getpid():
+        return
+    with _lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+    threading.Thread(target=_publish_loop, args=(app,), name="worker-stats", daemon=True).start()
+
+
+def init_worker_stats(app):
+    """Conta os requests do worker e sobe a publicação no primeiro deles"""
+    @app.before_request
+    def _count_request():
+        ensure_publisher(app)
+        _request_started()
+        g.worker_stats_counted = True
+
+    @app.teardown_request
+    def _uncount_request(error=None):
+        # teardown roda mesmo quando um before_request anterior respondeu antes deste
+        if g.pop("worker_stats_counted", False):
+            _request_finished()
+
+    atexit.register(unregister)
@@ -0,0 +1,54 @@
+# backend/tests/test_admin_assets.py
+"""
+Recarga dos arquivos do painel (routes/admin_routes.py): admin.html e
+admin.js desatualizados ao mesmo tempo não podem travar no lock do cache.
+
+    cd backend && python -m pytest tests
+"""
+import os
+import tempfile
+import threading
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("JWT_SECRET_KEY", "0123456789abcdef0123456789abcdef01")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.routes import admin_routes  # noqa: E402
+
+
+def _get_with_timeout(filename, timeout=5):
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(asset=admin_routes.get_asset(filename)), daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert not worker.is_alive(), f"get_asset({filename!r}) travou"
+    return result["asset"]
+
+
+def test_reload_admin_html_and_js(monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_ASSETS_RELOAD_INTERVAL", 0)
+    js = _get_with_timeout("admin.js")
+    html = _get_with_timeout("admin.html")
+    assert html.depends_on == js.version
+
+    # Os dois "mudaram" no disco: o html recarrega e, dentro dele, o js
+    for filename in ("admin.js", "admin.html"):
+        admin_routes._assets[filename].mtime = -1
+
+    html = _get_with_timeout("admin.html")
+    js = admin_routes._assets["admin.js"]
+    assert js.mtime != -1 and html.mtime != -1
+    assert html.depends_on == js.version
+    assert f"admin.js?v={js.version}".encode() in html.variants[None]
+
+
+def test_preload_without_admin_js(monkeypatch):
+    monkeypatch.setattr(admin_routes, "_assets", {})
+    real_find = admin_routes._find_asset_path
+    monkeypatch.setattr(
+        admin_routes, "_find_asset_path",
+        lambda filename: None if filename == "admin.js" else real_find(filename),
+    )
+    html = _get_with_timeout("admin.html")
+    assert html is not None and html.depends_on is None
+    assert "admin.js" not in admin_routes._assets
@@ -7,7 +7,8 @@ bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
 # Número de workers
 workers = 2  # Reduza para 2 workers
 worker_class = 'sync'
-timeout = 120  # Aumente para 120 segundos
+# Mesma variável do orçamento da fila de runs (backend/src/utils/run_queue.py)
+timeout = int(os.environ.get('WORKER_TIMEOUT_SECONDS', '120'))
 keepalive = 5
 
 # Restart workers após X requests
@@ -24,4 +25,24 @@ preload_app = True
 proc_name = 'leilaogpt_backend'
 
 # Graceful timeout
-graceful_timeout = 40
\ No newline at end of file
+graceful_timeout = 40
+
+
+def post_fork(server, worker):
+    # Com preload_app o engine foi criado no master: cada worker descarta o
+    # pool herdado e abre as próprias conexões
+    from src.main import app
+    from src.models.user import db
+    from src.utils.db_pool import dispose_after_fork
+    from src.utils import worker_stats
+
+    dispose_after_fork(app, db)
+    # Limite efetivo deste worker (max_requests + jitter), visto no system-info
+    worker_stats.set_max_requests(worker.max_requests)
+
+
+def worker_exit(server, worker):
+    # Worker reciclado (max_requests) ou encerrado: some do registro de estatísticas
+    from src.utils import worker_stats
+
+    worker_stats.unregister()